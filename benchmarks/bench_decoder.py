@@ -0,0 +1,121 @@
+"""
+benchmarks/bench_decoder.py
+
+Compare the cost of decoding API items into models: strict construction, which fails
+on any unknown key, a straightforward tolerant decode (filter unknown keys, then
+isinstance checks and coercion of each int/bool field), and the generated
+ModelDecoder. Run from the repository root:
+
+    python benchmarks/bench_decoder.py [count]
+"""
+
+import sys
+import timeit
+
+from dataclasses import fields
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# pylint: disable=wrong-import-position
+from kshalopy.models.decoder import COERCERS, ModelDecoder
+from kshalopy.models.models import Device, DeviceDetails
+
+
+def device_record(index: int) -> dict:
+    return {
+        "deviceid": f"device{index:08d}",
+        "devicename": f"Door {index}",
+        "lockstatus": "Locked" if index % 2 else "Unlocked",
+        "firmwareversion": "1.2.3",
+        "modelnumber": "916",
+        "batterypercentage": index % 100,
+        "batterystatus": "Good",
+        "devicetimezone": "America/Chicago",
+        "lastupdatestatus": 1645206377 + index,
+        "activationstate": True,
+    }
+
+
+def details_record(index: int) -> dict:
+    return {
+        "audiostatus": "On",
+        "ledstatus": "On",
+        "autolockstate": "Off",
+        "autolockdelay": 30,
+        "lastupdatestatus": 1645206377 + index,
+        "batterystatus": "Good",
+        "batterypercentage": index % 100,
+        "doorstatus": "Locked",
+        "serialnumber": f"SN{index:010d}",
+        "alexasetup": False,
+        "googlehomesetup": True,
+    }
+
+
+def drifted(make_record):
+    def make(index: int) -> dict:
+        record = make_record(index)
+        record["newfield"] = index
+        record["batterypercentage"] = str(record["batterypercentage"])
+        return record
+
+    return make
+
+
+def naive_decoder(model):
+    names = {field.name for field in fields(model)}
+    typed = {
+        field.name: (field.type, COERCERS[field.type])
+        for field in fields(model)
+        if field.type in COERCERS
+    }
+
+    def decode(item: dict):
+        item = {key: value for key, value in item.items() if key in names}
+        for name, (expected, coerce) in typed.items():
+            value = item.get(name)
+            if value is not None and not isinstance(value, expected):
+                try:
+                    item[name] = coerce(value)
+                except ValueError:
+                    pass
+        return model(**item)
+
+    return decode
+
+
+def measure(decode, records) -> float:
+    """
+    :return: decode time per item in microseconds
+    """
+    seconds = min(
+        timeit.repeat(lambda: [decode(r) for r in records], number=1, repeat=7)
+    )
+    return seconds / len(records) * 1e6
+
+
+def main(count: int) -> None:
+    print(f"{count} items per model, decode time per item (us)")
+    print(f"{'model':16}{'items':>10}{'strict':>10}{'naive':>10}{'decoder':>10}")
+    for model, make_record in (
+        (Device, device_record),
+        (DeviceDetails, details_record),
+    ):
+        for label, make in (("clean", make_record), ("drifted", drifted(make_record))):
+            records = [make(index) for index in range(count)]
+            strict = (
+                measure(lambda item: model(**item), records)
+                if label == "clean"
+                else float("nan")
+            )
+            naive = measure(naive_decoder(model), records)
+            generated = measure(ModelDecoder(model).decode, records)
+            print(
+                f"{model.__name__:16}{label:>10}{strict:>10.2f}{naive:>10.2f}"
+                f"{generated:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,89 @@
+"""
+benchmarks/bench_models.py
+
+Compare per-object memory and construction cost of the dataclass models with their
+slotted counterparts in models/compact.py. Run from the repository root:
+
+    python benchmarks/bench_models.py [count]
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# pylint: disable=wrong-import-position
+from kshalopy.models.compact import CompactDevice, CompactDeviceDetails
+from kshalopy.models.models import Device, DeviceDetails
+
+
+def device_record(index: int) -> dict:
+    # Values are built per record, as they would be when decoded from JSON
+    return {
+        "deviceid": f"device{index:08d}",
+        "devicename": f"Door {index}",
+        "lockstatus": "".join(["Lock", "ed"] if index % 2 else ["Unlock", "ed"]),
+        "firmwareversion": "".join(["1.2.", "3"]),
+        "modelnumber": "".join(["9", "1", "6"]),
+        "batterypercentage": index % 100,
+        "batterystatus": "".join(["Go", "od"]),
+        "devicetimezone": "".join(["America/", "Chicago"]),
+        "lastupdatestatus": 1645206377 + index,
+    }
+
+
+def details_record(index: int) -> dict:
+    return {
+        "audiostatus": "".join(["O", "n"]),
+        "ledstatus": "".join(["O", "n"]),
+        "securescreenstatus": "".join(["O", "ff"]),
+        "autolockstate": "".join(["O", "ff"]),
+        "autolockdelay": 30,
+        "lastupdatestatus": 1645206377 + index,
+        "batterystatus": "".join(["Go", "od"]),
+        "batterypercentage": index % 100,
+        "doorstatus": "".join(["Lock", "ed"]),
+        "locktamperstate": "".join(["Cle", "ar"]),
+        "modelnumber": "".join(["9", "1", "6"]),
+        "serialnumber": f"SN{index:010d}",
+        "firmwarebundleversion": "".join(["1.2.", "3"]),
+        "devicetimezone": "".join(["America/", "Chicago"]),
+    }
+
+
+def measure(model, make_record, count: int) -> tuple:
+    """
+    :return: bytes retained per object, including field values no longer shared with
+        the decoded records, and construction time per object in microseconds
+    """
+    tracemalloc.start()
+    records = [make_record(index) for index in range(count)]
+    objects = [model(**record) for record in records]
+    del records
+    per_object = tracemalloc.get_traced_memory()[0] / len(objects)
+    tracemalloc.stop()
+
+    records = [make_record(index) for index in range(count)]
+    seconds = min(
+        timeit.repeat(lambda: [model(**r) for r in records], number=1, repeat=5)
+    )
+    return per_object, seconds / count * 1e6
+
+
+def main(count: int) -> None:
+    print(f"{count} objects per model")
+    print(f"{'model':24}{'bytes/object':>14}{'construct (us)':>16}")
+    for make_record, models in (
+        (device_record, (Device, CompactDevice)),
+        (details_record, (DeviceDetails, CompactDeviceDetails)),
+    ):
+        for model in models:
+            per_object, micros = measure(model, make_record, count)
+            print(f"{model.__name__:24}{per_object:>14.0f}{micros:>16.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
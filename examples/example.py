@@ -57,16 +57,21 @@ def main():
         source_device="kshalopy",
     )
 
-    devices = {}
-    for home in rest_client.get_my_homes():
-        for device in rest_client.get_devices_in_home(home):
-            devices[device.deviceid] = device
+    devices = rest_client.get_fleet(include_details=False).devices
+
+    def reconcile(_client):
+        # Catch up on anything missed while the realtime connection was down
+        for deviceid, device in rest_client.get_fleet(False).devices.items():
+            if deviceid in devices:
+                devices[deviceid].lockstatus = device.lockstatus
+                devices[deviceid].lastupdatestatus = device.lastupdatestatus
 
     realtime_daemon = kshalopy.RealtimeDaemon(
         kshalopy.RealtimeClient(
             config=config, credentials=credentials, devices=devices
         ),
         start=True,
+        on_reconnect=reconcile,
     )
 
     def stop_daemons(_signal=None, _handler=None):
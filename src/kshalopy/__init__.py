@@ -4,8 +4,17 @@ __init__.py
 
 from .credentials.credentials import AppCredentials
 from .credentials.daemon import CredentialsDaemon
+from .credentials.manager import CredentialsManager, RefreshPolicy
+from .credentials.store import FileCredentialStore, SQLiteCredentialStore
 from .login.login import LoginHandler, LoginParameters, VerificationMethods
 from .config import Config
+from .realtime.async_realtime import AsyncRealtimeClient
+from .realtime.dispatch import EventDispatcher
 from .realtime.realtime import RealtimeClient
 from .realtime.daemon import RealtimeDaemon
+from .rest.async_rest import AsyncRestClient
+from .rest.cache import ResponseCache
+from .rest.pool import ConnectionPool
 from .rest.rest import RestClient
+from .rest.retry import RequestPolicy, RetryPolicy, TokenBucket
+from .state.store import DeviceStateStore
@@ -8,14 +8,15 @@ credentials/credentials.py
 from __future__ import annotations
 
 import json
+import os
+import tempfile
+import threading
 
-from dataclasses import dataclass, InitVar
+from dataclasses import dataclass, field, InitVar
 from datetime import datetime
 
-import boto3
-
 from ..config import Config
-from ..utils import calculate_expiration
+from ..utils import calculate_expiration, get_boto3_client
 
 
 @dataclass
@@ -45,23 +46,44 @@ class CredentialsBase:
         ttl = self.expiration - datetime.now().timestamp()
         return 0 if ttl <= 0 else ttl
 
-    def save_credentials(self, filename: str) -> None:
+    def to_json(self) -> str:
         """
-        Save current credentials for future use to a JSON file
+        Serialize current credentials to JSON, omitting private fields
         
-        :param filename: name and path for save file
-
-        :return: None
+        :return: JSON string
         """
-        data = json.dumps(
+        return json.dumps(
             self,
             indent=4,
             default=lambda d: {
                 k: d.__dict__[k] for k in d.__dict__ if not k.startswith("_")
             },
         )
-        with open(filename, "w", encoding="ascii") as outfile:
-            outfile.write(data)
+
+    def save_credentials(self, filename: str) -> None:
+        """
+        Save current credentials for future use to a JSON file. The file is written
+        to a temporary file alongside and moved into place, so it is never left
+        partially written.
+        
+        :param filename: name and path for save file
+
+        :return: None
+        """
+        data = self.to_json()
+        directory = os.path.dirname(os.path.abspath(filename))
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="ascii", dir=directory, delete=False
+        ) as outfile:
+            try:
+                outfile.write(data)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            except BaseException:
+                outfile.close()
+                os.unlink(outfile.name)
+                raise
+        os.replace(outfile.name, filename)
 
 
 @dataclass
@@ -77,7 +99,12 @@ class AWSCredentials(CredentialsBase):
 
     @classmethod
     def get_credentials(
-        cls, region: str, identity_pool_id: str, user_pool_id: str, id_token: str
+        cls,
+        region: str,
+        identity_pool_id: str,
+        user_pool_id: str,
+        id_token: str,
+        identity_id: str = None,
     ) -> AWSCredentials:
         """
         Retrieve AWS identities and IAM access tokens for Cognito user
@@ -86,18 +113,20 @@ class AWSCredentials(CredentialsBase):
         :param identity_pool_id:
         :param user_pool_id:
         :param id_token:
+        :param identity_id: previously retrieved identity ID, skips the lookup if set
         
         :return:
         """
         logins = {
             f"cognito-idp.{region}.amazonaws.com/{region}_{user_pool_id}": id_token
         }
-        identity_client = boto3.client("cognito-identity", region_name=region)
-        response = identity_client.get_id(
-            IdentityPoolId=identity_pool_id, Logins=logins
-        )
+        identity_client = get_boto3_client("cognito-identity", region)
+        if not identity_id:
+            identity_id = identity_client.get_id(
+                IdentityPoolId=identity_pool_id, Logins=logins
+            )["IdentityId"]
         response = identity_client.get_credentials_for_identity(
-            IdentityId=response["IdentityId"], Logins=logins
+            IdentityId=identity_id, Logins=logins
         )
         return cls(
             identity_id=response["IdentityId"],
@@ -112,7 +141,8 @@ class AWSCredentials(CredentialsBase):
 class AppCredentials(CredentialsBase):
     """
     Class for storing, accessing, and refreshing credential tokens. Access and ID tokens
-    will auto-refresh on use if they are expired or close to expiration
+    will auto-refresh on use if they are expired or close to expiration. Refreshing is
+    thread-safe: concurrent callers wait for a single refresh in progress.
     """
 
     _app_config: Config = None
@@ -124,6 +154,10 @@ class AppCredentials(CredentialsBase):
     token_type: str = None
     lifespan: int = None
     aws_credentials: AWSCredentials = None
+    _refresh_lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+    _refresh_generation: int = field(default=0, init=False, repr=False, compare=False)
 
     def __post_init__(self, app_config):
         self._app_config = app_config
@@ -137,32 +171,81 @@ class AppCredentials(CredentialsBase):
 
     def refresh(self, ttl_limit: int = 900, force: bool = False) -> None:
         """
-        Use the refresh token to get new access and ID tokens
+        Use the refresh token to get new access and ID tokens. AWS credentials are only
+        re-fetched, for the already known identity, once they are close to expiration
+        themselves.
         
+        :param ttl_limit: refresh if fewer than this many seconds remain
+        :param force: refresh access and ID tokens regardless of expiration
         :return: None
         """
-        if (self.ttl < ttl_limit) or force:
-            idp_client = boto3.client(
-                "cognito-idp", region_name=self._app_config.region
-            )
-            response = idp_client.initiate_auth(
-                ClientId=self._app_config.client_id,
-                AuthFlow="REFRESH_TOKEN",
-                AuthParameters={
-                    "CURRENT_USER": self.username,
-                    "REFRESH_TOKEN": self.refresh_token,
-                },
-            )
-            self.access_token = response["AuthenticationResult"]["AccessToken"]
-            self.id_token = response["AuthenticationResult"]["IdToken"]
-            self.lifespan = response["AuthenticationResult"]["ExpiresIn"]
-            self.expiration = calculate_expiration(response)
-            self.aws_credentials = AWSCredentials.get_credentials(
-                region=self._app_config.region,
-                identity_pool_id=self._app_config.identity_pool_id,
-                user_pool_id=self._app_config.user_pool_id,
-                id_token=self.id_token,
+        if not force and not self._needs_refresh(ttl_limit):
+            return
+        if self._app_config is None:
+            raise ValueError(
+                "Refreshing credentials requires an application configuration, "
+                "pass app_config to load_credentials"
             )
+        generation = self._refresh_generation
+        with self._refresh_lock:
+            if self._refresh_generation != generation:
+                # Another caller refreshed while this one waited, which satisfies a
+                # forced refresh; otherwise check the new expiration as usual
+                force = False
+            refreshed = False
+            if (self.ttl < ttl_limit) or force:
+                idp_client = get_boto3_client("cognito-idp", self._app_config.region)
+                response = idp_client.initiate_auth(
+                    ClientId=self._app_config.client_id,
+                    AuthFlow="REFRESH_TOKEN",
+                    AuthParameters={
+                        "CURRENT_USER": self.username,
+                        "REFRESH_TOKEN": self.refresh_token,
+                    },
+                )
+                # A single dict update, so readers never see a mix of old and new
+                self.__dict__.update(
+                    access_token=response["AuthenticationResult"]["AccessToken"],
+                    id_token=response["AuthenticationResult"]["IdToken"],
+                    lifespan=response["AuthenticationResult"]["ExpiresIn"],
+                    expiration=calculate_expiration(response),
+                )
+                refreshed = True
+            if self.aws_credentials is None or self.aws_credentials.ttl < ttl_limit:
+                self.aws_credentials = AWSCredentials.get_credentials(
+                    region=self._app_config.region,
+                    identity_pool_id=self._app_config.identity_pool_id,
+                    user_pool_id=self._app_config.user_pool_id,
+                    id_token=self.id_token,
+                    identity_id=self.aws_credentials.identity_id
+                    if self.aws_credentials
+                    else None,
+                )
+                refreshed = True
+            if refreshed:
+                self._refresh_generation += 1
+
+    @property
+    def refreshable(self) -> bool:
+        """
+        Return whether the credentials carry what refresh needs
+        
+        :return: True if an application configuration and refresh token are set
+        """
+        return self._app_config is not None and bool(self.refresh_token)
+
+    def _needs_refresh(self, ttl_limit: int) -> bool:
+        """
+        Return whether the tokens or AWS credentials are close to expiration
+        
+        :param ttl_limit: refresh if fewer than this many seconds remain
+        :return: True if a refresh is needed
+        """
+        return (
+            self.ttl < ttl_limit
+            or self.aws_credentials is None
+            or self.aws_credentials.ttl < ttl_limit
+        )
 
     @classmethod
     def load_credentials(
@@ -176,10 +259,18 @@ class AppCredentials(CredentialsBase):
         :return: Credentials object
         """
         with open(filename, encoding="ascii") as infile:
-            raw_data = json.load(infile)
-            raw_data["app_config"] = app_config
-            if isinstance(raw_data.get("aws_credentials"), dict):
-                raw_data["aws_credentials"] = AWSCredentials(
-                    **raw_data["aws_credentials"]
-                )
+            return cls.from_dict(json.load(infile), app_config)
+
+    @classmethod
+    def from_dict(cls, raw_data: dict, app_config: Config = None) -> AppCredentials:
+        """
+        Build credentials from a dict like that decoded from the save method's output
+
+        :param raw_data: credential fields, as decoded from JSON
+        :param app_config: application configuration object
+        :return: Credentials object
+        """
+        raw_data = dict(raw_data, app_config=app_config)
+        if isinstance(raw_data.get("aws_credentials"), dict):
+            raw_data["aws_credentials"] = AWSCredentials(**raw_data["aws_credentials"])
         return cls(**raw_data)
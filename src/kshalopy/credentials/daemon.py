@@ -7,6 +7,7 @@ import logging
 import threading
 
 from ..credentials.credentials import AppCredentials
+from ..credentials.store import CredentialStore
 
 logger = logging.getLogger(__name__)
 
@@ -16,16 +17,21 @@ class CredentialsDaemon:
     Daemon for keeping credentials fresh
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         credentials: AppCredentials,
         expiration_offset: int = 600,
         credentials_file: str = None,
         start: bool = False,
+        *,
+        store: CredentialStore = None,
+        store_key: str = None,
     ):
         self.credentials = credentials
         self.expiration_offset = expiration_offset
         self.credentials_file = credentials_file
+        self.store = store
+        self.store_key = store_key if store_key else credentials.username
         self._exit_event = threading.Event()
         self._worker = None
 
@@ -42,6 +48,9 @@ class CredentialsDaemon:
             if self.credentials_file:
                 logger.info("Saving fresh credentials to %s", self.credentials_file)
                 self.credentials.save_credentials(self.credentials_file)
+            if self.store is not None:
+                logger.info("Saving fresh credentials to store as %s", self.store_key)
+                self.store.save(self.store_key, self.credentials)
             logger.info(
                 "Got fresh credentials - exp: %s",
                 self.credentials.expiration_dt.isoformat(),
@@ -0,0 +1,367 @@
+"""
+credentials/manager.py
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, Hashable, List
+
+from ..config import Config
+from ..credentials.credentials import AppCredentials
+from ..credentials.store import CredentialStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AccountStatus:
+    """
+    Data-only class for the refresh status of one managed account
+    """
+
+    key: Hashable
+    state: str
+    expiration: float = 0
+    next_refresh: float = None
+    last_refresh: float = None
+    failures: int = 0
+    last_error: str = None
+
+
+@dataclass
+class RefreshPolicy:
+    """
+    Data-only class for when the credentials of managed accounts are refreshed:
+    expiration_offset seconds before they expire, brought forward by up to jitter
+    seconds. A failed refresh is retried after retry_delay seconds, doubled on each
+    consecutive failure up to expiration_offset.
+    """
+
+    expiration_offset: int = 600
+    jitter: float = 60
+    retry_delay: float = 30
+
+    def next_refresh(self, expiration: float) -> float:
+        """
+        Return the jittered refresh time for credentials
+
+        :param expiration: expiration of the credentials, as a timestamp
+        :return: time, as a timestamp, at which to refresh
+        """
+        due = expiration - self.expiration_offset
+        return max(due, time.time()) - random.uniform(0, self.jitter)
+
+    def backoff(self, failures: int) -> float:
+        """
+        Return the delay before retrying a failed refresh
+
+        :param failures: number of consecutive failures
+        :return: delay in seconds
+        """
+        return min(self.retry_delay * 2 ** (failures - 1), self.expiration_offset)
+
+
+# The scheduler's state is shared by its thread and the workers, all guarded by the
+# one condition
+class CredentialsManager:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps the credentials of many accounts fresh. A single scheduler thread holds the
+    accounts in a priority queue ordered by refresh time and hands due refreshes to a
+    bounded worker pool. Refresh times are spread with random jitter so that accounts
+    that logged in together do not all refresh together. If a store is set, refreshed
+    credentials are written to it in batches, at most once per flush_interval.
+    """
+
+    SCHEDULED = "scheduled"
+    REFRESHING = "refreshing"
+    FAILED = "failed"
+    FLUSH = object()
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        policy: RefreshPolicy = None,
+        *,
+        max_workers: int = 8,
+        store: CredentialStore = None,
+        flush_interval: float = 5,
+        start: bool = False,
+    ):
+        """
+        :param policy: when to refresh credentials, RefreshPolicy defaults if not set
+        :param max_workers: maximum number of refreshes in flight
+        :param store: persist refreshed credentials to this store, if set
+        :param flush_interval: maximum delay, in seconds, before refreshed credentials
+            are written to the store
+        :param start: start the scheduler immediately
+        """
+        self.policy = RefreshPolicy() if policy is None else policy
+        self.max_workers = max_workers
+        self.store = store
+        self.flush_interval = flush_interval
+        # key -> [credentials, credentials_file, generation]
+        self._accounts: Dict[Hashable, list] = {}
+        self._status: Dict[Hashable, AccountStatus] = {}
+        self._heap = []
+        self._dirty: Dict[Hashable, AppCredentials] = {}
+        self._flush_at = None
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._exit_event = threading.Event()
+        self._executor = None
+        self._worker = None
+
+        if start:
+            self.start()
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._accounts
+
+    def _schedule(self, key: Hashable, due: float) -> None:
+        """
+        Queue the next refresh of an account, superseding any queued refresh.
+        Must be called with the condition held.
+
+        :param key: identifies the account
+        :param due: time, as a timestamp, at which to refresh
+        :return: None
+        """
+        generation = next(self._counter)
+        self._accounts[key][2] = generation
+        self._status[key].state = self.SCHEDULED
+        self._status[key].next_refresh = due
+        heapq.heappush(self._heap, (due, generation, key))
+        self._condition.notify()
+
+    def add(
+        self,
+        credentials: AppCredentials,
+        key: Hashable = None,
+        credentials_file: str = None,
+    ) -> Hashable:
+        """
+        Start managing an account's credentials, replacing any with the same key
+
+        :param credentials: credentials to keep fresh
+        :param key: identifies the account, defaults to the username
+        :param credentials_file: save refreshed credentials to this file, if set
+        :return: key of the account
+        """
+        key = credentials.username if key is None else key
+        with self._condition:
+            self._accounts[key] = [credentials, credentials_file, None]
+            self._status[key] = AccountStatus(
+                key=key, state=self.SCHEDULED, expiration=credentials.expiration
+            )
+            self._schedule(key, self.policy.next_refresh(credentials.expiration))
+        return key
+
+    def add_stored(self, app_config: Config = None) -> List[Hashable]:
+        """
+        Start managing every account held in the store
+
+        :param app_config: application configuration object
+        :return: keys of the accounts
+        """
+        return [
+            self.add(credentials, key=key)
+            for key, credentials in self.store.load_all(app_config).items()
+        ]
+
+    def remove(self, key: Hashable) -> AppCredentials:
+        """
+        Stop managing an account's credentials. A refresh already in flight still
+        completes, but is not rescheduled.
+
+        :param key: identifies the account
+        :return: credentials of the account, or None if unknown
+        """
+        with self._condition:
+            self._status.pop(key, None)
+            self._dirty.pop(key, None)
+            account = self._accounts.pop(key, None)
+        return account[0] if account else None
+
+    def get_credentials(self, key: Hashable) -> AppCredentials:
+        """
+        Return the credentials of a managed account
+
+        :param key: identifies the account
+        :return: credentials, or None if unknown
+        """
+        with self._condition:
+            account = self._accounts.get(key)
+        return account[0] if account else None
+
+    def status(self, key: Hashable) -> AccountStatus:
+        """
+        Return the refresh status of a managed account
+
+        :param key: identifies the account
+        :return: copy of the account status, or None if unknown
+        """
+        with self._condition:
+            status = self._status.get(key)
+            return replace(status) if status else None
+
+    def statuses(self) -> Dict[Hashable, AccountStatus]:
+        """
+        Return the refresh status of every managed account
+
+        :return: copies of the account statuses, by key
+        """
+        with self._condition:
+            return {key: replace(status) for key, status in self._status.items()}
+
+    def _next_due(self) -> Hashable:
+        """
+        Wait for the next refresh, or flush to the store, to become due
+
+        :return: key of the account to refresh, FLUSH, or None if stopping
+        """
+        with self._condition:
+            while not self._exit_event.is_set():
+                now = time.time()
+                if self._dirty and self._flush_at <= now:
+                    return self.FLUSH
+                wait = self._flush_at - now if self._dirty else None
+                if not self._heap:
+                    self._condition.wait(wait)
+                    continue
+                due, generation, key = self._heap[0]
+                account = self._accounts.get(key)
+                if account is None or account[2] != generation:
+                    # Removed, or rescheduled since this entry was queued
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    self._condition.wait(
+                        due - now if wait is None else min(wait, due - now)
+                    )
+                    continue
+                heapq.heappop(self._heap)
+                account[2] = None
+                self._status[key].state = self.REFRESHING
+                self._status[key].next_refresh = None
+                return key
+        return None
+
+    def flush(self) -> None:
+        """
+        Write credentials refreshed since the last flush to the store
+
+        :return: None
+        """
+        with self._condition:
+            dirty, self._dirty = self._dirty, {}
+        if dirty:
+            logger.info("Saving %s fresh credentials to store", len(dirty))
+            try:
+                self.store.save_many(dirty)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to save credentials to store")
+                with self._condition:
+                    # Keep anything refreshed again since, retry on the next flush
+                    self._dirty = {**dirty, **self._dirty}
+                    self._flush_at = time.time() + self.flush_interval
+
+    def _refresh(self, key: Hashable) -> None:
+        with self._condition:
+            account = self._accounts.get(key)
+        if account is None:
+            return
+        credentials, credentials_file, _generation = account
+        logger.info("Getting fresh credentials for %s", key)
+        error = None
+        try:
+            credentials.refresh(force=True)
+            if credentials_file:
+                logger.info("Saving fresh credentials to %s", credentials_file)
+                credentials.save_credentials(credentials_file)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("Failed to refresh credentials for %s", key)
+            error = err
+        with self._condition:
+            status = self._status.get(key)
+            if self._accounts.get(key) is not account or status is None:
+                return
+            status.expiration = credentials.expiration
+            if error is None:
+                if self.store is not None:
+                    if not self._dirty:
+                        self._flush_at = time.time() + self.flush_interval
+                    self._dirty[key] = credentials
+                status.last_refresh = time.time()
+                status.failures = 0
+                status.last_error = None
+                self._schedule(key, self.policy.next_refresh(credentials.expiration))
+            else:
+                status.failures += 1
+                status.last_error = repr(error)
+                delay = self.policy.backoff(status.failures)
+                self._schedule(key, time.time() + delay)
+                status.state = self.FAILED
+
+    def _run(self) -> None:
+        logger.info("Manager started")
+        while True:
+            key = self._next_due()
+            if key is None:
+                break
+            if key is self.FLUSH:
+                self.flush()
+                continue
+            self._executor.submit(self._refresh, key)
+        logger.info("Manager stopped")
+
+    def start(self) -> bool:
+        """
+        Start the scheduler thread and worker pool
+
+        :return: Manager state
+        """
+        logger.info("Starting manager")
+        self._exit_event.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="kshalopy-credentials"
+        )
+        self._worker = threading.Thread(
+            target=self._run, name="kshalopy-credentials-scheduler", daemon=True
+        )
+        self._worker.start()
+        return self._worker.is_alive()
+
+    def stop(self) -> bool:
+        """
+        Stop the scheduler thread, waiting for refreshes in flight to complete and
+        flushing them to the store
+
+        :return: Manager state
+        """
+        logger.info("Stopping manager")
+        with self._condition:
+            self._exit_event.set()
+            self._condition.notify_all()
+        logger.info("Waiting for manager to stop")
+        self._worker.join()
+        self._executor.shutdown(wait=True)
+        self.flush()
+        return self._worker.is_alive()
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Return state of manager
+
+        :return: Manager state
+        """
+        return self._worker is not None and self._worker.is_alive()
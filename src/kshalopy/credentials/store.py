@@ -0,0 +1,178 @@
+"""
+credentials/store.py
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Mapping
+
+from ..config import Config
+from ..credentials.credentials import AppCredentials
+
+
+class CredentialStore(ABC):
+    """
+    Base class for persistent storage of many accounts' credentials, keyed by account
+    """
+
+    def save(self, key: str, credentials: AppCredentials) -> None:
+        """
+        Save one account's credentials
+
+        :param key: identifies the account
+        :param credentials: credentials to save
+        :return: None
+        """
+        self.save_many({key: credentials})
+
+    @abstractmethod
+    def save_many(self, credentials: Mapping[str, AppCredentials]) -> None:
+        """
+        Save several accounts' credentials as one write
+
+        :param credentials: credentials to save, by key
+        :return: None
+        """
+
+    @abstractmethod
+    def load(self, key: str, app_config: Config = None) -> AppCredentials:
+        """
+        Load one account's credentials
+
+        :param key: identifies the account
+        :param app_config: application configuration object
+        :return: Credentials object, or None if not stored
+        """
+
+    @abstractmethod
+    def load_all(self, app_config: Config = None) -> Dict[str, AppCredentials]:
+        """
+        Load every stored account's credentials
+
+        :param app_config: application configuration object
+        :return: Credentials objects, by key
+        """
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]) -> None:
+        """
+        Remove accounts' credentials
+
+        :param keys: identifies the accounts
+        :return: None
+        """
+
+    def close(self) -> None:
+        """
+        Release any resources held by the store
+
+        :return: None
+        """
+
+
+class FileCredentialStore(CredentialStore):
+    """
+    Stores each account's credentials in its own JSON file in a directory, in the
+    format used by AppCredentials.save_credentials. Each file is replaced atomically.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: directory holding the files, created if missing
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save_many(self, credentials: Mapping[str, AppCredentials]) -> None:
+        for key, account_credentials in credentials.items():
+            account_credentials.save_credentials(self._filename(key))
+
+    def load(self, key: str, app_config: Config = None) -> AppCredentials:
+        try:
+            return AppCredentials.load_credentials(self._filename(key), app_config)
+        except FileNotFoundError:
+            return None
+
+    def load_all(self, app_config: Config = None) -> Dict[str, AppCredentials]:
+        return {
+            filename[: -len(".json")]: AppCredentials.load_credentials(
+                os.path.join(self.directory, filename), app_config
+            )
+            for filename in sorted(os.listdir(self.directory))
+            if filename.endswith(".json")
+        }
+
+    def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            try:
+                os.unlink(self._filename(key))
+            except FileNotFoundError:
+                pass
+
+
+class SQLiteCredentialStore(CredentialStore):
+    """
+    Stores any number of accounts' credentials in a single SQLite database. Each
+    save_many call is one transaction, so a batch is written completely or not at all.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: database file, created if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS credentials "
+                "(key TEXT PRIMARY KEY, expiration REAL, data TEXT NOT NULL)"
+            )
+
+    def save_many(self, credentials: Mapping[str, AppCredentials]) -> None:
+        rows = [
+            (key, account_credentials.expiration, account_credentials.to_json())
+            for key, account_credentials in credentials.items()
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO credentials (key, expiration, data) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def load(self, key: str, app_config: Config = None) -> AppCredentials:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM credentials WHERE key = ?", (key,)
+            ).fetchone()
+        return AppCredentials.from_dict(json.loads(row[0]), app_config) if row else None
+
+    def load_all(self, app_config: Config = None) -> Dict[str, AppCredentials]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, data FROM credentials ORDER BY key"
+            ).fetchall()
+        return {
+            key: AppCredentials.from_dict(json.loads(data), app_config)
+            for key, data in rows
+        }
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM credentials WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -7,11 +7,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from enum import Enum
 
-import boto3
-
 from ..config import Config
 from ..credentials.credentials import AppCredentials
-from ..utils import calculate_expiration
+from ..utils import calculate_expiration, get_boto3_client
 
 from ..login.helper import LoginHelper
 
@@ -51,7 +49,7 @@ class LoginHandler:
         self.login_params = login_params
         self.app_config = app_config
 
-        self.cognito_client = boto3.client("cognito-idp", region_name=app_config.region)
+        self.cognito_client = get_boto3_client("cognito-idp", app_config.region)
         self.credentials = None
         self.last_session = None
 
@@ -0,0 +1,206 @@
+"""
+models/columnar.py
+"""
+
+import math
+
+from array import array
+from dataclasses import fields
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, Type, Union
+
+from ..models.compact import CATEGORICAL_FIELDS, CompactModel
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+NAN = float("nan")
+MISSING_CODE = -1
+
+
+def _float_column(values: List[Any]) -> array:
+    try:
+        return array("d", [NAN if value is None else value for value in values])
+    except TypeError:
+        # Values the decoder could not coerce, e.g. "unknown", are treated as missing
+        column = array("d")
+        for value in values:
+            try:
+                column.append(NAN if value is None else float(value))
+            except (TypeError, ValueError):
+                column.append(NAN)
+        return column
+
+
+def _bool_column(values: List[Any]) -> array:
+    return array(
+        "b",
+        [1 if value is True else 0 if value is False else -1 for value in values],
+    )
+
+
+def _categorical_column(values: List[Any]) -> Tuple[array, Tuple[Any, ...]]:
+    lookup = {}
+    codes = array(
+        "i",
+        [
+            MISSING_CODE if value is None else lookup.setdefault(value, len(lookup))
+            for value in values
+        ],
+    )
+    return codes, tuple(lookup)
+
+
+class Columns:
+    """
+    Column-oriented copy of a collection of models, for vectorized analytics. Each
+    field is held as one column:
+
+    - int fields as float64 arrays, with NaN for missing values
+    - bool fields as int8 arrays of 1 (True), 0 (False) and -1 (missing)
+    - categorical fields (e.g. statuses) as int32 arrays of codes into a tuple of
+      categories, with -1 for missing values
+    - other fields as lists
+
+    Numeric columns are stdlib arrays, viewed without copying by to_numpy, so the
+    optional 'numpy' package is only needed to convert.
+    """
+
+    def __init__(
+        self,
+        model: Type,
+        columns: Dict[str, Union[array, list]],
+        categories: Dict[str, Tuple[Any, ...]],
+        index: List[Any] = None,
+    ):
+        """
+        :param model: model the columns were built from
+        :param columns: columns by field name
+        :param categories: categories of the categorical columns, by field name
+        :param index: keys of the mapping the columns were built from, if any
+        """
+        self.model = model
+        self.columns = columns
+        self.categories = categories
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name: str) -> Union[array, list]:
+        return self.columns[name]
+
+    def code(self, name: str, value: Any) -> int:
+        """
+        Return the code of a value in a categorical column, e.g. to build masks
+
+        :param name: field name
+        :param value: category
+        :return: code, or -1 if the value does not occur in the column
+        """
+        try:
+            return self.categories[name].index(value)
+        except ValueError:
+            return MISSING_CODE
+
+    def decode(self, name: str) -> list:
+        """
+        Return the values of a column as they were in the models
+
+        :param name: field name
+        :return: List of values
+        """
+        column = self.columns[name]
+        if name in self.categories:
+            categories = self.categories[name]
+            return [None if code < 0 else categories[code] for code in column]
+        if isinstance(column, list):
+            return list(column)
+        if column.typecode == "b":
+            return [None if value < 0 else bool(value) for value in column]
+        return [None if math.isnan(value) else int(value) for value in column]
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """
+        Convert the columns to NumPy arrays. Numeric columns are views of the
+        underlying arrays, other columns are object arrays.
+
+        :return: NumPy arrays by field name
+        """
+        if numpy is None:
+            raise RuntimeError("Columns.to_numpy requires the 'numpy' package")
+        converted = {}
+        for name, column in self.columns.items():
+            if isinstance(column, array):
+                converted[name] = numpy.frombuffer(column, dtype=column.typecode)
+            else:
+                converted[name] = numpy.array(column, dtype=object)
+        return converted
+
+    def to_structured_array(self) -> Any:
+        """
+        Convert the columns to a NumPy structured array, one record per model
+
+        :return: structured array
+        """
+        arrays = self.to_numpy()
+        records = numpy.empty(
+            len(self), dtype=[(name, column.dtype) for name, column in arrays.items()]
+        )
+        for name, column in arrays.items():
+            records[name] = column
+        return records
+
+
+def to_columns(
+    objects: Union[Iterable[Any], Mapping[Any, Any]],
+    model: Type = None,
+    names: Iterable[str] = None,
+    categorical: Iterable[str] = None,
+) -> Columns:
+    """
+    Build columns from a collection of models, e.g. a list of Devices, the devices
+    dict of a RealtimeClient or FleetSnapshot, or compact models
+
+    :param objects: models, or a mapping whose values are models
+    :param model: model of the objects, inferred from the first object if not set
+    :param names: fields to include, all fields if not set
+    :param categorical: string fields to encode as categories, CATEGORICAL_FIELDS for
+        the model if not set
+    :return: Columns
+    """
+    index = None
+    if isinstance(objects, Mapping):
+        index = list(objects.keys())
+        objects = objects.values()
+    objects = list(objects)
+    if model is None:
+        if not objects:
+            raise ValueError("model is required to build columns from no objects")
+        model = type(objects[0])
+    if isinstance(model, type) and issubclass(model, CompactModel):
+        model = model._model  # pylint: disable=protected-access
+    model_fields = {field.name: field for field in fields(model)}
+    names = tuple(model_fields) if names is None else tuple(names)
+    unknown = set(names).difference(model_fields)
+    if unknown:
+        raise ValueError(f"{model.__name__} has no fields {sorted(unknown)}")
+    categorical = frozenset(
+        CATEGORICAL_FIELDS.get(model, ()) if categorical is None else categorical
+    )
+
+    columns = {}
+    categories = {}
+    for name in names:
+        values = [getattr(obj, name) for obj in objects]
+        field_type = model_fields[name].type
+        if name in categorical:
+            columns[name], categories[name] = _categorical_column(values)
+        elif field_type in (bool, "bool"):
+            columns[name] = _bool_column(values)
+        elif field_type in (int, "int"):
+            columns[name] = _float_column(values)
+        else:
+            columns[name] = values
+    return Columns(model, columns, categories, index)
@@ -0,0 +1,198 @@
+"""
+models/compact.py
+"""
+
+import sys
+
+from dataclasses import MISSING, FrozenInstanceError, fields
+from typing import Any, Callable, Iterable, Tuple, Type
+
+from ..models.models import Device, DeviceDetails, Home, SharedUser, User
+
+
+class CompactModel:
+    """
+    Base class for slotted counterparts of the dataclass models. Instances have no
+    per-instance __dict__, so they hold only their field values; constructors accept
+    the same arguments as the model they mirror.
+    """
+
+    __slots__ = ()
+    _model: Callable[..., Any]
+    _fields: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_model(cls, instance: Any) -> "CompactModel":
+        """
+        Build a compact instance from an instance of the mirrored model
+
+        :param instance: model instance
+        :return: compact instance
+        """
+        return cls(**{name: getattr(instance, name) for name in cls._fields})
+
+    def to_model(self) -> Any:
+        """
+        Build an instance of the mirrored model
+
+        :return: model instance
+        """
+        return self._model(**{name: getattr(self, name) for name in self._fields})
+
+    def astuple(self) -> tuple:
+        """
+        Return the field values, in field order
+
+        :return: field values
+        """
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{self.__class__.__name__}({values})"
+
+    def __getstate__(self) -> tuple:
+        return self.astuple()
+
+    def __setstate__(self, state: tuple) -> None:
+        for name, value in zip(self._fields, state):
+            object.__setattr__(self, name, value)
+
+
+def _frozen_setattr(self, name: str, value: Any) -> None:
+    raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+
+def _frozen_delattr(self, name: str) -> None:
+    raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+
+def _frozen_hash(self) -> int:
+    return hash(self.astuple())
+
+
+def _init_function(
+    model_fields: tuple, frozen: bool, interned: frozenset
+) -> Callable[..., None]:
+    """
+    Generate the constructor of a compact model from source, as dataclasses do
+
+    :param model_fields: fields of the mirrored model
+    :param frozen: assign through object.__setattr__, bypassing the frozen guard
+    :param interned: names of string fields whose values are interned
+    :return: __init__ function
+    """
+    params = []
+    defaults = {}
+    for field in model_fields:
+        if field.default is not MISSING:
+            defaults[f"_default_{field.name}"] = field.default
+            params.append(f"{field.name}=_default_{field.name}")
+        else:
+            params.append(field.name)
+    setter = "_setattr(self, {0!r}, {1})" if frozen else "self.{0} = {1}"
+    body = []
+    for field in model_fields:
+        value = field.name
+        if field.name in interned:
+            value = f"_intern({value}) if {value}.__class__ is str else {value}"
+        body.append("    " + setter.format(field.name, value))
+    source = f"def __init__(self, {', '.join(params)}):\n" + "\n".join(body)
+    namespace = dict(defaults, _setattr=object.__setattr__, _intern=sys.intern)
+    exec(source, namespace)  # pylint: disable=exec-used
+    return namespace["__init__"]
+
+
+def compact_model(
+    model: Type,
+    name: str = None,
+    frozen: bool = False,
+    interned: Iterable[str] = (),
+) -> Type[CompactModel]:
+    """
+    Create a slotted counterpart of a dataclass model. As in dataclasses, the
+    constructor is generated as source; interning adds a dictionary lookup per
+    interned field, trading construction time for memory.
+
+    :param model: dataclass to mirror
+    :param name: name of the new class, "Compact" + the model's name if not set
+    :param frozen: make instances immutable, and hashable
+    :param interned: names of string fields whose values are interned, so that
+        repeated values (e.g. statuses, model numbers) are stored only once
+    :return: new class
+    """
+    model_fields = fields(model)
+    names = tuple(field.name for field in model_fields)
+    interned = frozenset(interned)
+    unknown = interned.difference(names)
+    if unknown:
+        raise ValueError(f"{model.__name__} has no fields {sorted(unknown)}")
+
+    attributes = {
+        "__slots__": names,
+        "__init__": _init_function(model_fields, frozen, interned),
+        "__doc__": f"Slotted counterpart of {model.__name__}",
+        "__module__": __name__,
+        "_model": model,
+        "_fields": names,
+    }
+    if frozen:
+        attributes["__setattr__"] = _frozen_setattr
+        attributes["__delattr__"] = _frozen_delattr
+        attributes["__hash__"] = _frozen_hash
+    else:
+        attributes["__hash__"] = None
+    return type(
+        name if name else f"Compact{model.__name__}", (CompactModel,), attributes
+    )
+
+
+# String fields with few distinct values (e.g. statuses, model numbers), interned
+# by the compact models and encoded as categories by columnar
+CATEGORICAL_FIELDS = {
+    Device: (
+        "lockstatus",
+        "batterystatus",
+        "modelnumber",
+        "firmwareversion",
+        "devicetimezone",
+    ),
+    DeviceDetails: (
+        "audiostatus",
+        "ledstatus",
+        "securescreenstatus",
+        "autolockstate",
+        "batterystatus",
+        "doorstatus",
+        "locktamperstate",
+        "securemodeenabled",
+        "securemodeactive",
+        "alexahomelockstatus",
+        "googlehomelockstatus",
+        "modelnumber",
+        "productfamily",
+        "sku",
+        "firmwarebundleversion",
+        "devicetimezone",
+        "hardwarevariant",
+    ),
+    Home: ("useraccesslevel", "useraccesslevelstatus"),
+    SharedUser: ("useraccesslevel", "useraccesslevelstatus"),
+}
+
+CompactDevice = compact_model(
+    Device, interned=CATEGORICAL_FIELDS[Device] + ("owneremail",)
+)
+CompactDeviceDetails = compact_model(
+    DeviceDetails, interned=CATEGORICAL_FIELDS[DeviceDetails]
+)
+CompactHome = compact_model(Home, interned=CATEGORICAL_FIELDS[Home] + ("email",))
+CompactSharedUser = compact_model(SharedUser, interned=CATEGORICAL_FIELDS[SharedUser])
+CompactUser = compact_model(
+    User, interned=("operationtype", "brandname", "countrycode")
+)
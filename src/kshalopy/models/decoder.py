@@ -0,0 +1,202 @@
+"""
+models/decoder.py
+"""
+
+import logging
+import threading
+
+from dataclasses import fields
+from typing import Any, Dict, Iterable, List, Type
+
+from ..models.compact import CompactModel
+from ..utils import date_string_to_timestamp
+
+logger = logging.getLogger(__name__)
+
+TRUE_STRINGS = frozenset(("true", "1", "yes", "on"))
+FALSE_STRINGS = frozenset(("false", "0", "no", "off", ""))
+
+
+def _to_int(value: Any) -> Any:
+    """
+    Coerce a value to int: integral numbers, and strings holding them (e.g. "80" or
+    "80.0"); fractions (e.g. "1.5") are not truncated
+
+    :param value: value to coerce
+    :return: coerced value
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise ValueError(f"cannot coerce {value!r} to int")
+
+
+def _to_timestamp(value: Any) -> Any:
+    """
+    Coerce a value to an int timestamp: as _to_int, except that strings which are not
+    numbers are parsed as dates
+
+    :param value: value to coerce
+    :return: coerced value
+    """
+    if isinstance(value, str):
+        try:
+            float(value)
+        except ValueError:
+            return int(date_string_to_timestamp(value))
+    return _to_int(value)
+
+
+def _to_bool(value: Any) -> Any:
+    """
+    Coerce a value to bool: numbers by truth, strings by common spellings
+
+    :param value: value to coerce
+    :return: coerced value
+    """
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in TRUE_STRINGS:
+            return True
+        if lowered in FALSE_STRINGS:
+            return False
+    raise ValueError(f"cannot coerce {value!r} to bool")
+
+
+COERCERS = {int: _to_int, bool: _to_bool, "int": _to_int, "bool": _to_bool}
+# int fields that may hold a date string rather than a timestamp
+TIMESTAMP_FIELDS = frozenset(
+    ("lastupdatestatus", "activationdate", "clearedeventhistorytimestamp")
+)
+
+
+# Its decode function is generated, so it is an attribute rather than a method
+class ModelDecoder:  # pylint: disable=too-few-public-methods
+    """
+    Decodes API items (dicts decoded from JSON) into a model, tolerating schema drift:
+    keys the model does not know are dropped and recorded in unknown_keys, and int and
+    bool fields holding other types (e.g. "42", "true", or a date string for one of
+    the TIMESTAMP_FIELDS) are coerced. Values that cannot be coerced, such as "1.5"
+    for an int, are kept as they are.
+
+    The decode function is generated and compiled per model, like a dataclass
+    __init__, so well-formed items cost one key-set check and one type check per
+    int/bool field present on top of plain construction.
+    """
+
+    def __init__(self, model: Type):
+        """
+        :param model: dataclass model, or compact model, to decode into
+        """
+        self.model = model
+        self.unknown_keys = set()
+        self.coercion_failures = 0
+        self._lock = threading.Lock()
+        if isinstance(model, type) and issubclass(model, CompactModel):
+            model_fields = fields(model._model)  # pylint: disable=protected-access
+        else:
+            model_fields = fields(model)
+        self.field_names = frozenset(field.name for field in model_fields)
+        # Known and already reported unknown keys
+        self._seen_keys = set(self.field_names)
+        coercers = {
+            field.name: COERCERS[field.type]
+            for field in model_fields
+            if field.type in COERCERS
+        }
+        for name in TIMESTAMP_FIELDS.intersection(coercers):
+            if coercers[name] is _to_int:
+                coercers[name] = _to_timestamp
+        self.decode = self._generate(coercers)
+
+    def _generate(self, coercers: Dict[str, Any]):
+        lines = [
+            "def decode(item):",
+            "    original = item",
+            "    if not names.issuperset(item):",
+            "        if not seen.issuperset(item):",
+            "            record_unknown(item)",
+            "        item = {key: item[key] for key in item if key in names}",
+            "    get = item.get",
+        ]
+        namespace = {
+            "model": self.model,
+            "names": self.field_names,
+            "seen": self._seen_keys,
+            "record_unknown": self._record_unknown,
+            "coercion_failed": self._coercion_failed,
+        }
+        for index, (name, coercer) in enumerate(coercers.items()):
+            expected = "bool" if coercer is _to_bool else "int"
+            namespace[f"coercer{index}"] = coercer
+            lines += [
+                f"    value = get({name!r})",
+                f"    if value is not None and value.__class__ is not {expected}:",
+                "        if item is original:",
+                "            item = dict(item)",
+                "        try:",
+                f"            item[{name!r}] = coercer{index}(value)",
+                "        except (ValueError, OverflowError):",
+                f"            coercion_failed({name!r}, value)",
+            ]
+        lines.append("    return model(**item)")
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        return namespace["decode"]
+
+    def _record_unknown(self, item: Dict[str, Any]) -> None:
+        with self._lock:
+            new = item.keys() - self._seen_keys
+            self.unknown_keys.update(new)
+            self._seen_keys.update(new)
+        if new:
+            logger.info(
+                "Ignoring unknown %s fields : %s", self.model.__name__, sorted(new)
+            )
+
+    def _coercion_failed(self, name: str, value: Any) -> None:
+        with self._lock:
+            self.coercion_failures += 1
+        logger.debug("Keeping %s.%s value %r", self.model.__name__, name, value)
+
+    def decode_many(self, items: Iterable[Dict[str, Any]]) -> List[Any]:
+        """
+        Decode several items
+
+        :param items: items to decode
+        :return: List of model instances
+        """
+        decode = self.decode
+        return [decode(item) for item in items]
+
+
+_decoders: Dict[Type, ModelDecoder] = {}
+_decoders_lock = threading.Lock()
+
+
+def get_decoder(model: Type) -> ModelDecoder:
+    """
+    Return the process-wide decoder for a model, generating it on first use
+
+    :param model: dataclass model, or compact model, to decode into
+    :return: decoder
+    """
+    decoder = _decoders.get(model)
+    if decoder is None:
+        with _decoders_lock:
+            decoder = _decoders.get(model)
+            if decoder is None:
+                decoder = ModelDecoder(model)
+                _decoders[model] = decoder
+    return decoder
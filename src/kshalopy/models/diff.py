@@ -0,0 +1,197 @@
+"""
+models/diff.py
+"""
+
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, Union
+
+from ..models.compact import CompactModel
+
+
+@dataclass
+class FieldChange:
+    """
+    Data-only class for a change to one field of a record
+    """
+
+    name: str
+    old: Any
+    new: Any
+
+
+@dataclass
+class ChangeEvent:
+    """
+    Data-only class for a change to one record between two snapshots
+    """
+
+    kind: str
+    key: Any
+    old: Any = None
+    new: Any = None
+    changes: Dict[str, FieldChange] = field(default_factory=dict)
+
+
+class SnapshotDiffer:
+    """
+    Compares each snapshot of a collection of records (e.g. the Devices or Device
+    Details returned by a poll) with the previous one, keyed by deviceid, and emits
+    events for the records that were added, removed or changed. The tracked field
+    values of each record are copied into a tuple when its snapshot is taken, so a
+    record changed in place is still compared with its previous values. Unchanged
+    records cost one tuple comparison, and only changed records are compared field
+    by field.
+    """
+
+    ADDED = "added"
+    CHANGED = "changed"
+    REMOVED = "removed"
+
+    def __init__(self, key: str = "deviceid", ignore: Iterable[str] = ()):
+        """
+        :param key: attribute identifying a record, used when a snapshot is not a
+            mapping
+        :param ignore: fields whose changes are not reported, e.g. lastupdatestatus
+        """
+        self.key = key
+        self.ignore = frozenset(ignore)
+        self._values: Dict[Any, tuple] = {}
+        self._records: Dict[Any, Any] = {}
+        self._names: Tuple[str, ...] = None
+        self._values_of = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._records
+
+    def get(self, key: Any) -> Any:
+        """
+        Return a record as of the last snapshot
+
+        :param key: identifies the record
+        :return: record, or None if unknown
+        """
+        return self._records.get(key)
+
+    def _track(self, record: Any) -> None:
+        """
+        Set the tracked fields from the first record seen
+
+        :param record: dataclass model or compact model instance
+        :return: None
+        """
+        if isinstance(record, CompactModel):
+            names = record._fields  # pylint: disable=protected-access
+        else:
+            names = tuple(model_field.name for model_field in fields(record))
+        self._names = tuple(name for name in names if name not in self.ignore)
+        getter = attrgetter(*self._names)
+        # attrgetter returns a bare value, not a tuple, for a single name
+        self._values_of = getter if len(self._names) > 1 else lambda r: (getter(r),)
+
+    def _items(
+        self, snapshot: Union[Iterable[Any], Mapping[Any, Any]]
+    ) -> List[Tuple[Any, Any]]:
+        """
+        Return the records of a snapshot with their keys
+
+        :param snapshot: records, or a mapping of key to record
+        :return: List of (key, record) pairs
+        """
+        if isinstance(snapshot, Mapping):
+            return list(snapshot.items())
+        records = list(snapshot)
+        return list(zip(map(attrgetter(self.key), records), records))
+
+    def _changes(self, old_values: tuple, new_values: tuple) -> Dict[str, FieldChange]:
+        """
+        Compare the tracked values of a record field by field
+
+        :param old_values: values as of the previous snapshot
+        :param new_values: current values
+        :return: changes, by field name
+        """
+        return {
+            name: FieldChange(name, old, new)
+            for name, old, new in zip(self._names, old_values, new_values)
+            if old != new
+        }
+
+    def _removed(
+        self, current_values: Dict[Any, tuple], added: int
+    ) -> List[ChangeEvent]:
+        """
+        Return events for the records of the previous snapshot missing from the current
+
+        :param current_values: tracked values of the current snapshot, by key
+        :param added: number of records of the current snapshot that were added
+        :return: List of change events
+        """
+        # Only look for removed records if some previous ones were not matched
+        if len(current_values) - added == len(self._values):
+            return []
+        return [
+            ChangeEvent(self.REMOVED, key, old=record)
+            for key, record in self._records.items()
+            if key not in current_values
+        ]
+
+    def diff(
+        self, snapshot: Union[Iterable[Any], Mapping[Any, Any]], complete: bool = True
+    ) -> List[ChangeEvent]:
+        """
+        Compare a snapshot with the previous one and remember it for the next
+
+        :param snapshot: records, or a mapping of key to record (e.g. the details of
+            a FleetSnapshot)
+        :param complete: the snapshot holds every record, so records missing from it
+            were removed; set False for partial snapshots, e.g. a single Home
+        :return: List of change events, in snapshot order, followed by removals
+        """
+        items = self._items(snapshot)
+        if self._values_of is None:
+            if not items:
+                return []
+            self._track(items[0][1])
+        values_of = self._values_of
+
+        events = []
+        added = 0
+        values = self._values
+        if complete:
+            current_values, current_records = {}, {}
+        else:
+            current_values, current_records = values, self._records
+        for key, record in items:
+            new_values = values_of(record)
+            old_values = values.get(key)
+            if old_values is None:
+                added += 1
+                events.append(ChangeEvent(self.ADDED, key, new=record))
+            elif old_values != new_values:
+                changes = self._changes(old_values, new_values)
+                if changes:
+                    events.append(
+                        ChangeEvent(
+                            self.CHANGED, key, self._records[key], record, changes
+                        )
+                    )
+            current_values[key] = new_values
+            current_records[key] = record
+
+        if complete:
+            events += self._removed(current_values, added)
+            self._values, self._records = current_values, current_records
+        return events
+
+    def reset(self) -> None:
+        """
+        Forget the previous snapshot, so every record of the next is reported added
+
+        :return: None
+        """
+        self._values = {}
+        self._records = {}
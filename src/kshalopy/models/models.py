@@ -6,7 +6,8 @@ models/models.py
 # too-many-instance-attributes, too-few-public-methods
 # The models are as big as they are and no smaller; these are all dataclasses
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
 
 
 @dataclass
@@ -118,3 +119,59 @@ class User:
     smsnotification: bool = None
     pushnotification: bool = None
     countrycode: str = None
+
+
+@dataclass
+class FleetSnapshot:
+    """
+    Data-only class for a point-in-time view of every Home, Device and Device Details
+    visible to a user, indexed by homeid and deviceid. Devices that appear in more than
+    one Home (e.g. shared homes) are only held once.
+    """
+
+    homes: Dict[str, Home] = field(default_factory=dict)
+    devices: Dict[str, Device] = field(default_factory=dict)
+    details: Dict[str, DeviceDetails] = field(default_factory=dict)
+    home_devices: Dict[str, List[str]] = field(default_factory=dict)
+    device_homes: Dict[str, List[str]] = field(default_factory=dict)
+
+    def add_home(self, home: Home, devices: Iterable[Device]) -> None:
+        """
+        Add a Home and the Devices in it to the snapshot
+
+        :param home: Home to add
+        :param devices: Devices in the Home
+        :return: None
+        """
+        self.homes[home.homeid] = home
+        device_ids = self.home_devices.setdefault(home.homeid, [])
+        for device in devices:
+            self.devices.setdefault(device.deviceid, device)
+            device_ids.append(device.deviceid)
+            self.device_homes.setdefault(device.deviceid, []).append(home.homeid)
+
+    def devices_in_home(self, homeid: str) -> List[Device]:
+        """
+        Return the Devices in a given Home
+
+        :param homeid: ID of the Home
+        :return: List of Devices
+        """
+        return [self.devices[deviceid] for deviceid in self.home_devices[homeid]]
+
+
+@dataclass
+class ActuationResult:
+    """
+    Data-only class for the outcome of locking or unlocking one Device
+    """
+
+    deviceid: str
+    action: str
+    success: bool
+    affected: int = None
+    error: Exception = None
+    confirmed: bool = None
+    lockstatus: str = None
+    latency: float = None
+    confirmed_by: str = None
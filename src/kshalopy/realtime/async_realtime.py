@@ -0,0 +1,152 @@
+"""
+realtime/async_realtime.py
+"""
+
+import asyncio
+import json
+import logging
+
+from typing import Dict, List
+
+from ..config import Config
+from ..credentials.credentials import AppCredentials
+from ..models.models import Device
+from ..realtime.dispatch import EventDispatcher
+from ..realtime.realtime import BaseRealtimeClient, ReconnectHandler
+from ..state.store import DeviceStateStore
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover
+    websockets = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRealtimeClient(BaseRealtimeClient):
+    """
+    Realtime GQL subscription client running on an asyncio event loop. Requires the
+    optional 'websockets' package. Keep-alive tracking is a receive deadline on the
+    loop, so no threads are used per connection.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        config: Config,
+        credentials: AppCredentials,
+        devices: Dict[str, Device] = None,
+        timeout: int = 10,
+        *,
+        state_store: DeviceStateStore = None,
+        subscribe_devices: bool = True,
+        close_timeout: float = 10,
+        on_reconnect: ReconnectHandler = None,
+        dispatcher: EventDispatcher = None,
+    ):
+        super().__init__(
+            config=config,
+            credentials=credentials,
+            devices=devices,
+            timeout=timeout,
+            state_store=state_store,
+            subscribe_devices=subscribe_devices,
+            on_reconnect=on_reconnect,
+            dispatcher=dispatcher,
+        )
+        self.close_timeout = close_timeout
+        self._websocket = None
+        self._loop = None
+        self._outgoing = None
+        self._drained = None
+
+    def _send(self, msg: str) -> None:
+        # May be called from the loop (message handling) or from other threads
+        # (subscribe / unsubscribe), so always hand off through the loop
+        self._loop.call_soon_threadsafe(self._outgoing.put_nowait, msg)
+
+    async def _writer(self) -> None:
+        while True:
+            msg = await self._outgoing.get()
+            await self._websocket.send(msg)
+
+    @property
+    def active(self) -> bool:
+        """
+        Return status of the realtime client
+
+        :return: Status of realtime client
+        """
+        return self._websocket is not None
+
+    async def start(self) -> None:
+        """
+        Connect and process messages until the connection is closed or a keep-alive is
+        missed
+
+        :return: None
+        """
+        if websockets is None:
+            raise ImportError("AsyncRealtimeClient requires the 'websockets' package")
+        logger.info("Starting connection")
+        self._loop = asyncio.get_running_loop()
+        self._outgoing = asyncio.Queue()
+        self._drained = asyncio.Event()
+        async with websockets.connect(
+            self._connection_url, subprotocols=["graphql-ws"]
+        ) as websocket:
+            self._websocket = websocket
+            writer = asyncio.ensure_future(self._writer())
+            try:
+                logger.info("Opening connection")
+                self._send(json.dumps({"type": "connection_init"}))
+                while True:
+                    try:
+                        msg = await asyncio.wait_for(
+                            websocket.recv(), timeout=self.timeout
+                        )
+                    except asyncio.TimeoutError:
+                        logger.warning("Keep-alive not received, closing connection")
+                        self.missed_keepalive_closes += 1
+                        break
+                    except websockets.ConnectionClosed as error:
+                        logger.info("Connection closed : %s", error)
+                        break
+                    self._handle_message(msg)
+                    if not self._subscription_ids:
+                        self._drained.set()
+            finally:
+                writer.cancel()
+                self._websocket = None
+                self._handle_close()
+                self._drained.set()
+
+    async def close(self, force: bool = False, timeout: float = None) -> List[str]:
+        """
+        Close the connection, waits until subscriptions have been completed cleanly, or
+        the timeout has passed, unless force is set
+
+        :param force: Do not wait for subscriptions to complete before disconnecting
+        :param timeout: Maximum time to wait for subscriptions to complete, defaults to
+            close_timeout
+        :return: IDs of subscriptions that did not complete before disconnecting
+        """
+        logger.info("Closing connection")
+        websocket = self._websocket
+        if websocket is None:
+            return []
+        self._drained.clear()
+        for subscription_id in self._subscription_ids:
+            self._send(self._build_stop_message(subscription_id))
+        if self._subscription_ids and not force:
+            try:
+                await asyncio.wait_for(
+                    self._drained.wait(),
+                    timeout=self.close_timeout if timeout is None else timeout,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Subscriptions not completed : %s", self._subscription_ids
+                )
+        pending = list(self._subscription_ids)
+        await websocket.close()
+        return pending
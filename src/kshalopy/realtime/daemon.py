@@ -4,25 +4,72 @@ realtime/daemon.py
 
 
 import logging
+import random
 import threading
+import time
 
-from ..realtime.realtime import RealtimeClient
+from ..realtime.realtime import RealtimeClient, ReconnectHandler
 
 logger = logging.getLogger(__name__)
 
 
 class RealtimeDaemon:
     """
-    Daemon for running the realtime sync interface in a background thread
+    Daemon for running the realtime sync interface in a background thread. If the
+    connection drops, or a keep-alive is missed, the client is reconnected after a
+    jittered exponential backoff and its subscriptions are restarted.
     """
 
-    def __init__(self, client: RealtimeClient, start: bool = False):
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        client: RealtimeClient,
+        start: bool = False,
+        *,
+        reconnect: bool = True,
+        backoff_base: float = 1,
+        backoff_max: float = 60,
+        on_reconnect: ReconnectHandler = None,
+    ):
         self._client = client
-        self._worker = threading.Thread(target=self._client.start, daemon=True)
+        self.reconnect = reconnect
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.reconnect_count = 0
+        if on_reconnect:
+            self._client.on_reconnect = on_reconnect
+        self._exit_event = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
 
         if start:
             self.start()
 
+    def _backoff(self, attempt: int) -> float:
+        """
+        Calculate the delay before a reconnection attempt ("full jitter")
+
+        :param attempt: number of consecutive failed attempts
+        :return: delay in seconds
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _run(self) -> None:
+        attempt = 0
+        while not self._exit_event.is_set():
+            started = time.monotonic()
+            self._client.start()
+            if self._exit_event.is_set() or not self.reconnect:
+                break
+            if time.monotonic() - started > self.backoff_max:
+                # The connection was up for a while, this is a fresh failure
+                attempt = 0
+            delay = self._backoff(attempt)
+            attempt += 1
+            logger.warning("Connection lost, reconnecting in %.1f seconds", delay)
+            if self._exit_event.wait(delay):
+                break
+            self._client.reset()
+            self.reconnect_count += 1
+
     def start(self) -> bool:
         """
         Start the daemon thread
@@ -30,21 +77,37 @@ class RealtimeDaemon:
         :return: Daemon state
         """
         logger.info("Starting daemon")
-        self._worker = threading.Thread(target=self._client.start, daemon=True)
+        self._exit_event.clear()
+        self._worker = threading.Thread(target=self._run, daemon=True)
         self._worker.start()
         return self._worker.is_alive()
 
-    def stop(self) -> bool:
+    def stop(self, timeout: float = None) -> bool:
         """
-        Stop the daemon thread
+        Stop the daemon thread, closing the client's connection
         
-        :return: Daemon state
+        :param timeout: maximum time to wait for the daemon to stop, forever if None
+        :return: True if the daemon stopped
         """
         logger.info("Stopping daemon")
-        if self._client.active:
-            self._client.close()
+        self._exit_event.set()
+        if self._worker.is_alive():
             logger.info("Waiting for daemon to stop")
-            self._worker.join()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        closed = False
+        while self._worker.is_alive():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            if not closed and self._client.active:
+                self._client.close()
+                closed = True
+            if closed:
+                self._worker.join(remaining)
+            else:
+                # The daemon may be between reconnection attempts, or about to start
+                # the client, so check again shortly
+                self._worker.join(0.1 if remaining is None else min(0.1, remaining))
         return not self._worker.is_alive()
 
     @property
@@ -0,0 +1,279 @@
+"""
+realtime/dispatch.py
+"""
+
+import logging
+import queue
+import time
+
+from dataclasses import dataclass, replace
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Tuple
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+DeviceEventHandler = Callable[[Dict[str, Any]], None]
+
+
+@dataclass
+class EventHandlerRegistration:
+    """
+    Data-only class for a device event handler and the events it is interested in
+    """
+
+    handler_id: str
+    handler: DeviceEventHandler
+    deviceids: FrozenSet[str] = None
+    operationtypes: FrozenSet[str] = None
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """
+        Check an event against the handler's filters
+
+        :param event: onManageDevice payload
+        :return: True if the handler should receive the event
+        """
+        return (self.deviceids is None or event.get("deviceid") in self.deviceids) and (
+            self.operationtypes is None
+            or event.get("operationtype") in self.operationtypes
+        )
+
+
+@dataclass
+class DispatchStats:
+    """
+    Data-only class for event dispatcher counters. Queue depths are those of a single
+    worker queue, the fullest, so they compare with the queue_size limit.
+    """
+
+    queued: int = 0
+    handled: int = 0
+    dropped: int = 0
+    failed: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+
+
+def _time_left(deadline: float) -> float:
+    """
+    Return the time left until a deadline
+
+    :param deadline: time.monotonic() value, or None for no deadline
+    :return: seconds left, at least 0, or None if there is no deadline
+    """
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+class _WorkerQueue(queue.Queue):
+    """
+    Bounded queue of events for one worker thread
+    """
+
+    # Events are being dropped, so falling behind has already been reported
+    dropping = False
+    # The dispatcher is stopping, so the worker exits once the queue is empty
+    stopping = False
+
+
+class EventDispatcher:
+    """
+    Runs device event handlers on a pool of worker threads, so that slow handlers
+    never hold up the thread reading the connection. Each worker has a bounded queue
+    and events are assigned to workers by deviceid, so the events of a device are
+    handled in the order they were received. When a worker's queue is full, new
+    events for it are dropped and counted rather than waited for. May be shared by
+    several realtime clients.
+    """
+
+    def __init__(self, max_workers: int = 4, queue_size: int = 1000):
+        """
+        :param max_workers: number of worker threads
+        :param queue_size: maximum number of events waiting per worker
+        """
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._registrations: Tuple[EventHandlerRegistration, ...] = ()
+        self._queues: List[_WorkerQueue] = []
+        self._workers: List[Thread] = []
+        self._stats = DispatchStats()
+        self._lock = Lock()
+
+    def add_handler(
+        self,
+        handler: DeviceEventHandler,
+        deviceids: Iterable[str] = None,
+        operationtypes: Iterable[str] = None,
+    ) -> str:
+        """
+        Register a handler for device events
+
+        :param handler: called with the onManageDevice payload of each matching event
+        :param deviceids: only pass events for these devices, all devices if not set
+        :param operationtypes: only pass events with these operation types, all if not
+            set
+        :return: handler ID
+        """
+        registration = EventHandlerRegistration(
+            handler_id=str(uuid4()),
+            handler=handler,
+            deviceids=None if deviceids is None else frozenset(deviceids),
+            operationtypes=(
+                None if operationtypes is None else frozenset(operationtypes)
+            ),
+        )
+        with self._lock:
+            # Replaced rather than mutated, so dispatch can read it without the lock
+            self._registrations += (registration,)
+        return registration.handler_id
+
+    def remove_handler(self, handler_id: str) -> bool:
+        """
+        Unregister a handler. Events already queued for it are still handled.
+
+        :param handler_id: ID returned by add_handler
+        :return: True if the handler was registered
+        """
+        with self._lock:
+            registrations = tuple(
+                r for r in self._registrations if r.handler_id != handler_id
+            )
+            removed = len(registrations) < len(self._registrations)
+            self._registrations = registrations
+        return removed
+
+    @property
+    def handlers(self) -> List[EventHandlerRegistration]:
+        """
+        Return the registered handlers
+
+        :return: List of handler registrations
+        """
+        return list(self._registrations)
+
+    def dispatch(self, event: Dict[str, Any]) -> bool:
+        """
+        Queue an event for the handlers it matches, without blocking
+
+        :param event: onManageDevice payload
+        :return: True if queued, False if no handler matched or the queue was full
+        """
+        handlers = tuple(r.handler for r in self._registrations if r.matches(event))
+        if not handlers:
+            return False
+        if not self._workers:
+            self.start()
+        worker_queue = self._queues[hash(event.get("deviceid")) % len(self._queues)]
+        try:
+            worker_queue.put_nowait((handlers, event))
+        except queue.Full:
+            with self._lock:
+                self._stats.dropped += 1
+                dropping, worker_queue.dropping = worker_queue.dropping, True
+            if not dropping:
+                logger.warning("Event handlers are falling behind, dropping events")
+            return False
+        depth = worker_queue.qsize()
+        with self._lock:
+            self._stats.queued += 1
+            self._stats.max_queue_depth = max(self._stats.max_queue_depth, depth)
+            worker_queue.dropping = False
+        return True
+
+    def _run(self, worker_queue: _WorkerQueue) -> None:
+        while True:
+            item = worker_queue.get()
+            if item is None:
+                worker_queue.task_done()
+                break
+            handlers, event = item
+            failed = 0
+            for handler in handlers:
+                try:
+                    handler(event)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Event handler failed for event %s", event)
+                    failed += 1
+            with self._lock:
+                self._stats.handled += 1
+                self._stats.failed += failed
+            worker_queue.task_done()
+            if worker_queue.stopping and worker_queue.empty():
+                break
+
+    def start(self) -> None:
+        """
+        Start the worker threads, if not already running. Called on the first dispatch.
+
+        :return: None
+        """
+        with self._lock:
+            if self._workers:
+                return
+            self._queues = [
+                _WorkerQueue(self.queue_size) for _ in range(self.max_workers)
+            ]
+            self._workers = [
+                Thread(
+                    target=self._run,
+                    args=(worker_queue,),
+                    name=f"kshalopy-events-{index}",
+                    daemon=True,
+                )
+                for index, worker_queue in enumerate(self._queues)
+            ]
+            for worker in self._workers:
+                worker.start()
+
+    def join(self) -> None:
+        """
+        Wait for every queued event to be handled
+
+        :return: None
+        """
+        for worker_queue in list(self._queues):
+            worker_queue.join()
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        Stop the worker threads once the events already queued have been handled
+
+        :param timeout: maximum time to wait for the workers, forever if None
+        :return: True if every worker stopped
+        """
+        with self._lock:
+            workers, self._workers = self._workers, []
+            queues = self._queues
+        if not workers:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker_queue in queues:
+            worker_queue.stopping = True
+            try:
+                worker_queue.put(None, timeout=_time_left(deadline))
+            except queue.Full:
+                # The worker still stops, on its own, once its queue is empty
+                pass
+        for worker in workers:
+            worker.join(_time_left(deadline))
+        return not any(worker.is_alive() for worker in workers)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Return state of the worker threads
+
+        :return: True if running
+        """
+        return bool(self._workers)
+
+    def stats(self) -> DispatchStats:
+        """
+        Return dispatch counters, and the number of events currently queued for the
+        busiest worker
+
+        :return: copy of the counters
+        """
+        depth = max((worker_queue.qsize() for worker_queue in self._queues), default=0)
+        with self._lock:
+            return replace(self._stats, queue_depth=depth)
@@ -4,11 +4,14 @@ realtime/realtime.py
 
 import json
 import logging
+import time
 
+from abc import ABC, abstractmethod
 from base64 import urlsafe_b64encode
+from dataclasses import dataclass, field
 from datetime import datetime
-from threading import Timer
-from typing import Dict
+from threading import Condition, Event, Lock, RLock, Thread
+from typing import Any, Callable, Dict, Iterable, List
 from uuid import uuid4
 
 from websocket import WebSocketApp
@@ -16,36 +19,106 @@ from websocket import WebSocketApp
 from ..config import Config
 from ..credentials.credentials import AppCredentials
 from ..models.models import Device
+from ..realtime.dispatch import DeviceEventHandler, DispatchStats, EventDispatcher
+from ..realtime.watchdog import DEFAULT_WATCHDOG, KeepAliveWatchdog
+from ..state.store import DeviceStateStore
 
 logger = logging.getLogger(__name__)
 
+SubscriptionHandler = Callable[[str, Dict[str, Any]], None]
+ReconnectHandler = Callable[["BaseRealtimeClient"], None]
 
-class RealtimeClient:
+
+@dataclass
+class Subscription:
+    """
+    Data-only class for a GQL subscription registered on a realtime connection
+    """
+
+    subscription_id: str
+    query: str
+    credentials: AppCredentials
+    handler: SubscriptionHandler = None
+
+
+@dataclass(eq=False)
+class DeviceStatusWaiter:
+    """
+    Data-only class for an expected device status, resolved by the first matching
+    onManageDevice event received after it was registered
+    """
+
+    deviceid: str
+    lockstatus: str
+    registered: float = field(default_factory=time.monotonic)
+    received: float = None
+    event: Dict[str, Any] = None
+    _done: Event = field(default_factory=Event, repr=False, compare=False)
+
+    def resolve(self, event: Dict[str, Any]) -> None:
+        """
+        Record the matching event and wake any waiting thread
+
+        :param event: onManageDevice payload
+        :return: None
+        """
+        self.event = event
+        self.received = time.monotonic()
+        self._done.set()
+
+    def wait(self, timeout: float = None) -> Dict[str, Any]:
+        """
+        Wait for the expected status to be reported
+
+        :param timeout: maximum time to wait in seconds, forever if None
+        :return: onManageDevice payload, or None if the timeout passed first
+        """
+        self._done.wait(timeout)
+        return self.event
+
+
+# Connection state, subscription registry, status waiters and event dispatch all
+# belong to the one connection
+class BaseRealtimeClient(ABC):  # pylint: disable=too-many-instance-attributes
     """
-    Realtime GQL subscription client
+    Transport independent part of the realtime GQL subscription client: connection
+    details, subscription registry and AppSync message handling. Any number of
+    subscriptions, for any number of identities, can be multiplexed over the one
+    connection; each subscription carries its own authorization and has its data
+    messages routed to its own handler.
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         config: Config,
         credentials: AppCredentials,
         devices: Dict[str, Device] = None,
         timeout: int = 10,
+        *,
+        state_store: DeviceStateStore = None,
+        subscribe_devices: bool = True,
+        on_reconnect: ReconnectHandler = None,
+        dispatcher: EventDispatcher = None,
     ):
         self.config = config
         self.credentials = credentials
         self.timeout = timeout
-        self.ws_app = WebSocketApp(
-            self._connection_url,
-            subprotocols=["graphql-ws"],
-            on_close=self._on_close,
-            on_error=self._on_error,
-            on_message=self._on_message,
-            on_open=self._on_open,
-        )
+        self.state_store = state_store
         self._devices = devices if devices else {}
         self._subscription_ids = []
-        self._timer = self._new_timer()
+        self._subscriptions: Dict[str, Subscription] = {}
+        self._subscriptions_lock = RLock()
+        self._subscriptions_changed = Condition(self._subscriptions_lock)
+        self._connected = False
+        self.missed_keepalive_closes = 0
+        self.connection_count = 0
+        self.on_reconnect = on_reconnect
+        self._waiters: Dict[str, List[DeviceStatusWaiter]] = {}
+        self._waiters_lock = Lock()
+        self.dispatcher = dispatcher
+
+        if subscribe_devices:
+            self.subscribe_devices()
 
     @property
     def _connection_url(self) -> str:
@@ -65,18 +138,25 @@ class RealtimeClient:
 
     @property
     def _device_subscription_query(self) -> str:
+        return self._build_device_subscription_query(self.credentials.username)
+
+    @staticmethod
+    def _build_device_subscription_query(username: str) -> str:
         return json.dumps(
             {
                 "query": f"""
                     subscription onManageDevice {{
-                    onManageDevice(email: "{self.credentials.username}")
+                    onManageDevice(email: "{username}")
                     {{ deviceid devicename devicestatus operationtype }} }}
                     """,
                 "variables": {},
             }
         )
 
-    def _build_start_message(self, subscription_id: str, query: str) -> str:
+    def _build_start_message(
+        self, subscription_id: str, query: str, credentials: AppCredentials = None
+    ) -> str:
+        credentials = credentials if credentials else self.credentials
         return json.dumps(
             {
                 "id": subscription_id,
@@ -85,7 +165,7 @@ class RealtimeClient:
                     "extensions": {
                         "authorization": {
                             "host": self._host,
-                            "Authorization": self.credentials.id_token,
+                            "Authorization": credentials.id_token,
                         }
                     },
                 },
@@ -97,63 +177,340 @@ class RealtimeClient:
     def _build_stop_message(subscription_id: str) -> str:
         return json.dumps({"id": subscription_id, "type": "stop"})
 
-    @staticmethod
-    def _on_close(_ws_app: WebSocketApp, status_code: int, msg: str) -> None:
-        logger.info("Connection closed : %s - %s", status_code, msg)
+    @abstractmethod
+    def _send(self, msg: str) -> None:
+        """
+        Send a message over the connection, implemented by each transport
 
-    @staticmethod
-    def _on_error(_ws_app: WebSocketApp, error: Exception) -> None:
-        logger.error(error)
+        :param msg: message to send
+        :return: None
+        """
 
-    def _on_message(self, _ws_app: WebSocketApp, msg: str) -> None:
+    def _handle_close(self) -> None:
+        with self._subscriptions_changed:
+            self._connected = False
+            # Subscriptions do not survive the connection, they are restarted on the
+            # next connection_ack
+            self._subscription_ids.clear()
+            self._subscriptions_changed.notify_all()
+
+    def _handle_message(self, msg: str) -> None:
         logger.info("Message received : %s", msg)
         msg_content = json.loads(msg)
 
         if msg_content["type"] == "connection_ack":
             self.timeout = msg_content["payload"]["connectionTimeoutMs"] / 1000
-
-            subscription_message = self._build_start_message(
-                str(uuid4()), self._device_subscription_query
-            )
-            self.ws_app.send(subscription_message)
+            with self._subscriptions_lock:
+                self._connected = True
+                self.connection_count += 1
+                subscriptions = list(self._subscriptions.values())
+            for subscription in subscriptions:
+                self._start_subscription(subscription)
+            if self.connection_count > 1 and self.on_reconnect:
+                # Reconciliation is likely to make REST calls, keep it off the reader
+                Thread(target=self.on_reconnect, args=(self,), daemon=True).start()
 
         elif msg_content["type"] == "start_ack":
-            self._subscription_ids.append(msg_content["id"])
+            with self._subscriptions_changed:
+                self._subscription_ids.append(msg_content["id"])
+                self._subscriptions_changed.notify_all()
 
         elif msg_content["type"] == "complete":
-            self._subscription_ids.remove(msg_content["id"])
+            with self._subscriptions_changed:
+                if msg_content["id"] in self._subscription_ids:
+                    self._subscription_ids.remove(msg_content["id"])
+                self._subscriptions_changed.notify_all()
+
+        elif msg_content["type"] == "error":
+            logger.error(
+                "Subscription %s error : %s",
+                msg_content.get("id"),
+                msg_content.get("payload"),
+            )
 
         elif (
             msg_content["type"] == "data"
             and msg_content["id"] in self._subscription_ids
         ):
-            device_id = msg_content["payload"]["data"]["onManageDevice"]["deviceid"]
-            status = msg_content["payload"]["data"]["onManageDevice"]["devicestatus"]
-            if device_id in self._devices:
-                self._devices[device_id].lockstatus = status
-                self._devices[device_id].lastupdatestatus = int(
-                    datetime.now().timestamp()
-                )
-
-        self._reset_timer()
+            subscription = self._subscriptions.get(msg_content["id"])
+            if subscription is None or subscription.handler is None:
+                # Unsubscribed and awaiting completion, or not handled
+                logger.debug("Dropping data for subscription %s", msg_content["id"])
+            else:
+                subscription.handler(msg_content["id"], msg_content["payload"]["data"])
 
         # There are other types: 'ka', 'complete', etc....
         # https://github.com/apollographql/apollo-ios/blob/main/Sources/ApolloWebSocket/OperationMessage.swift
         # https://docs.aws.amazon.com/appsync/latest/devguide/real-time-websocket-client.html
 
+    def _handle_device_event(self, _subscription_id: str, data: Dict[str, Any]) -> None:
+        event = data["onManageDevice"]
+        device_id = event["deviceid"]
+        status = event["devicestatus"]
+        timestamp = datetime.now().timestamp()
+        if device_id in self._devices:
+            self._devices[device_id].lockstatus = status
+            self._devices[device_id].lastupdatestatus = int(timestamp)
+        if self.state_store is not None:
+            self.state_store.update_from_event(device_id, event, timestamp)
+        self._resolve_waiters(device_id, event)
+        if self.dispatcher is not None:
+            self.dispatcher.dispatch(event)
+
+    def _resolve_waiters(self, device_id: str, event: Dict[str, Any]) -> None:
+        with self._waiters_lock:
+            waiters = self._waiters.get(device_id)
+            if not waiters:
+                return
+            matched = [w for w in waiters if w.lockstatus == event["devicestatus"]]
+            waiters[:] = [w for w in waiters if w.lockstatus != event["devicestatus"]]
+            if not waiters:
+                del self._waiters[device_id]
+        for waiter in matched:
+            waiter.resolve(event)
+
+    def expect_device_status(
+        self, deviceid: str, lockstatus: str
+    ) -> DeviceStatusWaiter:
+        """
+        Register interest in a device reporting a status over the device subscription,
+        e.g. to confirm an actuation. Register before actuating, so the event cannot
+        be missed. Only events handled by the default device event handler are seen.
+
+        :param deviceid: ID of the device
+        :param lockstatus: status to wait for, e.g. "Locked"
+        :return: waiter, resolved by the first matching event
+        """
+        waiter = DeviceStatusWaiter(deviceid=deviceid, lockstatus=lockstatus)
+        with self._waiters_lock:
+            self._waiters.setdefault(deviceid, []).append(waiter)
+        return waiter
+
+    def cancel_expectation(self, waiter: DeviceStatusWaiter) -> None:
+        """
+        Stop waiting for a device status
+
+        :param waiter: waiter returned by expect_device_status
+        :return: None
+        """
+        with self._waiters_lock:
+            waiters = self._waiters.get(waiter.deviceid, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(waiter.deviceid, None)
+
+    def add_event_handler(
+        self,
+        handler: DeviceEventHandler,
+        deviceids: Iterable[str] = None,
+        operationtypes: Iterable[str] = None,
+    ) -> str:
+        """
+        Register a handler for device events received over the device subscription.
+        Handlers run on the client's EventDispatcher, created on first use, never on
+        the thread reading the connection. Only events handled by the default device
+        event handler are dispatched.
+
+        :param handler: called with the onManageDevice payload of each matching event
+        :param deviceids: only pass events for these devices, all devices if not set
+        :param operationtypes: only pass events with these operation types, all if not
+            set
+        :return: handler ID
+        """
+        if self.dispatcher is None:
+            self.dispatcher = EventDispatcher()
+        return self.dispatcher.add_handler(handler, deviceids, operationtypes)
+
+    def remove_event_handler(self, handler_id: str) -> bool:
+        """
+        Unregister a device event handler
+
+        :param handler_id: ID returned by add_event_handler
+        :return: True if the handler was registered
+        """
+        if self.dispatcher is None:
+            return False
+        return self.dispatcher.remove_handler(handler_id)
+
+    @property
+    def dispatch_stats(self) -> DispatchStats:
+        """
+        Return the event dispatcher's counters, e.g. to monitor queue depth and drops
+
+        :return: copy of the counters
+        """
+        if self.dispatcher is None:
+            return DispatchStats()
+        return self.dispatcher.stats()
+
+    def _wait_for_completion(self, timeout: float) -> List[str]:
+        """
+        Wait for all active subscriptions to be completed by the server
+
+        :param timeout: maximum time to wait in seconds, forever if None
+        :return: IDs of subscriptions still active when the wait ended
+        """
+        with self._subscriptions_changed:
+            self._subscriptions_changed.wait_for(
+                lambda: not self._subscription_ids, timeout=timeout
+            )
+            return list(self._subscription_ids)
+
+    def _start_subscription(self, subscription: Subscription) -> None:
+        self._send(
+            self._build_start_message(
+                subscription.subscription_id,
+                subscription.query,
+                subscription.credentials,
+            )
+        )
+
+    @property
+    def subscriptions(self) -> List[Subscription]:
+        """
+        Return the subscriptions registered on the client
+
+        :return: List of subscriptions
+        """
+        with self._subscriptions_lock:
+            return list(self._subscriptions.values())
+
+    def subscribe(
+        self,
+        query: str,
+        handler: SubscriptionHandler = None,
+        credentials: AppCredentials = None,
+    ) -> str:
+        """
+        Register a GQL subscription on the connection. It is started immediately if the
+        connection is up, and (re)started whenever the connection is acknowledged.
+
+        :param query: JSON encoded GQL subscription request
+        :param handler: called with the subscription ID and the payload data of each
+            data message; data messages are dropped if not set
+        :param credentials: identity to authorize the subscription with, defaults to
+            the client's credentials
+        :return: subscription ID
+        """
+        subscription = Subscription(
+            subscription_id=str(uuid4()),
+            query=query,
+            credentials=credentials if credentials else self.credentials,
+            handler=handler,
+        )
+        with self._subscriptions_lock:
+            self._subscriptions[subscription.subscription_id] = subscription
+            connected = self._connected
+        if connected:
+            self._start_subscription(subscription)
+        return subscription.subscription_id
+
+    def subscribe_devices(
+        self, credentials: AppCredentials = None, handler: SubscriptionHandler = None
+    ) -> str:
+        """
+        Register an onManageDevice subscription for an identity
+
+        :param credentials: identity to subscribe for, defaults to the client's
+            credentials
+        :param handler: called with the subscription ID and the payload data of each
+            device event; defaults to updating the client's devices and state store
+        :return: subscription ID
+        """
+        credentials = credentials if credentials else self.credentials
+        return self.subscribe(
+            self._build_device_subscription_query(credentials.username),
+            handler=handler if handler else self._handle_device_event,
+            credentials=credentials,
+        )
+
+    def unsubscribe(self, subscription_id: str) -> None:
+        """
+        Stop a subscription and remove it from the client
+
+        :param subscription_id: ID of the subscription
+        :return: None
+        """
+        with self._subscriptions_lock:
+            self._subscriptions.pop(subscription_id, None)
+        if subscription_id in self._subscription_ids:
+            self._send(self._build_stop_message(subscription_id))
+
+
+class RealtimeClient(BaseRealtimeClient):
+    """
+    Realtime GQL subscription client running on a websocket-client WebSocketApp.
+    Keep-alive deadlines are tracked by a KeepAliveWatchdog, which by default is shared
+    by every client in the process.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        config: Config,
+        credentials: AppCredentials,
+        devices: Dict[str, Device] = None,
+        timeout: int = 10,
+        *,
+        state_store: DeviceStateStore = None,
+        subscribe_devices: bool = True,
+        watchdog: KeepAliveWatchdog = None,
+        close_timeout: float = 10,
+        on_reconnect: ReconnectHandler = None,
+        dispatcher: EventDispatcher = None,
+    ):
+        super().__init__(
+            config=config,
+            credentials=credentials,
+            devices=devices,
+            timeout=timeout,
+            state_store=state_store,
+            subscribe_devices=subscribe_devices,
+            on_reconnect=on_reconnect,
+            dispatcher=dispatcher,
+        )
+        self.ws_app = self._new_ws_app()
+        self._watchdog = watchdog if watchdog is not None else DEFAULT_WATCHDOG
+        self.close_timeout = close_timeout
+
+    def _new_ws_app(self) -> WebSocketApp:
+        return WebSocketApp(
+            self._connection_url,
+            subprotocols=["graphql-ws"],
+            on_close=self._on_close,
+            on_error=self._on_error,
+            on_message=self._on_message,
+            on_open=self._on_open,
+        )
+
+    def _send(self, msg: str) -> None:
+        self.ws_app.send(msg)
+
+    def _on_close(self, _ws_app: WebSocketApp, status_code: int, msg: str) -> None:
+        logger.info("Connection closed : %s - %s", status_code, msg)
+        # The connection is gone, its keep-alive deadline must not close the next one
+        self._watchdog.cancel(self)
+        self._handle_close()
+
+    @staticmethod
+    def _on_error(_ws_app: WebSocketApp, error: Exception) -> None:
+        logger.error(error)
+
+    def _on_message(self, _ws_app: WebSocketApp, msg: str) -> None:
+        self._handle_message(msg)
+        self._reset_keepalive()
+
     def _on_open(self, _ws_app: WebSocketApp) -> None:
         logger.info("Opening connection")
         self.ws_app.send(json.dumps({"type": "connection_init"}))
 
-    def _new_timer(self) -> Timer:
-        timer = Timer(self.timeout, self.close)
-        timer.daemon = True
-        return timer
+    def _on_keepalive_timeout(self) -> None:
+        logger.warning("Keep-alive not received, closing connection")
+        self.missed_keepalive_closes += 1
+        self.ws_app.close()
 
-    def _reset_timer(self) -> None:
-        self._timer.cancel()
-        self._timer = self._new_timer()
-        self._timer.start()
+    def _reset_keepalive(self) -> None:
+        self._watchdog.touch(self, self.timeout, self._on_keepalive_timeout)
 
     @property
     def active(self) -> bool:
@@ -164,6 +521,17 @@ class RealtimeClient:
         """
         return self.ws_app.keep_running
 
+    def reset(self) -> None:
+        """
+        Prepare a closed client to be started again, with a connection header carrying
+        the current ID token. Registered subscriptions are restarted once connected.
+
+        :return: None
+        """
+        self._watchdog.cancel(self)
+        self._handle_close()
+        self.ws_app = self._new_ws_app()
+
     def start(self) -> None:
         """
         Start the WebApp...this should almost always be done in a thread
@@ -173,17 +541,30 @@ class RealtimeClient:
         logger.info("Starting connection")
         self.ws_app.run_forever()
 
-    def close(self, force: bool = False) -> None:
+    def close(self, force: bool = False, timeout: float = None) -> List[str]:
         """
-        Close the connection, blocks until connections have been closed cleanly unless
-        force is set
+        Close the connection, blocks until subscriptions have been completed cleanly, or
+        the timeout has passed, unless force is set
         
         :param force: Do not wait for subscriptions to complete before disconnecting
-        :return: None
+        :param timeout: Maximum time to wait for subscriptions to complete, defaults to
+            close_timeout
+        :return: IDs of subscriptions that did not complete before disconnecting
         """
         logger.info("Closing connection")
-        for subscription_id in self._subscription_ids:
-            self.ws_app.send(self._build_stop_message(subscription_id))
-        while self._subscription_ids and not force:
-            pass
+        self._watchdog.cancel(self)
+        with self._subscriptions_lock:
+            subscription_ids = list(self._subscription_ids)
+        for subscription_id in subscription_ids:
+            self._send(self._build_stop_message(subscription_id))
+        if force:
+            with self._subscriptions_lock:
+                pending = list(self._subscription_ids)
+        else:
+            pending = self._wait_for_completion(
+                self.close_timeout if timeout is None else timeout
+            )
+            if pending:
+                logger.warning("Subscriptions not completed : %s", pending)
         self.ws_app.close()
+        return pending
@@ -0,0 +1,118 @@
+"""
+realtime/watchdog.py
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from typing import Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class KeepAliveWatchdog:
+    """
+    Tracks keep-alive deadlines for any number of connections on one long-lived thread.
+    Extending a deadline is a dictionary update, so it is cheap enough to do on every
+    received message; the thread only wakes when the earliest deadline is due.
+    """
+
+    def __init__(self):
+        # key -> [deadline, callback, deadline currently scheduled in the heap]
+        self._entries: Dict[Hashable, List] = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self.expired_count = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _schedule(self, key: Hashable, deadline: float) -> None:
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+    def touch(
+        self, key: Hashable, timeout: float, callback: Callable[[], None]
+    ) -> None:
+        """
+        Set (or push back) the deadline for a connection
+
+        :param key: identifies the connection
+        :param timeout: seconds from now until the deadline
+        :param callback: called, once, on the watchdog thread if the deadline passes
+        :return: None
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [deadline, callback, deadline]
+            else:
+                entry[0] = deadline
+                entry[1] = callback
+                if deadline >= entry[2]:
+                    return
+                entry[2] = deadline
+            self._schedule(key, deadline)
+            self._condition.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="kshalopy-watchdog", daemon=True
+                )
+                self._thread.start()
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        Stop tracking a connection
+
+        :param key: identifies the connection
+        :return: None
+        """
+        with self._condition:
+            self._entries.pop(key, None)
+
+    def _next_expired(self) -> Callable[[], None]:
+        """
+        Wait for the next deadline to pass
+
+        :return: callback of the expired connection
+        """
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                scheduled, _count, key = self._heap[0]
+                entry = self._entries.get(key)
+                if entry is None or entry[2] != scheduled:
+                    # Cancelled, or superseded by an earlier deadline
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.monotonic()
+                if entry[0] <= now:
+                    heapq.heappop(self._heap)
+                    del self._entries[key]
+                    self.expired_count += 1
+                    return entry[1]
+                if entry[0] > scheduled:
+                    # Deadline was pushed back since it was scheduled
+                    heapq.heappop(self._heap)
+                    entry[2] = entry[0]
+                    self._schedule(key, entry[0])
+                    continue
+                self._condition.wait(scheduled - now)
+
+    def _run(self) -> None:
+        while True:
+            callback = self._next_expired()
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Keep-alive timeout callback failed")
+
+
+DEFAULT_WATCHDOG = KeepAliveWatchdog()
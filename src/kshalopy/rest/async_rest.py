@@ -0,0 +1,332 @@
+"""
+rest/async_rest.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List
+
+from ..models.models import (
+    ActuationResult,
+    Device,
+    DeviceDetails,
+    FleetSnapshot,
+    Home,
+    SharedUser,
+    User,
+)
+from ..credentials.credentials import AppCredentials
+from ..config import Config
+from ..rest.cache import ResponseCache
+from ..rest.pool import ConnectionPool
+from ..realtime.realtime import BaseRealtimeClient
+from ..rest.rest import DeviceAction, RestClient
+from ..rest.retry import RequestPolicy
+from ..state.store import DeviceStateStore
+
+
+class AsyncRestClient:
+    """
+    asyncio REST Client for Kwikset Halo 'public' API. Mirrors RestClient, running the
+    requests over a shared keep-alive connection pool with at most max_concurrency
+    requests in flight, so independent requests can be fanned out with asyncio.gather.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        config: Config,
+        credentials: AppCredentials,
+        source_name: str,
+        source_device: str,
+        *,
+        pool: ConnectionPool = None,
+        max_concurrency: int = 10,
+        cache: ResponseCache = None,
+        state_store: DeviceStateStore = None,
+        policy: RequestPolicy = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self._owns_pool = pool is None
+        self.rest_client = RestClient(
+            config=config,
+            credentials=credentials,
+            source_name=source_name,
+            source_device=source_device,
+            pool=pool if pool else ConnectionPool(maxsize=max_concurrency),
+            cache=cache,
+            state_store=state_store,
+            policy=policy,
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="kshalopy-rest"
+        )
+
+    @property
+    def config(self) -> Config:
+        """
+        Return the configuration used by the client
+
+        :return: Config object
+        """
+        return self.rest_client.config
+
+    @property
+    def credentials(self) -> AppCredentials:
+        """
+        Return the credentials used by the client
+
+        :return: credentials object
+        """
+        return self.rest_client.credentials
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """
+        Run a blocking RestClient call on the client's bounded executor
+
+        :param func: callable to run
+        :param args: arguments for the callable
+        :return: result of the call
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def get_devices_in_home(self, home: Home) -> List[Device]:
+        """
+        Get list of devices in a given Home
+
+        :param home: Home to query
+        :return: List of Devices
+        """
+        return await self._run(self.rest_client.get_devices_in_home, home)
+
+    async def get_device_details(self, device: Device) -> DeviceDetails:
+        """
+        Get details of a specific device
+
+        :param device: Device to query
+        :return: Device details
+        """
+        return await self._run(self.rest_client.get_device_details, device)
+
+    async def get_my_homes(self) -> List[Home]:
+        """
+        Get list of Homes to which the current user is "attached"
+
+        :return: List of Homes
+        """
+        return await self._run(self.rest_client.get_my_homes)
+
+    async def get_my_user(self) -> User:
+        """
+        Get information about the current user
+
+        :return: User details
+        """
+        return await self._run(self.rest_client.get_my_user)
+
+    async def get_shared_users_in_home(self, home: Home) -> List[SharedUser]:
+        """
+        Get users with shared access to the specified home, assuming the current user
+        is the "owner".
+
+        :param home: Home to query
+        :return: List of users with shared access
+        """
+        return await self._run(self.rest_client.get_shared_users_in_home, home)
+
+    async def lock_device(self, device: Device) -> str:
+        """
+        Set a device's state to "locked"
+
+        :param device: Device to lock
+        :return: Response body as a string (contains a count of affected devices)
+        """
+        return await self._run(self.rest_client.lock_device, device)
+
+    async def unlock_device(self, device: Device) -> str:
+        """
+        Set a device's state to "unlocked"
+
+        :param device: Device to unlock
+        :return: Response body as a string (contains a count of affected devices)
+        """
+        return await self._run(self.rest_client.unlock_device, device)
+
+    async def lock_device_confirmed(
+        self,
+        device: Device,
+        realtime_client: BaseRealtimeClient = None,
+        timeout: float = 10,
+        poll_interval: float = 1,
+    ) -> ActuationResult:
+        """
+        Set a device's state to "locked" and confirm it has locked
+
+        :param device: Device to lock
+        :param realtime_client: connected client whose device subscription covers the
+            device
+        :param timeout: maximum time to wait for confirmation
+        :param poll_interval: time between device details requests when polling
+        :return: outcome, with the confirmed lockstatus and latency
+        """
+        return await self._run(
+            self.rest_client.lock_device_confirmed,
+            device,
+            realtime_client,
+            timeout,
+            poll_interval,
+        )
+
+    async def unlock_device_confirmed(
+        self,
+        device: Device,
+        realtime_client: BaseRealtimeClient = None,
+        timeout: float = 10,
+        poll_interval: float = 1,
+    ) -> ActuationResult:
+        """
+        Set a device's state to "unlocked" and confirm it has unlocked
+
+        :param device: Device to unlock
+        :param realtime_client: connected client whose device subscription covers the
+            device
+        :param timeout: maximum time to wait for confirmation
+        :param poll_interval: time between device details requests when polling
+        :return: outcome, with the confirmed lockstatus and latency
+        """
+        return await self._run(
+            self.rest_client.unlock_device_confirmed,
+            device,
+            realtime_client,
+            timeout,
+            poll_interval,
+        )
+
+    async def get_devices_in_homes(self, homes: Iterable[Home]) -> List[List[Device]]:
+        """
+        Get the devices in each of several Homes concurrently
+
+        :param homes: Homes to query
+        :return: List of Device lists, in the same order as homes
+        """
+        return list(
+            await asyncio.gather(*(self.get_devices_in_home(home) for home in homes))
+        )
+
+    async def get_details_for_devices(
+        self, devices: Iterable[Device]
+    ) -> List[DeviceDetails]:
+        """
+        Get the details of several devices concurrently
+
+        :param devices: Devices to query
+        :return: List of Device details, in the same order as devices
+        """
+        return list(
+            await asyncio.gather(
+                *(self.get_device_details(device) for device in devices)
+            )
+        )
+
+    async def get_fleet(self, include_details: bool = True) -> FleetSnapshot:
+        """
+        Get every Home, the Devices in each Home, and optionally the details of each
+        Device, fanning out one level at a time. Each Device is only queried once, even
+        if it appears in several Homes.
+
+        :param include_details: fetch Device details as well as Devices
+        :return: Fleet snapshot indexed by homeid and deviceid
+        """
+        snapshot = FleetSnapshot()
+        homes = await self.get_my_homes()
+        for home, devices in zip(homes, await self.get_devices_in_homes(homes)):
+            snapshot.add_home(home, devices)
+        if include_details:
+            devices = list(snapshot.devices.values())
+            for device, details in zip(
+                devices, await self.get_details_for_devices(devices)
+            ):
+                snapshot.details[device.deviceid] = details
+        return snapshot
+
+    async def _actuate_devices(
+        self,
+        devices: Iterable[Device],
+        action: DeviceAction,
+        realtime_client: BaseRealtimeClient,
+        confirm_timeout: float,
+    ) -> List[ActuationResult]:
+        # pylint: disable=protected-access
+        actuate = partial(
+            self.rest_client._actuate_and_report,
+            confirm=realtime_client is not None,
+            realtime_client=realtime_client,
+            timeout=confirm_timeout,
+        )
+        return list(
+            await asyncio.gather(
+                *(self._run(actuate, device, action) for device in devices)
+            )
+        )
+
+    async def lock_devices(
+        self,
+        devices: Iterable[Device],
+        realtime_client: BaseRealtimeClient = None,
+        confirm_timeout: float = 10,
+    ) -> List[ActuationResult]:
+        """
+        Set several devices' state to "locked" concurrently. A failure to lock one
+        device does not stop the others.
+
+        :param devices: Devices to lock
+        :param realtime_client: connected client whose device subscription covers the
+            devices; if set, each lock is confirmed by its "Locked" event
+        :param confirm_timeout: maximum time to wait for each confirmation
+        :return: outcome for each device, in the same order as devices
+        """
+        return await self._actuate_devices(
+            devices, DeviceAction.LOCK, realtime_client, confirm_timeout
+        )
+
+    async def unlock_devices(
+        self,
+        devices: Iterable[Device],
+        realtime_client: BaseRealtimeClient = None,
+        confirm_timeout: float = 10,
+    ) -> List[ActuationResult]:
+        """
+        Set several devices' state to "unlocked" concurrently. A failure to unlock one
+        device does not stop the others.
+
+        :param devices: Devices to unlock
+        :param realtime_client: connected client whose device subscription covers the
+            devices; if set, each unlock is confirmed by its "Unlocked" event
+        :param confirm_timeout: maximum time to wait for each confirmation
+        :return: outcome for each device, in the same order as devices
+        """
+        return await self._actuate_devices(
+            devices, DeviceAction.UNLOCK, realtime_client, confirm_timeout
+        )
+
+    def close(self) -> None:
+        """
+        Shut down the executor and close idle pooled connections, unless the pool was
+        supplied by the caller
+
+        :return: None
+        """
+        self._executor.shutdown(wait=True)
+        if self._owns_pool:
+            self.rest_client.pool.close()
+
+    async def __aenter__(self) -> AsyncRestClient:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        # close waits for requests in flight, so keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,192 @@
+"""
+rest/cache.py
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+DEFAULT_TTLS = {
+    "get_my_user": 300,
+    "get_my_homes": 300,
+    "get_shared_users_in_home": 300,
+}
+
+CacheKey = Tuple[str, str]
+
+
+@dataclass
+class CacheEntry:
+    """
+    Data-only class for a cached response
+    """
+
+    endpoint: str
+    data: List[Any]
+    expires: float
+    etag: str = None
+    last_modified: str = None
+
+    @property
+    def fresh(self) -> bool:
+        """
+        Return whether the entry can be used without revalidation
+
+        :return: freshness of the entry
+        """
+        return time.monotonic() < self.expires
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """
+        Return conditional request headers for revalidating the entry
+
+        :return: dict of header names and values, empty if the server gave none
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of REST response data, keyed by identity (username) and
+    selector. Only endpoints with a positive TTL are cached. May be shared by any number
+    of RestClients.
+    """
+
+    def __init__(self, ttls: Dict[str, float] = None, maxsize: int = 1024):
+        """
+        :param ttls: time to live, in seconds, by RestClient method name; endpoints not
+            listed are not cached. DEFAULT_TTLS is used if not set
+        :param maxsize: maximum number of entries held
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries: OrderedDict[CacheKey, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ttl(self, endpoint: str) -> float:
+        """
+        Return the time to live for an endpoint
+
+        :param endpoint: RestClient method name
+        :return: time to live in seconds, 0 if the endpoint is not cached
+        """
+        return self.ttls.get(endpoint, 0)
+
+    def get(self, identity: str, selector: str) -> CacheEntry:
+        """
+        Look up an entry, fresh or stale. Stale entries may still be revalidated.
+
+        :param identity: username the response belongs to
+        :param selector: API route of the response
+        :return: cache entry, or None
+        """
+        with self._lock:
+            entry = self._entries.get((identity, selector))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((identity, selector))
+            if entry.fresh:
+                self.hits += 1
+            return entry
+
+    def put(  # pylint: disable=too-many-arguments
+        self,
+        identity: str,
+        endpoint: str,
+        selector: str,
+        data: List[Any],
+        *,
+        etag: str = None,
+        last_modified: str = None,
+    ) -> None:
+        """
+        Store response data, evicting the least recently used entries if full
+
+        :param identity: username the response belongs to
+        :param endpoint: RestClient method name, used to look up the TTL
+        :param selector: API route of the response
+        :param data: decoded "data" member of the response body
+        :param etag: ETag header of the response
+        :param last_modified: Last-Modified header of the response
+        :return: None
+        """
+        ttl = self.ttl(endpoint)
+        if ttl <= 0:
+            return
+        entry = CacheEntry(
+            endpoint=endpoint,
+            data=data,
+            expires=time.monotonic() + ttl,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        with self._lock:
+            self._entries[(identity, selector)] = entry
+            self._entries.move_to_end((identity, selector))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def revalidated(self, entry: CacheEntry) -> None:
+        """
+        Mark an entry as confirmed unchanged by the server, restarting its TTL
+
+        :param entry: cache entry
+        :return: None
+        """
+        with self._lock:
+            self.revalidations += 1
+            entry.expires = time.monotonic() + self.ttl(entry.endpoint)
+
+    def invalidate(
+        self,
+        identity: str = None,
+        endpoints: Iterable[str] = None,
+        selector: str = None,
+    ) -> int:
+        """
+        Remove matching entries. Unset criteria match everything.
+
+        :param identity: username to invalidate entries for
+        :param endpoints: RestClient method names to invalidate entries for
+        :param selector: API route to invalidate entries for
+        :return: number of entries removed
+        """
+        endpoints = set(endpoints) if endpoints is not None else None
+        with self._lock:
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if (identity is None or key[0] == identity)
+                and (selector is None or key[1] == selector)
+                and (endpoints is None or entry.endpoint in endpoints)
+            ]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """
+        Remove all entries
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,297 @@
+"""
+rest/pool.py
+"""
+
+from __future__ import annotations
+
+import http.client
+import io
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from collections import deque
+from typing import Deque, Dict, Tuple
+from urllib.parse import urlsplit
+
+from ..rest.retry import IDEMPOTENT_METHODS
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str, int]
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class PooledResponse:
+    """
+    Wrapper around an HTTPResponse that hands its connection back to the pool once the
+    response has been consumed and closed
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        key: PoolKey,
+        connection: http.client.HTTPConnection,
+        response: http.client.HTTPResponse,
+        url: str,
+    ):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self.url = url
+
+    @property
+    def status(self) -> int:
+        """
+        Return the HTTP status code of the response
+
+        :return: status code
+        """
+        return self._response.status
+
+    @property
+    def reason(self) -> str:
+        """
+        Return the HTTP reason phrase of the response
+
+        :return: reason phrase
+        """
+        return self._response.reason
+
+    @property
+    def headers(self) -> http.client.HTTPMessage:
+        """
+        Return the response headers
+
+        :return: headers
+        """
+        return self._response.headers
+
+    def read(self, amt: int = None) -> bytes:
+        """
+        Read from the response body
+
+        :param amt: number of bytes to read, all remaining bytes if not set
+        :return: bytes read
+        """
+        return self._response.read(amt)
+
+    def getheader(self, name: str, default: str = None) -> str:
+        """
+        Return the value of a response header
+
+        :param name: header name
+        :param default: value to return if the header is not present
+        :return: header value
+        """
+        return self._response.getheader(name, default)
+
+    def close(self) -> None:
+        """
+        Release the underlying connection back to the pool. Connections whose response
+        was not fully read, or that the server asked to close, are discarded.
+
+        :return: None
+        """
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool.release(self._key, connection)
+        else:
+            self._response.close()
+            connection.close()
+
+    def __enter__(self) -> PooledResponse:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of persistent (keep-alive) HTTP/HTTPS connections, keyed by scheme,
+    host and port. A single pool may be shared by any number of RestClients.
+    """
+
+    def __init__(
+        self, maxsize: int = 10, idle_timeout: float = 60, timeout: float = 30
+    ):
+        """
+        :param maxsize: maximum number of idle connections kept per host
+        :param idle_timeout: seconds after which an idle connection is discarded
+        :param timeout: socket timeout for new connections
+        """
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: Dict[PoolKey, Deque[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _new_connection(self, key: PoolKey) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        logger.debug("Opening new connection to %s://%s:%s", scheme, host, port)
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _get_connection(self, key: PoolKey) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Get an idle connection for the key, or a new one if none are available
+
+        :param key: pool key
+        :return: (connection, True if the connection was reused)
+        """
+        expired = []
+        connection = None
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                else:
+                    connection = candidate
+                    break
+        for stale in expired:
+            stale.close()
+        if connection:
+            return connection, True
+        return self._new_connection(key), False
+
+    def release(self, key: PoolKey, connection: http.client.HTTPConnection) -> None:
+        """
+        Return a connection to the pool, closing it if the pool for the host is full
+
+        :param key: pool key
+        :param connection: connection to return
+        :return: None
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            if len(idle) < self.maxsize:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def evict_idle(self) -> int:
+        """
+        Close all connections that have been idle for longer than idle_timeout
+
+        :return: number of connections closed
+        """
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = deque(item for item in idle if item[1] >= cutoff)
+                expired.extend(item[0] for item in idle if item[1] < cutoff)
+                self._idle[key] = keep
+        for connection in expired:
+            connection.close()
+        return len(expired)
+
+    def idle_count(self, key: PoolKey = None) -> int:
+        """
+        Return the number of idle connections held, for one host or across all hosts
+
+        :param key: pool key to count, all hosts if not set
+        :return: number of idle connections
+        """
+        with self._lock:
+            if key:
+                return len(self._idle.get(key, ()))
+            return sum(len(idle) for idle in self._idle.values())
+
+    def close(self) -> None:
+        """
+        Close all idle connections
+
+        :return: None
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _last_used in connections:
+                connection.close()
+
+    @staticmethod
+    def _send(
+        connection: http.client.HTTPConnection,
+        request: urllib.request.Request,
+        path: str,
+        headers: Dict[str, str],
+        timeout: float,
+    ) -> http.client.HTTPResponse:
+        if timeout is not None:
+            connection.timeout = timeout
+            if connection.sock:
+                connection.sock.settimeout(timeout)
+        connection.request(
+            request.get_method(), path, body=request.data, headers=headers
+        )
+        return connection.getresponse()
+
+    def urlopen(
+        self, request: urllib.request.Request, timeout: float = None
+    ) -> PooledResponse:
+        """
+        Send a urllib Request over a pooled connection. Mirrors urllib.request.urlopen
+        in raising HTTPError for any non-2xx response.
+
+        :param request: request to send
+        :param timeout: socket timeout override for this request
+        :return: response, to be used as a context manager
+        """
+        parts = urlsplit(request.full_url)
+        key = (
+            parts.scheme,
+            parts.hostname,
+            parts.port or DEFAULT_PORTS.get(parts.scheme, 80),
+        )
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        headers = dict(request.header_items())
+        headers.setdefault("Host", parts.netloc)
+        headers.setdefault("Connection", "keep-alive")
+
+        connection, reused = self._get_connection(key)
+        try:
+            response = self._send(connection, request, path, headers, timeout)
+        except (http.client.HTTPException, ConnectionError):
+            connection.close()
+            if not reused or request.get_method().upper() not in IDEMPOTENT_METHODS:
+                # The request may have reached the server before the connection failed
+                raise
+            # The server closed a kept-alive connection; retry once on a fresh one
+            logger.debug("Pooled connection to %s was stale, reconnecting", key[1])
+            connection = self._new_connection(key)
+            try:
+                response = self._send(connection, request, path, headers, timeout)
+            except Exception:
+                connection.close()
+                raise
+        except Exception:
+            connection.close()
+            raise
+
+        pooled = PooledResponse(self, key, connection, response, request.full_url)
+        if not 200 <= response.status < 300:
+            body = response.read()
+            pooled.close()
+            raise urllib.error.HTTPError(
+                request.full_url,
+                response.status,
+                response.reason,
+                response.headers,
+                io.BytesIO(body),
+            )
+        return pooled
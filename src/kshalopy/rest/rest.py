@@ -3,14 +3,35 @@ rest/rest.py
 """
 
 import json
+import logging
+import time
+import urllib.error
 import urllib.request
 
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, List
+from typing import Any, Iterable, Iterator, List
 
-from ..models.models import Device, DeviceDetails, Home, SharedUser, User
+from ..models.decoder import get_decoder
+from ..models.models import (
+    ActuationResult,
+    Device,
+    DeviceDetails,
+    FleetSnapshot,
+    Home,
+    SharedUser,
+    User,
+)
 from ..credentials.credentials import AppCredentials
 from ..config import Config
+from ..realtime.realtime import BaseRealtimeClient
+from ..rest.cache import ResponseCache
+from ..rest.pool import ConnectionPool, PooledResponse
+from ..rest.retry import RequestPolicy
+from ..rest.stream import iter_json_items
+from ..state.store import DeviceStateStore
+
+logger = logging.getLogger(__name__)
 
 
 class DeviceAction(Enum):
@@ -22,20 +43,47 @@ class DeviceAction(Enum):
     UNLOCK = "Unlock"
 
 
+# Device status reported once each action has taken effect
+ACTION_STATUSES = {DeviceAction.LOCK: "Locked", DeviceAction.UNLOCK: "Unlocked"}
+
+
 class RestClient:
     """
     REST Client for Kwikset Halo 'public' API
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         config: Config,
         credentials: AppCredentials,
         source_name: str,
         source_device: str,
+        *,
+        pool: ConnectionPool = None,
+        cache: ResponseCache = None,
+        state_store: DeviceStateStore = None,
+        policy: RequestPolicy = None,
     ):
+        """
+        :param config: application configuration object
+        :param credentials: credentials to authenticate requests with
+        :param source_name: name reported to the API as the source of actuations
+        :param source_device: device reported to the API as the source of actuations
+        :param pool: connection pool to send requests over, may be shared between
+            clients; a private pool is created if not set
+        :param cache: response cache for read requests, may be shared between clients;
+            responses are not cached if not set
+        :param state_store: device state store to record responses in, and to answer
+            get_device_details from while its state is fresh enough
+        :param policy: timeout, credential refresh, retry and rate limit settings; a
+            default RequestPolicy is used if not set
+        """
         self.config = config
         self.credentials = credentials
+        self.pool = pool if pool else ConnectionPool()
+        self.cache = cache
+        self.state_store = state_store
+        self.policy = policy if policy is not None else RequestPolicy()
         self._source_body = json.dumps({"name": source_name, "device": source_device})
 
     def _actuate_device(self, device: Device, action: DeviceAction) -> str:
@@ -52,8 +100,159 @@ class RestClient:
             {"action": action.value, "source": self._source_body}
         ).encode()
         request.method = "PATCH"
-        with urllib.request.urlopen(request) as request:
-            return request.read().decode()
+        request.add_header("Content-Type", "application/json")
+        with self._urlopen(request) as response:
+            body = response.read().decode()
+        if self.cache is not None:
+            # Lock state is part of every user's view of the device
+            self.cache.invalidate(
+                endpoints=("get_devices_in_home", "get_device_details")
+            )
+        return body
+
+    @staticmethod
+    def _affected_count(body: str) -> int:
+        """
+        Extract the count of affected devices from an actuation response body
+
+        :param body: response body
+        :return: count of affected devices, or None if the body does not carry one
+        """
+        try:
+            return int(json.loads(body)["data"])
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def _actuate_and_capture(
+        self, device: Device, action: DeviceAction
+    ) -> ActuationResult:
+        """
+        Internal method for actuating one device, capturing the outcome rather than
+        raising
+
+        :param device: device object to interact with
+        :param action: action to take on the device
+        :return: outcome of the actuation
+        """
+        try:
+            body = self._actuate_device(device, action)
+        except Exception as error:  # pylint: disable=broad-except
+            return ActuationResult(
+                deviceid=device.deviceid,
+                action=action.value,
+                success=False,
+                error=error,
+            )
+        return ActuationResult(
+            deviceid=device.deviceid,
+            action=action.value,
+            success=True,
+            affected=self._affected_count(body),
+        )
+
+    def _actuate_and_report(  # pylint: disable=too-many-arguments
+        self,
+        device: Device,
+        action: DeviceAction,
+        *,
+        confirm: bool = False,
+        realtime_client: BaseRealtimeClient = None,
+        timeout: float = 10,
+        poll_interval: float = 1,
+    ) -> ActuationResult:
+        """
+        Internal method for actuating one device, capturing the outcome and optionally
+        confirming the resulting status. Confirmation waits for the matching realtime
+        event if a realtime client is given, checking the device details once over
+        REST if none arrives in time; otherwise the device details are polled.
+
+        :param device: device object to interact with
+        :param action: action to take on the device
+        :param confirm: confirm the resulting status
+        :param realtime_client: client to confirm the resulting status through
+        :param timeout: maximum time to wait for confirmation
+        :param poll_interval: time between device details requests when polling
+        :return: outcome of the actuation
+        """
+        expected = ACTION_STATUSES[action]
+        waiter = None
+        if confirm and realtime_client is not None:
+            waiter = realtime_client.expect_device_status(device.deviceid, expected)
+        sent = time.monotonic()
+        result = self._actuate_and_capture(device, action)
+        if not result.success:
+            if waiter is not None:
+                realtime_client.cancel_expectation(waiter)
+            return result
+        if not confirm:
+            return result
+
+        deadline = sent + timeout
+        if waiter is not None:
+            event = waiter.wait(timeout)
+            realtime_client.cancel_expectation(waiter)
+            if event is not None:
+                result.confirmed = True
+                result.lockstatus = event["devicestatus"]
+                result.latency = waiter.received - sent
+                result.confirmed_by = DeviceStateStore.REALTIME
+                return result
+            # The event may have been lost, e.g. over a reconnect; check once
+            deadline = time.monotonic()
+        while True:
+            try:
+                # Neither stored nor cached state can confirm a change
+                status = self._fetch_device_details(device, use_cache=False).doorstatus
+            except OSError:
+                logger.exception("Failed to confirm %s", device.deviceid)
+                status = None
+            if status is not None:
+                result.lockstatus = status
+            if status == expected:
+                result.confirmed = True
+                result.latency = time.monotonic() - sent
+                result.confirmed_by = DeviceStateStore.REST
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                result.confirmed = False
+                return result
+            time.sleep(min(poll_interval, remaining))
+
+    def _actuate_devices(
+        self,
+        devices: Iterable[Device],
+        action: DeviceAction,
+        max_workers: int,
+        realtime_client: BaseRealtimeClient,
+        confirm_timeout: float,
+    ) -> List[ActuationResult]:
+        """
+        Internal method for actuating several devices in parallel
+
+        :param devices: devices to interact with
+        :param action: action to take on the devices
+        :param max_workers: maximum number of concurrent actuations
+        :param realtime_client: client to confirm the resulting status through, if set
+        :param confirm_timeout: maximum time to wait for each confirmation
+        :return: outcome for each device, in the same order as devices
+        """
+        devices = list(devices)
+        if not devices:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(devices))) as executor:
+            return list(
+                executor.map(
+                    lambda device: self._actuate_and_report(
+                        device,
+                        action,
+                        confirm=realtime_client is not None,
+                        realtime_client=realtime_client,
+                        timeout=confirm_timeout,
+                    ),
+                    devices,
+                )
+            )
 
     def _build_request(self, selector: str) -> urllib.request.Request:
         """
@@ -62,27 +261,169 @@ class RestClient:
         :param selector: path / endpoint for the request
         :return: Request object
         """
-        request = urllib.request.Request(f"https://{self.config.host}{selector}")
+        return urllib.request.Request(f"https://{self.config.host}{selector}")
+
+    def _authorize(self, request: urllib.request.Request) -> None:
+        """
+        Set the Authorization header from the current credentials
+        
+        :param request: Request object
+        :return: None
+        """
         request.add_header(
             "Authorization",
             f"{self.credentials.token_type} {self.credentials.id_token}",
         )
-        return request
 
-    def _response_to_objects(self, selector: str, model: Any) -> Any:
+    def _urlopen(self, request: urllib.request.Request) -> PooledResponse:
+        """
+        Send a request, retrying it as allowed by the retry policy. A throttled
+        (HTTP 429) request also pauses the rate limiter, holding back every client
+        sharing it.
+
+        :param request: Request object
+        :return: response, to be used as a context manager
+        """
+        policy = self.policy
+        attempt = 1
+        while True:
+            try:
+                return self._send(request)
+            except OSError as error:
+                if not policy.retry.should_retry(request.get_method(), error, attempt):
+                    raise
+                delay = policy.retry.delay(error, attempt)
+                if isinstance(error, urllib.error.HTTPError):
+                    error.close()
+                    if error.code == 429 and policy.rate_limiter is not None:
+                        policy.rate_limiter.pause(delay)
+                logger.warning(
+                    "%s %s failed (%s), retrying in %.1f seconds",
+                    request.get_method(),
+                    request.selector,
+                    error,
+                    delay,
+                )
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_once(self, request: urllib.request.Request) -> PooledResponse:
+        """
+        Send a request over the connection pool, once the rate limiter allows
+
+        :param request: Request object
+        :return: response, to be used as a context manager
+        """
+        if self.policy.rate_limiter is not None:
+            self.policy.rate_limiter.acquire()
+        return self.pool.urlopen(request, timeout=self.policy.timeout)
+
+    def _send(self, request: urllib.request.Request) -> PooledResponse:
+        """
+        Send a request with current credentials. If auto_refresh is set, credentials
+        close to expiration are refreshed first, and a request rejected with HTTP 401
+        is replayed once after refreshing them, provided the credentials are
+        refreshable.
+
+        :param request: Request object
+        :return: response, to be used as a context manager
+        """
+        auto_refresh = self.policy.auto_refresh and self.credentials.refreshable
+        if auto_refresh:
+            self.credentials.refresh(ttl_limit=self.policy.refresh_margin)
+        id_token = self.credentials.id_token
+        self._authorize(request)
+        try:
+            return self._send_once(request)
+        except urllib.error.HTTPError as error:
+            if not (auto_refresh and error.code == 401):
+                raise
+            error.close()
+        if self.credentials.id_token == id_token:
+            # Not already refreshed by a concurrent request
+            self.credentials.refresh(force=True)
+        self._authorize(request)
+        return self._send_once(request)
+
+    def _response_to_objects(
+        self, selector: str, model: Any, endpoint: str = None, use_cache: bool = True
+    ) -> Any:
         """
         Execute request at specified selector and convert response body into a list of
-        provided type
-        
+        provided type, tolerating unknown fields and mistyped values. If a cache is
+        configured, and has a TTL for the endpoint, fresh cached data is used and stale
+        cached data is revalidated.
+
         :param selector: API route to call
         :param model: Class type to convert for response
+        :param endpoint: name of the calling method, used to look up the cache TTL
+        :param use_cache: serve from the cache if possible, otherwise only refill it
         :return: Object of type model
         """
-        with urllib.request.urlopen(self._build_request(selector)) as request:
-            response_body = request.read()
-            response_dict = json.loads(response_body.decode())
-            objects = [model(**item) for item in response_dict["data"]]
-            return objects
+        return get_decoder(model).decode_many(
+            self._response_data(selector, endpoint, use_cache)
+        )
+
+    def _response_data(
+        self, selector: str, endpoint: str = None, use_cache: bool = True
+    ) -> List[Any]:
+        """
+        Execute request at specified selector and return the "data" member of the
+        response body, from the cache where possible
+
+        :param selector: API route to call
+        :param endpoint: name of the calling method, used to look up the cache TTL
+        :param use_cache: serve from the cache if possible, otherwise only refill it
+        :return: decoded "data" member
+        """
+        identity = self.credentials.username
+        cacheable = bool(
+            self.cache is not None and endpoint and self.cache.ttl(endpoint) > 0
+        )
+        entry = self.cache.get(identity, selector) if cacheable and use_cache else None
+        if entry and entry.fresh:
+            return entry.data
+
+        request = self._build_request(selector)
+        if entry:
+            for header, value in entry.validators.items():
+                request.add_header(header, value)
+        try:
+            with self._urlopen(request) as response:
+                response_body = response.read()
+                headers = response.headers if cacheable else None
+        except urllib.error.HTTPError as error:
+            if not (entry and error.code == 304):
+                raise
+            self.cache.revalidated(entry)
+            return entry.data
+
+        data = json.loads(response_body.decode())["data"]
+        if cacheable:
+            self.cache.put(
+                identity,
+                endpoint,
+                selector,
+                data,
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
+            )
+        return data
+
+    def _iter_response_objects(self, selector: str, model: Any) -> Iterator[Any]:
+        """
+        Execute request at specified selector and lazily convert the items of the
+        response body into objects of the provided type, decoding the body as it is
+        read. Responses are neither cached nor served from the cache.
+
+        :param selector: API route to call
+        :param model: Class type to convert for response
+        :return: generator of objects of type model
+        """
+        decode = get_decoder(model).decode
+        with self._urlopen(self._build_request(selector)) as response:
+            for item in iter_json_items(response):
+                yield decode(item)
 
     def get_devices_in_home(self, home: Home) -> List[Device]:
         """
@@ -92,17 +433,87 @@ class RestClient:
         :return: List of Devices
         """
         selector = f"/prod_v1/homes/{home.homeid}/devices"
-        return self._response_to_objects(selector, Device)
+        devices = self._response_to_objects(selector, Device, "get_devices_in_home")
+        if self.state_store is not None:
+            for device in devices:
+                self.state_store.update_device(device)
+        return devices
 
-    def get_device_details(self, device: Device) -> DeviceDetails:
+    def iter_devices_in_home(self, home: Home) -> Iterator[Device]:
         """
-        Get details of a specific device
+        Lazily get the devices in a given Home, decoding the response as it is read
+        
+        :param home: Home to query
+        :return: generator of Devices
+        """
+        selector = f"/prod_v1/homes/{home.homeid}/devices"
+        for device in self._iter_response_objects(selector, Device):
+            if self.state_store is not None:
+                self.state_store.update_device(device)
+            yield device
+
+    def get_device_details(
+        self, device: Device, max_staleness: float = None
+    ) -> DeviceDetails:
+        """
+        Get details of a specific device. If a state store is configured, and holds
+        details for the device updated within max_staleness seconds (e.g. by the
+        realtime stream), they are returned without a request.
         
         :param device: Device to query
+        :param max_staleness: maximum age of stored state, store default if not set
+        :return: Device details
+        """
+        if self.state_store is not None:
+            details = self.state_store.get_details(device.deviceid, max_staleness)
+            if details:
+                return details
+        return self._fetch_device_details(device)
+
+    def _fetch_device_details(
+        self, device: Device, use_cache: bool = True
+    ) -> DeviceDetails:
+        """
+        Request details of a specific device, updating the state store if configured
+
+        :param device: Device to query
+        :param use_cache: serve from the response cache if possible
         :return: Device details
         """
         selector = f"/prod_v1/devices/{device.deviceid}"
-        return self._response_to_objects(selector, DeviceDetails)[0]
+        details = self._response_to_objects(
+            selector, DeviceDetails, "get_device_details", use_cache
+        )[0]
+        if self.state_store is not None:
+            self.state_store.update_details(device.deviceid, details)
+        return details
+
+    def get_fleet(
+        self, include_details: bool = True, max_workers: int = 8
+    ) -> FleetSnapshot:
+        """
+        Get every Home, the Devices in each Home, and optionally the details of each
+        Device. Each level is fetched in parallel and each Device is only queried once,
+        even if it appears in several Homes.
+
+        :param include_details: fetch Device details as well as Devices
+        :param max_workers: maximum number of concurrent requests
+        :return: Fleet snapshot indexed by homeid and deviceid
+        """
+        snapshot = FleetSnapshot()
+        homes = self.get_my_homes()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for home, devices in zip(
+                homes, executor.map(self.get_devices_in_home, homes)
+            ):
+                snapshot.add_home(home, devices)
+            if include_details:
+                devices = list(snapshot.devices.values())
+                for device, details in zip(
+                    devices, executor.map(self.get_device_details, devices)
+                ):
+                    snapshot.details[device.deviceid] = details
+        return snapshot
 
     def get_my_homes(self) -> List[Home]:
         """
@@ -111,7 +522,16 @@ class RestClient:
         :return: List of Homes
         """
         selector = "/prod_v1/users/me/homes"
-        return self._response_to_objects(selector, Home)
+        return self._response_to_objects(selector, Home, "get_my_homes")
+
+    def iter_my_homes(self) -> Iterator[Home]:
+        """
+        Lazily get the Homes to which the current user is "attached", decoding the
+        response as it is read
+        
+        :return: generator of Homes
+        """
+        return self._iter_response_objects("/prod_v1/users/me/homes", Home)
 
     def get_my_user(self) -> User:
         """
@@ -120,7 +540,7 @@ class RestClient:
         :return: User details
         """
         selector = "/prod_v1/users/me"
-        return self._response_to_objects(selector, User)[0]
+        return self._response_to_objects(selector, User, "get_my_user")[0]
 
     def get_shared_users_in_home(self, home: Home) -> List[SharedUser]:
         """
@@ -131,7 +551,20 @@ class RestClient:
         :return: List of users with shared access
         """
         selector = f"/prod_v1/homes/{home.homeid}/sharedusers"
-        return self._response_to_objects(selector, SharedUser)
+        return self._response_to_objects(
+            selector, SharedUser, "get_shared_users_in_home"
+        )
+
+    def iter_shared_users_in_home(self, home: Home) -> Iterator[SharedUser]:
+        """
+        Lazily get users with shared access to the specified home, assuming the current
+        user is the "owner", decoding the response as it is read
+        
+        :param home: Home to query
+        :return: generator of users with shared access
+        """
+        selector = f"/prod_v1/homes/{home.homeid}/sharedusers"
+        return self._iter_response_objects(selector, SharedUser)
 
     def lock_device(self, device: Device) -> str:
         """
@@ -150,3 +583,107 @@ class RestClient:
         :return: Response body as a string (contains a count of affected devices)
         """
         return self._actuate_device(device, DeviceAction.UNLOCK)
+
+    def lock_devices(
+        self,
+        devices: Iterable[Device],
+        max_workers: int = 8,
+        realtime_client: BaseRealtimeClient = None,
+        confirm_timeout: float = 10,
+    ) -> List[ActuationResult]:
+        """
+        Set several devices' state to "locked" in parallel. A failure to lock one device
+        does not stop the others.
+        
+        :param devices: Devices to lock
+        :param max_workers: maximum number of concurrent requests
+        :param realtime_client: connected client whose device subscription covers the
+            devices; if set, each lock is confirmed by its "Locked" event, or failing
+            that by the device details
+        :param confirm_timeout: maximum time to wait for each confirmation
+        :return: outcome for each device, in the same order as devices
+        """
+        return self._actuate_devices(
+            devices, DeviceAction.LOCK, max_workers, realtime_client, confirm_timeout
+        )
+
+    def unlock_devices(
+        self,
+        devices: Iterable[Device],
+        max_workers: int = 8,
+        realtime_client: BaseRealtimeClient = None,
+        confirm_timeout: float = 10,
+    ) -> List[ActuationResult]:
+        """
+        Set several devices' state to "unlocked" in parallel. A failure to unlock one
+        device does not stop the others.
+        
+        :param devices: Devices to unlock
+        :param max_workers: maximum number of concurrent requests
+        :param realtime_client: connected client whose device subscription covers the
+            devices; if set, each unlock is confirmed by its "Unlocked" event, or
+            failing that by the device details
+        :param confirm_timeout: maximum time to wait for each confirmation
+        :return: outcome for each device, in the same order as devices
+        """
+        return self._actuate_devices(
+            devices, DeviceAction.UNLOCK, max_workers, realtime_client, confirm_timeout
+        )
+
+    def lock_device_confirmed(
+        self,
+        device: Device,
+        realtime_client: BaseRealtimeClient = None,
+        timeout: float = 10,
+        poll_interval: float = 1,
+    ) -> ActuationResult:
+        """
+        Set a device's state to "locked" and confirm it has locked, by its realtime
+        "Locked" event if a connected realtime client is given (checking the device
+        details over REST if the event does not arrive in time), or else by polling the
+        device details
+        
+        :param device: Device to lock
+        :param realtime_client: connected client whose device subscription covers the
+            device
+        :param timeout: maximum time to wait for confirmation
+        :param poll_interval: time between device details requests when polling
+        :return: outcome, with the confirmed lockstatus and latency
+        """
+        return self._actuate_and_report(
+            device,
+            DeviceAction.LOCK,
+            confirm=True,
+            realtime_client=realtime_client,
+            timeout=timeout,
+            poll_interval=poll_interval,
+        )
+
+    def unlock_device_confirmed(
+        self,
+        device: Device,
+        realtime_client: BaseRealtimeClient = None,
+        timeout: float = 10,
+        poll_interval: float = 1,
+    ) -> ActuationResult:
+        """
+        Set a device's state to "unlocked" and confirm it has unlocked, by its realtime
+        "Unlocked" event if a connected realtime client is given (checking the device
+        details over REST if the event does not arrive in time), or else by polling the
+        device details
+        
+        :param device: Device to unlock
+        :param realtime_client: connected client whose device subscription covers the
+            device
+        :param timeout: maximum time to wait for confirmation
+        :param poll_interval: time between device details requests when polling
+        :return: outcome, with the confirmed lockstatus and latency
+        """
+        return self._actuate_and_report(
+            device,
+            DeviceAction.UNLOCK,
+            confirm=True,
+            realtime_client=realtime_client,
+            timeout=timeout,
+            poll_interval=poll_interval,
+        )
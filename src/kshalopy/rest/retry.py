@@ -0,0 +1,216 @@
+"""
+rest/retry.py
+"""
+
+import random
+import threading
+import time
+import urllib.error
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RetryPolicy:
+    """
+    Decides whether, and after how long, a failed REST request is retried. Idempotent
+    requests are retried on throttling, server errors and connection failures. Other
+    requests, such as actuations, are only retried when the server has rejected them
+    without acting on them (HTTP 429), so a lock or unlock is never applied twice.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        unsafe_retry_statuses: Iterable[int] = (429,),
+        max_retry_after: float = 60,
+    ):
+        """
+        :param max_attempts: maximum number of attempts per request, including the
+            first; 1 disables retries
+        :param backoff_base: backoff before the first retry, doubled on each retry
+        :param backoff_max: maximum backoff
+        :param retry_statuses: HTTP statuses on which idempotent requests are retried
+        :param unsafe_retry_statuses: HTTP statuses on which other requests are retried
+        :param max_retry_after: longest Retry-After, in seconds, that is waited out; a
+            request asked to wait longer is not retried
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.unsafe_retry_statuses = frozenset(unsafe_retry_statuses)
+        self.max_retry_after = max_retry_after
+
+    @staticmethod
+    def retry_after(error: OSError) -> float:
+        """
+        Return the delay requested by an error response's Retry-After header
+
+        :param error: error raised for the request
+        :return: delay in seconds, or None if not given
+        """
+        headers = getattr(error, "headers", None)
+        value = headers.get("Retry-After") if headers else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def should_retry(self, method: str, error: OSError, attempt: int) -> bool:
+        """
+        Decide whether to retry a failed request
+
+        :param method: HTTP method of the request
+        :param error: error raised for the request
+        :param attempt: number of attempts made so far
+        :return: True if the request should be retried
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if isinstance(error, urllib.error.HTTPError):
+            if method.upper() in IDEMPOTENT_METHODS:
+                statuses = self.retry_statuses
+            else:
+                statuses = self.unsafe_retry_statuses
+            if error.code not in statuses:
+                return False
+            retry_after = self.retry_after(error)
+            return retry_after is None or retry_after <= self.max_retry_after
+        # The request may have reached the server before the connection failed
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def delay(self, error: OSError, attempt: int) -> float:
+        """
+        Calculate the delay before retrying, honoring Retry-After if given, otherwise
+        exponential backoff with full jitter
+
+        :param error: error raised for the request
+        :param attempt: number of attempts made so far
+        :return: delay in seconds
+        """
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        )
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter. Share one between RestClients (and threads)
+    to keep their combined request rate under the API's limits.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        :param rate: tokens added per second, i.e. the sustained request rate
+        :param capacity: maximum tokens held, i.e. the largest burst; defaults to rate,
+            or 1 for rates under one per second
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, not {rate}")
+        if capacity is None:
+            capacity = max(rate, 1)
+        elif capacity < 1:
+            # A single request could never be taken
+            raise ValueError(f"capacity must be at least 1, not {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _take(self, tokens: float) -> float:
+        """
+        Take tokens if available. Must be called with the lock held.
+
+        :param tokens: number of tokens to take
+        :return: 0 if taken, otherwise the time to wait before trying again
+        """
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0
+        return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: float = None) -> bool:
+        """
+        Take tokens, waiting for them to become available
+
+        :param tokens: number of tokens to take
+        :param timeout: maximum time to wait, unbounded if not set
+        :return: True if taken, False if the timeout passed first
+        """
+        if tokens > self.capacity:
+            # The bucket never holds that many, so waiting would never end
+            raise ValueError(
+                f"cannot take {tokens} tokens from a bucket of capacity "
+                f"{self.capacity}"
+            )
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                wait = self._take(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= wait:
+                    return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back all requests for a while, e.g. when the server asks to Retry-After
+
+        :param seconds: time to hold back requests for
+        :return: None
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # Start refilling from empty once the pause is over
+            self._tokens = 0
+            self._updated = self._paused_until
+
+
+@dataclass
+class RequestPolicy:
+    """
+    Data-only class for how a RestClient sends requests: the socket timeout (pool
+    default if not set), when credentials are refreshed, which failed requests are
+    retried, and the token bucket taken from before every request (not rate limited
+    if not set), which may be shared between clients
+    """
+
+    timeout: float = None
+    refresh_margin: int = 300
+    auto_refresh: bool = True
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    rate_limiter: TokenBucket = None
@@ -0,0 +1,128 @@
+"""
+rest/stream.py
+"""
+
+import codecs
+import json
+
+from typing import Any, BinaryIO, Iterator
+
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",:]}"
+
+
+class _StreamBuffer:
+    """
+    Window of decoded text over a binary stream, refilled on demand
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def fill(self) -> bool:
+        """
+        Read another chunk from the stream, discarding consumed text
+
+        :return: False if the stream is exhausted
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        self.text = self.text[self.pos :] + self._decoder.decode(chunk, self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character
+
+        :return: next character, or "" at the end of the stream
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text) or not self.fill():
+                return self.text[self.pos : self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        """
+        Consume the next non-whitespace character, which must be char
+
+        :param char: expected character
+        :return: None
+        """
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.text, self.pos)
+        self.pos += 1
+
+    def value(self, decoder: json.JSONDecoder) -> Any:
+        """
+        Decode the next complete JSON value, reading as much as it needs
+
+        :param decoder: JSON decoder
+        :return: decoded value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number may continue in the next chunk, e.g. "1" of "1.5", so only
+            # accept a value once the delimiter that follows it has been read
+            if self.eof or (end < len(self.text) and self.text[end] in DELIMITERS):
+                self.pos = end
+                return value
+            if not self.fill():
+                self.pos = end
+                return value
+
+
+def iter_json_items(
+    stream: BinaryIO, key: str = "data", chunk_size: int = 65536
+) -> Iterator[Any]:
+    """
+    Incrementally decode the items of the array held by one member of a JSON object,
+    e.g. the "data" member of a REST response body, reading the stream a chunk at a
+    time. Only one item, plus one chunk of text, is held in memory at a time. If the
+    member is not an array its value is yielded as the only item.
+
+    :param stream: binary stream positioned at the start of a JSON object
+    :param key: name of the member holding the array
+    :param chunk_size: number of bytes read from the stream at a time
+    :return: generator of decoded items
+    """
+    decoder = json.JSONDecoder()
+    buffer = _StreamBuffer(stream, chunk_size)
+    buffer.expect("{")
+    if buffer.peek() == "}":
+        return
+    while True:
+        name = buffer.value(decoder)
+        buffer.expect(":")
+        if name != key:
+            buffer.value(decoder)
+        elif buffer.peek() != "[":
+            yield buffer.value(decoder)
+        else:
+            buffer.expect("[")
+            if buffer.peek() != "]":
+                while True:
+                    yield buffer.value(decoder)
+                    if buffer.peek() != ",":
+                        break
+                    buffer.pos += 1
+            buffer.expect("]")
+        if buffer.peek() != ",":
+            break
+        buffer.pos += 1
+    buffer.expect("}")
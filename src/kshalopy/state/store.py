@@ -0,0 +1,217 @@
+"""
+state/store.py
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict
+
+from ..models.models import Device, DeviceDetails
+
+DEVICE_FIELDS = tuple(f.name for f in fields(Device))
+DETAILS_FIELDS = tuple(f.name for f in fields(DeviceDetails))
+DETAILS_NAMES = frozenset(DETAILS_FIELDS)
+
+
+@dataclass
+class FieldState:
+    """
+    Data-only class for the last known value of a device field
+    """
+
+    value: Any
+    updated: float
+    source: str
+
+
+class DeviceStateStore:
+    """
+    Thread-safe, in-memory view of device state, fed by REST responses and realtime
+    events. Each field is tracked with the time and source of its last update, and older
+    updates never overwrite newer ones.
+    """
+
+    REALTIME = "realtime"
+    REST = "rest"
+
+    def __init__(self, max_staleness: float = 60):
+        """
+        :param max_staleness: default age, in seconds, beyond which stored device
+            details are not served in place of a REST request
+        """
+        self.max_staleness = max_staleness
+        self._fields: Dict[str, Dict[str, FieldState]] = {}
+        self._last_updated: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, deviceid: str) -> bool:
+        return deviceid in self._fields
+
+    def update(
+        self,
+        deviceid: str,
+        values: Dict[str, Any],
+        source: str,
+        timestamp: float = None,
+    ) -> None:
+        """
+        Record new values for some of a device's fields
+
+        :param deviceid: ID of the device
+        :param values: field names and values
+        :param source: where the values came from (REALTIME or REST)
+        :param timestamp: when the values were observed, now if not set
+        :return: None
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            device_fields = self._fields.setdefault(deviceid, {})
+            for name, value in values.items():
+                current = device_fields.get(name)
+                if current is None or current.updated <= timestamp:
+                    device_fields[name] = FieldState(value, timestamp, source)
+            if timestamp > self._last_updated.get(deviceid, 0):
+                self._last_updated[deviceid] = timestamp
+
+    def update_device(
+        self, device: Device, source: str = REST, timestamp: float = None
+    ) -> None:
+        """
+        Record the non-empty fields of a Device
+
+        :param device: Device to record
+        :param source: where the Device came from
+        :param timestamp: when the Device was observed, now if not set
+        :return: None
+        """
+        values = {
+            name: getattr(device, name)
+            for name in DEVICE_FIELDS
+            if getattr(device, name) is not None
+        }
+        self.update(device.deviceid, values, source, timestamp)
+
+    def update_details(
+        self, deviceid: str, details: DeviceDetails, timestamp: float = None
+    ) -> None:
+        """
+        Record a full set of Device Details fetched over REST
+
+        :param deviceid: ID of the device
+        :param details: Device details to record
+        :param timestamp: when the details were observed, now if not set
+        :return: None
+        """
+        values = {name: getattr(details, name) for name in DETAILS_FIELDS}
+        self.update(deviceid, values, self.REST, timestamp)
+
+    def update_from_event(
+        self, deviceid: str, event: Dict[str, Any], timestamp: float = None
+    ) -> None:
+        """
+        Record the device fields carried by a realtime onManageDevice event. The
+        device status is both the Device lockstatus and the Device Details doorstatus.
+
+        :param deviceid: ID of the device
+        :param event: onManageDevice payload
+        :param timestamp: when the event was received, now if not set
+        :return: None
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        values = {
+            "lockstatus": event["devicestatus"],
+            "doorstatus": event["devicestatus"],
+            "lastupdatestatus": int(timestamp),
+        }
+        if event.get("devicename"):
+            values["devicename"] = event["devicename"]
+        self.update(deviceid, values, self.REALTIME, timestamp)
+
+    def get_field(self, deviceid: str, name: str) -> FieldState:
+        """
+        Return the last known state of one field of a device
+
+        :param deviceid: ID of the device
+        :param name: field name
+        :return: field state, or None if unknown
+        """
+        with self._lock:
+            return self._fields.get(deviceid, {}).get(name)
+
+    def age(self, deviceid: str) -> float:
+        """
+        Return the time since any field of the device was last updated
+
+        :param deviceid: ID of the device
+        :return: age in seconds, infinite if the device is unknown
+        """
+        with self._lock:
+            last_updated = self._last_updated.get(deviceid)
+        return float("inf") if last_updated is None else time.time() - last_updated
+
+    def get_device(self, deviceid: str) -> Device:
+        """
+        Build a Device from the last known state of its fields
+
+        :param deviceid: ID of the device
+        :return: Device, or None if the device is unknown
+        """
+        with self._lock:
+            device_fields = self._fields.get(deviceid)
+            if device_fields is None:
+                return None
+            values = {
+                name: device_fields[name].value
+                for name in DEVICE_FIELDS
+                if name in device_fields
+            }
+        values["deviceid"] = deviceid
+        return Device(**values)
+
+    def get_devices(self) -> Dict[str, Device]:
+        """
+        Build every known Device from the last known state of its fields
+
+        :return: Devices by deviceid
+        """
+        with self._lock:
+            deviceids = list(self._fields)
+        devices = {deviceid: self.get_device(deviceid) for deviceid in deviceids}
+        return {deviceid: device for deviceid, device in devices.items() if device}
+
+    def get_details(self, deviceid: str, max_staleness: float = None) -> DeviceDetails:
+        """
+        Build Device Details from memory, provided a full set of details has been
+        recorded and every field was updated within max_staleness seconds. Realtime
+        events update the fields they carry, which are laid over the details recorded
+        over REST, but do not make the other fields fresh.
+
+        :param deviceid: ID of the device
+        :param max_staleness: maximum age in seconds, store default if not set
+        :return: Device details, or None if the stored state is missing or too old
+        """
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        with self._lock:
+            device_fields = self._fields.get(deviceid)
+            if device_fields is None or not device_fields.keys() >= DETAILS_NAMES:
+                return None
+            states = [device_fields[name] for name in DETAILS_FIELDS]
+        if time.time() - min(state.updated for state in states) > max_staleness:
+            return None
+        return DeviceDetails(
+            **{name: state.value for name, state in zip(DETAILS_FIELDS, states)}
+        )
+
+    def clear(self) -> None:
+        """
+        Forget all device state
+
+        :return: None
+        """
+        with self._lock:
+            self._fields.clear()
+            self._last_updated.clear()
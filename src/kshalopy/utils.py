@@ -2,10 +2,17 @@
 utils.py
 """
 
-from typing import Dict
+import threading
+
+from typing import Any, Dict, Tuple
+
+import boto3
 
 from dateutil import parser
 
+_boto3_clients: Dict[Tuple[str, str], Any] = {}
+_boto3_clients_lock = threading.Lock()
+
 
 def date_string_to_timestamp(dt_string: str) -> float:
     """
@@ -30,3 +37,34 @@ def calculate_expiration(response: Dict[str, Dict]) -> float:
         + response["AuthenticationResult"]["ExpiresIn"]
     )
     return expiration
+
+
+def get_boto3_client(service_name: str, region_name: str) -> Any:
+    """
+    Return a process-wide boto3 client for a service and region, creating it on first
+    use. Client creation loads botocore service models and endpoint data, which is
+    expensive; the clients themselves are thread-safe and can be shared.
+
+    :param service_name: AWS service name, e.g. "cognito-idp"
+    :param region_name: AWS region name
+    :return: boto3 client
+    """
+    key = (service_name, region_name)
+    client = _boto3_clients.get(key)
+    if client is None:
+        with _boto3_clients_lock:
+            client = _boto3_clients.get(key)
+            if client is None:
+                client = boto3.client(service_name, region_name=region_name)
+                _boto3_clients[key] = client
+    return client
+
+
+def clear_boto3_clients() -> None:
+    """
+    Discard all cached boto3 clients
+
+    :return: None
+    """
+    with _boto3_clients_lock:
+        _boto3_clients.clear()
@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture
+def mock_boto3_client(monkeypatch):
+    def patch(client):
+        # A cache of its own, restored with the module afterwards
+        monkeypatch.setattr("src.kshalopy.utils._boto3_clients", {})
+        monkeypatch.setattr("src.kshalopy.utils.boto3.client", client)
+
+    return patch
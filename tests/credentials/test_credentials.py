@@ -1,9 +1,13 @@
 import json
+import threading
+import time
 
 from datetime import datetime, timezone
-from io import TextIOBase
+from functools import partial
 from pathlib import Path
 
+import pytest
+
 from src.kshalopy import AppCredentials, Config
 
 test_path = str(Path.joinpath(Path(__file__).parent, "test_credentials.json"))
@@ -35,24 +39,44 @@ def test_partial_loaded_credentials():
     assert credentials.id_token == "fake_id_token"
 
 
-def test_save_credentials(monkeypatch):
-    class FakeFile(TextIOBase):
-        with open(test_path) as infile:
-            expected = infile.read()
+def test_save_credentials(tmp_path):
+    with open(test_path) as infile:
+        expected = json.load(infile)
+
+    credentials = AppCredentials.load_credentials(test_path, test_config)
+    save_path = tmp_path / "foo.123.json"
+    credentials.save_credentials(str(save_path))
+    assert json.loads(save_path.read_text()) == expected
+    assert [path.name for path in tmp_path.iterdir()] == ["foo.123.json"]
 
-        def write(self, content):
-            assert json.loads(content) == json.loads(self.expected)
+    credentials.id_token = "new_fake_id_token"
+    credentials.save_credentials(str(save_path))
+    assert json.loads(save_path.read_text())["id_token"] == "new_fake_id_token"
+    assert len(list(tmp_path.iterdir())) == 1
 
+
+def test_save_credentials_failure(tmp_path, monkeypatch):
     credentials = AppCredentials.load_credentials(test_path, test_config)
-    monkeypatch.setattr("builtins.open", FakeFile)
-    credentials.save_credentials("foo.123.json")
+    save_path = tmp_path / "foo.123.json"
+    credentials.save_credentials(str(save_path))
+
+    def failing_fsync(_fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("src.kshalopy.credentials.credentials.os.fsync", failing_fsync)
+    credentials.id_token = "new_fake_id_token"
+    with pytest.raises(OSError):
+        credentials.save_credentials(str(save_path))
+    # The original file is untouched and no temporary file is left behind
+    assert json.loads(save_path.read_text())["id_token"] == "fake_id_token"
+    assert len(list(tmp_path.iterdir())) == 1
 
 
 class MockClient:
-    call_count = -1
+    calls = []
 
-    arg_sets = [
-        {
+    arg_sets = {
+        "initiate_auth": {
             "AuthFlow": "REFRESH_TOKEN",
             "AuthParameters": {
                 "CURRENT_USER": "fake_username",
@@ -60,7 +84,7 @@ class MockClient:
             },
             "ClientId": "fake_client_id",
         },
-        {
+        "get_id": {
             "IdentityPoolId": "fake_identity_pool_id",
             "Logins": {
                 "cognito-idp.us-east-1.amazonaws.com/us-east-1_fake_user_pool_id": (
@@ -68,7 +92,7 @@ class MockClient:
                 )
             },
         },
-        {
+        "get_credentials_for_identity": {
             "IdentityId": "fake_identity_id",
             "Logins": {
                 "cognito-idp.us-east-1.amazonaws.com/us-east-1_fake_user_pool_id": (
@@ -76,10 +100,10 @@ class MockClient:
                 )
             },
         },
-    ]
+    }
 
-    return_sets = [
-        {
+    return_sets = {
+        "initiate_auth": {
             "AuthenticationResult": {
                 "AccessToken": "fake_access_token",
                 "ExpiresIn": 3600,
@@ -92,10 +116,10 @@ class MockClient:
             },
             "Session": "fake_session",
         },
-        {
+        "get_id": {
             "IdentityId": "fake_identity_id",
         },
-        {
+        "get_credentials_for_identity": {
             "IdentityId": "fake_identity_id",
             "Credentials": {
                 "AccessKeyId": "fake_access_key_id",
@@ -104,47 +128,105 @@ class MockClient:
                 "Expiration": datetime(2022, 2, 18, 12, 47, 56, 201585),
             },
         },
-    ]
+    }
 
     def __init__(self, client_type, region_name):
-        self.call_count = -1
         assert client_type in ("cognito-idp", "cognito-identity")
         assert region_name
 
-        for func in (
-            "initiate_auth",
-            "respond_to_auth_challenge",
-            "get_id",
-            "get_credentials_for_identity",
-        ):
-            self.__dict__[func] = self.handle_call
+        for func in self.arg_sets:
+            self.__dict__[func] = partial(self.handle_call, func)
+
+    def handle_call(self, func, **kwargs):
+        self.calls.append(func)
+        assert kwargs == self.arg_sets[func]
+        return self.return_sets[func]
+
+
+@pytest.fixture
+def mock_boto3(mock_boto3_client):
+    MockClient.calls = []
+    mock_boto3_client(MockClient)
+
+
+def test_refresh(mock_boto3):
+    credentials = AppCredentials.load_credentials(test_path, test_config)
+    credentials.refresh()
+    # The identity is already known, so only its credentials are fetched
+    assert MockClient.calls == ["initiate_auth", "get_credentials_for_identity"]
+
+
+def test_refresh_unknown_identity(mock_boto3):
+    credentials = AppCredentials.load_credentials(test_path, test_config)
+    credentials.aws_credentials = None
+    credentials.refresh()
+    assert MockClient.calls == [
+        "initiate_auth",
+        "get_id",
+        "get_credentials_for_identity",
+    ]
+    assert credentials.aws_credentials.identity_id == "fake_identity_id"
 
-    def handle_call(self, **kwargs):
-        self.__class__.call_count += 1
-        assert kwargs == self.arg_sets[self.__class__.call_count]
-        return self.return_sets[self.__class__.call_count]
 
+def test_refresh_valid_aws_credentials(mock_boto3):
+    credentials = AppCredentials.load_credentials(test_path, test_config)
+    credentials.aws_credentials.expiration = datetime.now().timestamp() + 3600
+    credentials.refresh()
+    assert MockClient.calls == ["initiate_auth"]
 
-def test_refresh(monkeypatch):
-    MockClient.call_count = -1
-    monkeypatch.setattr("src.kshalopy.login.login.boto3.client", MockClient)
+
+def test_refresh_expired_aws_credentials(mock_boto3):
     credentials = AppCredentials.load_credentials(test_path, test_config)
+    credentials.expiration = datetime.now().timestamp() + 1000
     credentials.refresh()
+    assert MockClient.calls == ["get_credentials_for_identity"]
 
 
-def test_early_refresh(monkeypatch):
-    MockClient.call_count = -1
-    monkeypatch.setattr("src.kshalopy.login.login.boto3.client", MockClient)
+def test_refresh_without_app_config(mock_boto3):
+    credentials = AppCredentials.load_credentials(test_path)
+    credentials.expiration = datetime.now().timestamp() + 1000
+    with pytest.raises(ValueError, match="application configuration"):
+        credentials.refresh()
+    assert MockClient.calls == []
+
+
+def test_early_refresh(mock_boto3):
     credentials = AppCredentials.load_credentials(test_path, test_config)
     credentials.expiration = datetime.now().timestamp() + 1000
+    credentials.aws_credentials.expiration = datetime.now().timestamp() + 1000
     credentials.refresh()
-    assert MockClient.call_count == -1
+    assert MockClient.calls == []
 
 
-def test_forced_refresh(monkeypatch):
-    MockClient.call_count = -1
-    monkeypatch.setattr("src.kshalopy.login.login.boto3.client", MockClient)
+def test_forced_refresh(mock_boto3):
     credentials = AppCredentials.load_credentials(test_path, test_config)
     credentials.expiration = datetime.now().timestamp() + 1000
+    credentials.aws_credentials.expiration = datetime.now().timestamp() + 1000
     credentials.refresh(force=True)
-    assert MockClient.call_count > -1
+    assert MockClient.calls == ["initiate_auth"]
+
+
+def test_concurrent_refresh(monkeypatch, mock_boto3):
+    handle_call = MockClient.handle_call
+
+    def slow_handle_call(self, func, **kwargs):
+        time.sleep(0.1)
+        return handle_call(self, func, **kwargs)
+
+    monkeypatch.setattr(MockClient, "handle_call", slow_handle_call)
+    credentials = AppCredentials.load_credentials(test_path, test_config)
+    credentials.aws_credentials.expiration = datetime.now().timestamp() + 3600
+    monkeypatch.setattr(
+        "src.kshalopy.credentials.credentials.calculate_expiration",
+        lambda _response: datetime.now().timestamp() + 3600,
+    )
+    threads = [
+        threading.Thread(target=credentials.refresh, kwargs={"force": i % 2 == 0})
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert MockClient.calls == ["initiate_auth"]
+    assert credentials.ttl > 3500
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+from src.kshalopy import AppCredentials, Config, CredentialsManager, RefreshPolicy
+
+test_config = Config.from_app_json_file(
+    str(Path.joinpath(Path(__file__).parent, "test_config.json"))
+)
+test_path = str(Path.joinpath(Path(__file__).parent, "test_credentials.json"))
+
+
+class MockAppCredentials(AppCredentials):
+    lifetime = 3
+    delay = 0
+    error = None
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def refresh(self, ttl_limit: int = 900, force: bool = False) -> None:
+        cls = self.__class__
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(self.delay)
+        with cls.lock:
+            cls.active -= 1
+        if self.error:
+            raise self.error
+        self.expiration = datetime.now().timestamp() + self.lifetime
+
+
+def load_credentials(username, **kwargs):
+    credentials = MockAppCredentials.load_credentials(test_path, test_config)
+    credentials.username = username
+    credentials.__dict__.update(kwargs)
+    return credentials
+
+
+def test_manager_refreshes_accounts():
+    manager = CredentialsManager(
+        RefreshPolicy(expiration_offset=2, jitter=0), start=True
+    )
+    keys = [manager.add(load_credentials(f"user{i}")) for i in range(5)]
+    assert len(manager) == 5
+    assert "user0" in manager
+    time.sleep(0.5)
+    for key in keys:
+        assert 3 >= manager.get_credentials(key).ttl > 2
+        status = manager.status(key)
+        assert status.state == CredentialsManager.SCHEDULED
+        assert status.last_refresh is not None
+        assert status.failures == 0
+        assert status.next_refresh == status.expiration - 2
+    first = manager.status("user0").last_refresh
+    time.sleep(1.5)
+    assert manager.status("user0").last_refresh > first
+    manager.stop()
+    assert not manager.is_running
+
+
+def test_manager_not_due():
+    manager = CredentialsManager(
+        RefreshPolicy(expiration_offset=2, jitter=0), start=True
+    )
+    credentials = load_credentials("user")
+    credentials.expiration = datetime.now().timestamp() + 3600
+    manager.add(credentials)
+    time.sleep(0.2)
+    status = manager.status("user")
+    assert status.last_refresh is None
+    assert 3599 > status.next_refresh - datetime.now().timestamp() > 3597
+    manager.stop()
+
+
+def test_manager_jitter():
+    manager = CredentialsManager(RefreshPolicy(expiration_offset=600, jitter=60))
+    for i in range(20):
+        credentials = load_credentials(f"user{i}")
+        credentials.expiration = datetime.now().timestamp() + 3600
+        manager.add(credentials)
+    due = [status.next_refresh for status in manager.statuses().values()]
+    expected = datetime.now().timestamp() + 3000
+    assert all(expected - 61 < d <= expected for d in due)
+    assert len(set(due)) == 20
+
+
+def test_manager_bounded_workers():
+    MockAppCredentials.max_active = 0
+    manager = CredentialsManager(RefreshPolicy(jitter=0), max_workers=2)
+    for i in range(6):
+        manager.add(load_credentials(f"user{i}", delay=0.1, lifetime=3600))
+    manager.start()
+    time.sleep(0.6)
+    manager.stop()
+    assert MockAppCredentials.max_active == 2
+    assert all(s.last_refresh for s in manager.statuses().values())
+
+
+def test_manager_failure_and_remove():
+    manager = CredentialsManager(
+        RefreshPolicy(expiration_offset=60, jitter=0, retry_delay=10)
+    )
+    manager.add(load_credentials("user", error=ValueError("refresh failed")))
+    manager.start()
+    time.sleep(0.2)
+    status = manager.status("user")
+    assert status.state == CredentialsManager.FAILED
+    assert status.failures == 1
+    assert "refresh failed" in status.last_error
+    assert 10 >= status.next_refresh - datetime.now().timestamp() > 9
+    assert manager.remove("user").username == "user"
+    assert manager.status("user") is None
+    assert manager.remove("user") is None
+    manager.stop()
@@ -0,0 +1,131 @@
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from src.kshalopy import (
+    AppCredentials,
+    Config,
+    CredentialsDaemon,
+    CredentialsManager,
+    FileCredentialStore,
+    RefreshPolicy,
+    SQLiteCredentialStore,
+)
+from src.kshalopy.credentials.store import CredentialStore
+
+test_config = Config.from_app_json_file(
+    str(Path.joinpath(Path(__file__).parent, "test_config.json"))
+)
+test_path = str(Path.joinpath(Path(__file__).parent, "test_credentials.json"))
+
+
+class MockAppCredentials(AppCredentials):
+    def refresh(self, ttl_limit: int = 900, force: bool = False) -> None:
+        self.expiration = datetime.now().timestamp() + 3600
+
+
+def load_credentials(username):
+    credentials = MockAppCredentials.load_credentials(test_path, test_config)
+    credentials.username = username
+    return credentials
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "file":
+        store = FileCredentialStore(str(tmp_path / "credentials"))
+    else:
+        store = SQLiteCredentialStore(str(tmp_path / "credentials.db"))
+    yield store
+    store.close()
+
+
+def test_save_and_load(store):
+    assert store.load("user0") is None
+    assert store.load_all() == {}
+    store.save("user0", load_credentials("user0"))
+    store.save_many({f"user{i}": load_credentials(f"user{i}") for i in range(1, 4)})
+
+    credentials = store.load("user0", test_config)
+    assert isinstance(credentials, AppCredentials)
+    assert credentials.username == "user0"
+    assert credentials.aws_credentials.secret_key == "fake_secret_key"
+    assert credentials._app_config is test_config
+
+    loaded = store.load_all(test_config)
+    assert sorted(loaded) == ["user0", "user1", "user2", "user3"]
+    assert loaded["user2"].username == "user2"
+    assert loaded["user2"].expiration == 1645206377.0
+
+    updated = load_credentials("user2")
+    updated.id_token = "new_fake_id_token"
+    store.save("user2", updated)
+    assert store.load("user2").id_token == "new_fake_id_token"
+
+    store.delete(["user0", "user1", "unknown"])
+    assert sorted(store.load_all()) == ["user2", "user3"]
+
+
+def test_sqlite_reopen(tmp_path):
+    path = str(tmp_path / "credentials.db")
+    store = SQLiteCredentialStore(path)
+    store.save_many({f"user{i}": load_credentials(f"user{i}") for i in range(100)})
+    store.close()
+    store = SQLiteCredentialStore(path)
+    assert len(store.load_all()) == 100
+    store.close()
+
+
+def test_store_must_implement_storage():
+    class IncompleteStore(CredentialStore):
+        def save_many(self, credentials):
+            pass
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+def test_daemon_store(tmp_path):
+    store = SQLiteCredentialStore(str(tmp_path / "credentials.db"))
+    daemon = CredentialsDaemon(credentials=load_credentials("user"), store=store)
+    daemon.start()
+    time.sleep(0.5)
+    daemon.stop()
+    assert store.load("user").ttl > 3500
+    store.close()
+
+
+def test_manager_store(tmp_path):
+    store = SQLiteCredentialStore(str(tmp_path / "credentials.db"))
+    store.save_many({f"user{i}": load_credentials(f"user{i}") for i in range(5)})
+    saved = []
+    save_many = store.save_many
+    store.save_many = lambda credentials: saved.append(len(credentials)) or save_many(
+        credentials
+    )
+
+    loader = CredentialsManager(store=store)
+    assert loader.add_stored(test_config) == [f"user{i}" for i in range(5)]
+    assert loader.get_credentials("user3").username == "user3"
+
+    manager = CredentialsManager(
+        RefreshPolicy(jitter=0), store=store, flush_interval=0.3
+    )
+    for i in range(5):
+        manager.add(load_credentials(f"user{i}"))
+    manager.start()
+    time.sleep(0.1)
+    assert saved == []
+    time.sleep(0.4)
+    assert saved == [5]
+    assert all(c.ttl > 3500 for c in store.load_all().values())
+
+    manager.add(load_credentials("user5"))
+    time.sleep(0.1)
+    manager.stop()
+    assert saved == [5, 1]
+    assert store.load("user5").ttl > 3500
+    store.close()
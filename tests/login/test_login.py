@@ -159,9 +159,9 @@ class FakeDatetime:
         return datetime.utcfromtimestamp(1645203468)
 
 
-def fake_login_flow(monkeypatch, client_secret, mock_client):
+def fake_login_flow(monkeypatch, mock_boto3_client, client_secret, mock_client):
     monkeypatch.setattr("src.kshalopy.login.helper.urandom", lambda n: b"0" * n)
-    monkeypatch.setattr("src.kshalopy.login.login.boto3.client", mock_client)
+    mock_boto3_client(mock_client)
     monkeypatch.setattr("src.kshalopy.login.helper.datetime", FakeDatetime)
 
     config = Config.load_defaults()
@@ -188,18 +188,20 @@ def fake_login_flow(monkeypatch, client_secret, mock_client):
     return authenticator.credentials
 
 
-def test_login_flow_with_secret(monkeypatch):
+def test_login_flow_with_secret(monkeypatch, mock_boto3_client):
     MockClient.call_count = -1
-    with_secret = fake_login_flow(monkeypatch, True, MockClient)
+    with_secret = fake_login_flow(monkeypatch, mock_boto3_client, True, MockClient)
     assert with_secret.access_token == "fake_access_token"
 
 
-def test_login_flow_without_secret(monkeypatch):
+def test_login_flow_without_secret(monkeypatch, mock_boto3_client):
     class MyMockClient(MockClient):
         call_count = -1
 
     del MyMockClient.arg_sets[0]["AuthParameters"]["SECRET_HASH"]
     del MyMockClient.arg_sets[1]["ChallengeResponses"]["SECRET_HASH"]
 
-    without_secret = fake_login_flow(monkeypatch, False, MyMockClient)
+    without_secret = fake_login_flow(
+        monkeypatch, mock_boto3_client, False, MyMockClient
+    )
     assert without_secret.access_token == "fake_access_token"
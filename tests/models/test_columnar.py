@@ -0,0 +1,86 @@
+import math
+
+import pytest
+
+from src.kshalopy.models.columnar import to_columns
+from src.kshalopy.models.compact import CompactDevice
+from src.kshalopy.models.models import Device, DeviceDetails, FleetSnapshot
+
+devices = [
+    Device(
+        deviceid="dev1",
+        lockstatus="Locked",
+        batterypercentage=80,
+        activationstate=True,
+    ),
+    Device(deviceid="dev2", lockstatus="Unlocked", batterypercentage=None),
+    Device(
+        deviceid="dev3",
+        lockstatus="Locked",
+        batterypercentage=40,
+        activationstate=False,
+    ),
+]
+
+
+def test_to_columns():
+    columns = to_columns(devices)
+    assert len(columns) == 3
+    assert columns.model is Device
+    assert columns.index is None
+    assert columns["deviceid"] == ["dev1", "dev2", "dev3"]
+    assert list(columns["lockstatus"]) == [0, 1, 0]
+    assert columns.categories["lockstatus"] == ("Locked", "Unlocked")
+    assert columns.code("lockstatus", "Unlocked") == 1
+    assert columns.code("lockstatus", "Jammed") == -1
+    assert list(columns["activationstate"]) == [1, -1, 0]
+    battery = columns["batterypercentage"]
+    assert battery[0] == 80 and math.isnan(battery[1]) and battery[2] == 40
+    assert list(columns["batterystatus"]) == [-1, -1, -1]
+    for name in ("lockstatus", "activationstate", "batterypercentage", "deviceid"):
+        assert columns.decode(name) == [getattr(device, name) for device in devices]
+
+
+def test_to_columns_options():
+    snapshot = FleetSnapshot(
+        devices={device.deviceid: device for device in devices},
+        details={"dev1": DeviceDetails(doorstatus="Locked", autolockdelay="30s")},
+    )
+    columns = to_columns(
+        snapshot.devices, names=("lockstatus", "devicename"), categorical=()
+    )
+    assert columns.index == ["dev1", "dev2", "dev3"]
+    assert set(columns.columns) == {"lockstatus", "devicename"}
+    assert columns["lockstatus"] == ["Locked", "Unlocked", "Locked"]
+
+    details = to_columns(snapshot.details)
+    assert details.model is DeviceDetails
+    assert details.categories["doorstatus"] == ("Locked",)
+    assert math.isnan(details["autolockdelay"][0])
+
+    compact = to_columns([CompactDevice.from_model(device) for device in devices])
+    assert compact.model is Device
+    assert list(compact["lockstatus"]) == [0, 1, 0]
+
+    assert len(to_columns([], model=Device)) == 0
+    with pytest.raises(ValueError):
+        to_columns([])
+    with pytest.raises(ValueError):
+        to_columns(devices, names=("unknown",))
+
+
+def test_to_numpy():
+    numpy = pytest.importorskip("numpy")
+    columns = to_columns(devices)
+    arrays = columns.to_numpy()
+    assert arrays["batterypercentage"].dtype == numpy.float64
+    assert numpy.nanmean(arrays["batterypercentage"]) == 60
+    locked = arrays["lockstatus"] == columns.code("lockstatus", "Locked")
+    assert locked.sum() == 2
+    assert arrays["activationstate"].dtype == numpy.int8
+    assert list(arrays["deviceid"]) == ["dev1", "dev2", "dev3"]
+
+    records = columns.to_structured_array()
+    assert records.shape == (3,)
+    assert records[2]["deviceid"] == "dev3"
+    assert records["batterypercentage"][2] == 40
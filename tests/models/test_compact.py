@@ -0,0 +1,70 @@
+import copy
+import pickle
+import sys
+
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from src.kshalopy.models.compact import (
+    CompactDevice,
+    CompactDeviceDetails,
+    CompactModel,
+    compact_model,
+)
+from src.kshalopy.models.models import Device, DeviceDetails, Home
+
+
+def test_compact_device():
+    device = CompactDevice(deviceid="dev1", lockstatus="Locked")
+    assert isinstance(device, CompactModel)
+    assert not hasattr(device, "__dict__")
+    assert device.deviceid == "dev1"
+    assert device.devicename is None
+    assert device == CompactDevice("dev1", lockstatus="Locked")
+    assert device != CompactDevice("dev2")
+    assert repr(device).startswith("CompactDevice(deviceid='dev1', devicename=None")
+    device.lockstatus = "Unlocked"
+    assert device.lockstatus == "Unlocked"
+    with pytest.raises(AttributeError):
+        device.unknown = 1
+    with pytest.raises(TypeError):
+        CompactDevice(deviceid="dev1", unknown=1)
+    with pytest.raises(TypeError):
+        hash(device)
+
+
+def test_model_round_trip():
+    details = DeviceDetails(doorstatus="Locked", batterypercentage=80, sku="sku1")
+    compact = CompactDeviceDetails.from_model(details)
+    assert compact.batterypercentage == 80
+    assert compact.to_model() == details
+    assert CompactDeviceDetails(**details.__dict__) == compact
+    assert compact.astuple() == tuple(details.__dict__.values())
+
+
+def test_interned():
+    status = "".join(["Loc", "ked"])
+    assert status is not sys.intern("Locked")
+    device = CompactDevice(deviceid="dev1", lockstatus=status, batterypercentage=5)
+    assert device.lockstatus is sys.intern("Locked")
+    assert device.batterypercentage == 5
+    with pytest.raises(ValueError):
+        compact_model(Device, interned=("nofield",))
+
+
+def test_frozen():
+    FrozenHome = compact_model(Home, frozen=True, interned=("useraccesslevel",))
+    home = FrozenHome(homeid="home1", useraccesslevel="Admin")
+    assert FrozenHome.__name__ == "CompactHome"
+    with pytest.raises(FrozenInstanceError):
+        home.homeid = "home2"
+    with pytest.raises(FrozenInstanceError):
+        del home.homeid
+    assert {home, FrozenHome(homeid="home1", useraccesslevel="Admin")} == {home}
+    assert copy.copy(home) == home
+
+
+def test_pickle():
+    device = CompactDevice(deviceid="dev1", lockstatus="Locked")
+    assert pickle.loads(pickle.dumps(device)) == device
@@ -0,0 +1,106 @@
+import pytest
+
+from src.kshalopy.models.compact import CompactDevice
+from src.kshalopy.models.decoder import ModelDecoder, get_decoder
+from src.kshalopy.models.models import ActuationResult, Device, DeviceDetails
+
+
+def test_well_formed_item():
+    decoder = ModelDecoder(Device)
+    item = {"deviceid": "dev1", "batterypercentage": 80, "activationstate": True}
+    assert decoder.decode(item) == Device(**item)
+    assert not decoder.unknown_keys
+    assert decoder.coercion_failures == 0
+
+
+def test_unknown_keys():
+    decoder = ModelDecoder(Device)
+    item = {"deviceid": "dev1", "newfield": 1, "otherfield": "x"}
+    assert decoder.decode(item) == Device(deviceid="dev1")
+    assert decoder.unknown_keys == {"newfield", "otherfield"}
+    # The item itself is left untouched
+    assert "newfield" in item
+
+
+def test_coercion():
+    decoder = ModelDecoder(DeviceDetails)
+    item = {
+        "batterypercentage": "80",
+        "autolockdelay": 30.0,
+        "lastupdatestatus": "2022-02-18T17:46:17Z",
+        "alexasetup": "true",
+        "googlehomesetup": 0,
+        "firmwareupdateavailable": None,
+    }
+    details = decoder.decode(item)
+    assert details.batterypercentage == 80
+    assert details.autolockdelay == 30 and isinstance(details.autolockdelay, int)
+    assert details.lastupdatestatus == 1645206377
+    assert details.alexasetup is True
+    assert details.googlehomesetup is False
+    assert details.firmwareupdateavailable is None
+    assert item["batterypercentage"] == "80"
+    assert decoder.coercion_failures == 0
+
+
+def test_uncoercible_values_are_kept():
+    decoder = ModelDecoder(Device)
+    device = decoder.decode(
+        {"deviceid": "dev1", "batterypercentage": "full", "activationstate": "maybe"}
+    )
+    assert device.batterypercentage == "full"
+    assert device.activationstate == "maybe"
+    assert decoder.coercion_failures == 2
+
+
+def test_only_integral_values_are_coerced_to_int():
+    decoder = ModelDecoder(DeviceDetails)
+    details = decoder.decode(
+        {
+            "batterypercentage": "1.5",
+            "autolockdelay": "30s",
+            "lastupdatestatus": "2.5",
+            "clearedeventhistorytimestamp": "1645206377.0",
+        }
+    )
+    assert details.batterypercentage == "1.5"
+    assert details.autolockdelay == "30s"
+    assert details.lastupdatestatus == "2.5"
+    assert details.clearedeventhistorytimestamp == 1645206377
+    assert decoder.coercion_failures == 3
+
+
+def test_only_timestamps_are_parsed_as_dates():
+    decoder = ModelDecoder(DeviceDetails)
+    details = decoder.decode(
+        {
+            "batterypercentage": "2022-02-18T17:46:17Z",
+            "lastupdatestatus": "Tue, 22 Feb 99999999999 18:59:01 GMT",
+        }
+    )
+    assert details.batterypercentage == "2022-02-18T17:46:17Z"
+    # Too far in the future to convert, kept rather than raised
+    assert details.lastupdatestatus == "Tue, 22 Feb 99999999999 18:59:01 GMT"
+    assert decoder.coercion_failures == 2
+
+
+def test_missing_required_field():
+    with pytest.raises(TypeError):
+        ModelDecoder(ActuationResult).decode({"deviceid": "dev1", "action": "lock"})
+
+
+def test_compact_model():
+    decoder = ModelDecoder(CompactDevice)
+    device = decoder.decode({"deviceid": "dev1", "batterypercentage": "5", "new": 1})
+    assert device == CompactDevice(deviceid="dev1", batterypercentage=5)
+    assert decoder.unknown_keys == {"new"}
+
+
+def test_get_decoder():
+    decoder = get_decoder(Device)
+    assert get_decoder(Device) is decoder
+    assert get_decoder(CompactDevice) is not decoder
+    assert decoder.decode_many([{"deviceid": "dev1"}, {"deviceid": "dev2"}]) == [
+        Device(deviceid="dev1"),
+        Device(deviceid="dev2"),
+    ]
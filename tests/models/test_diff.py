@@ -0,0 +1,101 @@
+from dataclasses import replace
+
+from src.kshalopy.models.compact import CompactDevice
+from src.kshalopy.models.diff import ChangeEvent, SnapshotDiffer
+from src.kshalopy.models.models import Device, DeviceDetails
+
+devices = [
+    Device(deviceid="dev1", lockstatus="Locked", batterypercentage=80),
+    Device(deviceid="dev2", lockstatus="Unlocked", batterypercentage=60),
+    Device(deviceid="dev3", lockstatus="Locked", batterypercentage=40),
+]
+
+
+def test_diff():
+    differ = SnapshotDiffer()
+    events = differ.diff(devices)
+    assert [(event.kind, event.key) for event in events] == [
+        (differ.ADDED, "dev1"),
+        (differ.ADDED, "dev2"),
+        (differ.ADDED, "dev3"),
+    ]
+    assert events[0].new is devices[0]
+    assert len(differ) == 3
+
+    # Fresh but equal objects, as a new poll returns
+    assert differ.diff([replace(device) for device in devices]) == []
+
+    changed = replace(devices[1], lockstatus="Locked", batterypercentage=59)
+    new = Device(deviceid="dev4")
+    events = differ.diff([devices[0], changed, new])
+    assert [(event.kind, event.key) for event in events] == [
+        (differ.CHANGED, "dev2"),
+        (differ.ADDED, "dev4"),
+        (differ.REMOVED, "dev3"),
+    ]
+    assert set(events[0].changes) == {"lockstatus", "batterypercentage"}
+    assert events[0].changes["lockstatus"].old == "Unlocked"
+    assert events[0].changes["lockstatus"].new == "Locked"
+    assert events[0].old == devices[1] and events[0].new is changed
+    assert events[2].old == devices[2]
+    assert "dev3" not in differ and differ.get("dev2") is changed
+
+    differ.reset()
+    assert len(differ.diff(devices)) == 3
+
+
+def test_partial_snapshot():
+    differ = SnapshotDiffer()
+    differ.diff(devices)
+    changed = replace(devices[0], lockstatus="Unlocked")
+    events = differ.diff([changed], complete=False)
+    assert [(event.kind, event.key) for event in events] == [(differ.CHANGED, "dev1")]
+    assert len(differ) == 3
+    assert differ.diff(devices[1:]) == [
+        ChangeEvent(differ.REMOVED, "dev1", old=changed)
+    ]
+
+
+def test_ignore_and_mapping():
+    differ = SnapshotDiffer(ignore=("lastupdatestatus",))
+    details = {"dev1": DeviceDetails(doorstatus="Locked", lastupdatestatus=1)}
+    assert differ.diff(details)[0].key == "dev1"
+    assert differ.diff({"dev1": replace(details["dev1"], lastupdatestatus=2)}) == []
+    events = differ.diff({"dev1": replace(details["dev1"], doorstatus="Unlocked")})
+    assert list(events[0].changes) == ["doorstatus"]
+
+
+def test_compact_models():
+    differ = SnapshotDiffer()
+    differ.diff([CompactDevice.from_model(device) for device in devices])
+    events = differ.diff(
+        [
+            (
+                CompactDevice.from_model(replace(device, devicename="Door"))
+                if device.deviceid == "dev3"
+                else CompactDevice.from_model(device)
+            )
+            for device in devices
+        ]
+    )
+    assert len(events) == 1 and list(events[0].changes) == ["devicename"]
+
+
+def test_changed_in_place():
+    differ = SnapshotDiffer()
+    device = replace(devices[0])
+    differ.diff([device])
+    device.lockstatus = "Unlocked"
+    events = differ.diff([device])
+    assert len(events) == 1
+    assert events[0].changes["lockstatus"].old == "Locked"
+    assert events[0].changes["lockstatus"].new == "Unlocked"
+    assert differ.diff([device]) == []
+
+
+def test_equal_hashes():
+    # hash(-1) == hash(-2)
+    differ = SnapshotDiffer()
+    differ.diff([replace(devices[0], batterypercentage=-1)])
+    events = differ.diff([replace(devices[0], batterypercentage=-2)])
+    assert list(events[0].changes) == ["batterypercentage"]
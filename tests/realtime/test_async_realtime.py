@@ -0,0 +1,164 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+from src.kshalopy import AppCredentials, AsyncRealtimeClient, Config
+from src.kshalopy.models.models import Device
+
+config = Config(
+    host="fake.execute-api.us-east-1.amazonaws.fake",
+    port=443,
+    use_ssl=True,
+    region="us-east-1",
+    user_pool_id="fake_user_pool_id",
+    client_id="fake_client_id",
+    identity_pool_id="fake_identity_pool_id",
+    client_secret="",
+    appsync_api_url="https://fake.appsync-api.us-east-1.amazonaws.fake/graphql",
+)
+
+credentials = AppCredentials(username="fake@fake.com", id_token="fake_id_token")
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+class MockWebsocket:
+    def __init__(self, url, subprotocols):
+        self.url = url
+        self.subprotocols = subprotocols
+        self.sent = []
+        self.incoming = asyncio.Queue()
+
+    def receive(self, msg):
+        self.incoming.put_nowait(json.dumps(msg))
+
+    async def send(self, msg):
+        msg = json.loads(msg)
+        self.sent.append(msg)
+        if msg["type"] == "connection_init":
+            self.receive(
+                {"type": "connection_ack", "payload": {"connectionTimeoutMs": 1000}}
+            )
+        elif msg["type"] == "start":
+            self.receive({"type": "start_ack", "id": msg["id"]})
+            self.receive({"type": "ka"})
+            self.receive(
+                {
+                    "type": "data",
+                    "id": msg["id"],
+                    "payload": {
+                        "data": {
+                            "onManageDevice": {
+                                "deviceid": "fake_device_id",
+                                "devicestatus": "Locked",
+                            }
+                        }
+                    },
+                }
+            )
+        elif msg["type"] == "stop":
+            self.receive({"type": "complete", "id": msg["id"]})
+
+    async def recv(self):
+        msg = await self.incoming.get()
+        if msg is None:
+            raise ConnectionClosed("closed")
+        return msg
+
+    async def close(self):
+        self.incoming.put_nowait(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+def patch_websockets(monkeypatch):
+    connections = []
+
+    def connect(url, subprotocols):
+        connections.append(MockWebsocket(url, subprotocols))
+        return connections[-1]
+
+    monkeypatch.setattr(
+        "src.kshalopy.realtime.async_realtime.websockets",
+        types.SimpleNamespace(connect=connect, ConnectionClosed=ConnectionClosed),
+    )
+    return connections
+
+
+def test_subscription_flow(monkeypatch):
+    connections = patch_websockets(monkeypatch)
+    devices = {"fake_device_id": Device("fake_device_id")}
+    client = AsyncRealtimeClient(
+        config=config, credentials=credentials, devices=devices
+    )
+
+    async def run():
+        task = asyncio.ensure_future(client.start())
+        while devices["fake_device_id"].lockstatus is None:
+            await asyncio.sleep(0.01)
+        assert client.active
+        await client.close()
+        await task
+
+    asyncio.run(run())
+    assert not client.active
+    assert client.timeout == 1
+    assert connections[0].subprotocols == ["graphql-ws"]
+    assert connections[0].url.startswith(
+        "wss://fake.appsync-realtime-api.us-east-1.amazonaws.fake/graphql?header="
+    )
+    assert [msg["type"] for msg in connections[0].sent] == [
+        "connection_init",
+        "start",
+        "stop",
+    ]
+    assert devices["fake_device_id"].lockstatus == "Locked"
+    assert not client._subscription_ids
+
+
+def test_keep_alive_timeout(monkeypatch):
+    patch_websockets(monkeypatch)
+    client = AsyncRealtimeClient(
+        config=config, credentials=credentials, timeout=0.1, subscribe_devices=False
+    )
+
+    async def run():
+        await asyncio.wait_for(client.start(), timeout=5)
+
+    asyncio.run(run())
+    assert not client.active
+    assert client.missed_keepalive_closes == 1
+
+
+def test_missing_websockets(monkeypatch):
+    monkeypatch.setattr("src.kshalopy.realtime.async_realtime.websockets", None)
+    client = AsyncRealtimeClient(config=config, credentials=credentials)
+    with pytest.raises(ImportError):
+        asyncio.run(client.start())
+
+
+def test_close_timeout(monkeypatch):
+    connections = patch_websockets(monkeypatch)
+    devices = {"fake_device_id": Device("fake_device_id")}
+    client = AsyncRealtimeClient(
+        config=config, credentials=credentials, devices=devices
+    )
+
+    async def run():
+        task = asyncio.ensure_future(client.start())
+        while devices["fake_device_id"].lockstatus is None:
+            await asyncio.sleep(0.01)
+        connections[0].receive = lambda msg: None
+        pending = await client.close(timeout=0.1)
+        await task
+        return pending
+
+    assert asyncio.run(run()) == [client.subscriptions[0].subscription_id]
@@ -1,3 +1,6 @@
+import threading
+import time
+
 from src.kshalopy import RealtimeDaemon
 
 
@@ -63,3 +66,86 @@ def test_stop():
     assert not daemon.is_running
     assert client.call_count.get("start", 0) == 0
     assert client.call_count.get("close", 0) == 0
+
+
+class MockDroppingRealtimeClient(MockRealtimeClient):
+    def __init__(self, drops):
+        super().__init__()
+        self.drops = drops
+        self.on_reconnect = None
+
+    def start(self):
+        self.call_count["start"] = self.call_count.get("start", 0) + 1
+        if self.call_count["start"] <= self.drops:
+            return
+        self._started = True
+        while self._started:
+            pass
+
+    def reset(self):
+        self.call_count["reset"] = self.call_count.get("reset", 0) + 1
+
+
+def test_reconnect():
+    client = MockDroppingRealtimeClient(drops=3)
+    daemon = RealtimeDaemon(client, backoff_base=0.01, backoff_max=0.05)
+    daemon.start()
+    while not client.active:
+        time.sleep(0.01)
+    assert client.call_count["start"] == 4
+    assert client.call_count["reset"] == 3
+    assert daemon.reconnect_count == 3
+    assert daemon.stop()
+    assert not daemon.is_running
+
+
+def test_no_reconnect():
+    client = MockDroppingRealtimeClient(drops=1)
+    daemon = RealtimeDaemon(client, start=True, reconnect=False)
+    daemon._worker.join(timeout=2)
+    assert not daemon.is_running
+    assert client.call_count["start"] == 1
+    assert "reset" not in client.call_count
+
+
+def test_on_reconnect_hook():
+    def hook(_client):
+        pass
+
+    client = MockDroppingRealtimeClient(drops=0)
+    RealtimeDaemon(client, on_reconnect=hook)
+    assert client.on_reconnect is hook
+
+
+def test_backoff():
+    daemon = RealtimeDaemon(MockRealtimeClient(), backoff_base=1, backoff_max=10)
+    for attempt in range(10):
+        assert 0 <= daemon._backoff(attempt) <= min(10, 2**attempt)
+
+
+class MockSlowClosingRealtimeClient(MockRealtimeClient):
+    def close(self):
+        # Like a websocket close handshake, the connection drops some time later
+        self.call_count["close"] = self.call_count.get("close", 0) + 1
+        threading.Timer(0.3, setattr, args=(self, "_started", False)).start()
+
+
+def test_stop_closes_once():
+    client = MockSlowClosingRealtimeClient()
+    daemon = RealtimeDaemon(client, start=True, reconnect=False)
+    while not client.active:
+        time.sleep(0.01)
+    assert daemon.stop()
+    assert client.call_count["close"] == 1
+
+
+def test_stop_timeout():
+    client = MockSlowClosingRealtimeClient()
+    daemon = RealtimeDaemon(client, start=True, reconnect=False)
+    while not client.active:
+        time.sleep(0.01)
+    started = time.monotonic()
+    assert not daemon.stop(timeout=0.1)
+    assert time.monotonic() - started < 0.25
+    assert daemon.stop()
+    assert client.call_count["close"] == 2
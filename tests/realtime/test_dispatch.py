@@ -0,0 +1,172 @@
+import threading
+import time
+
+from src.kshalopy.realtime.dispatch import EventDispatcher
+
+
+def event(deviceid: str, status: str = "Locked", operationtype: str = "lock"):
+    return {
+        "deviceid": deviceid,
+        "devicestatus": status,
+        "operationtype": operationtype,
+    }
+
+
+def test_filters():
+    dispatcher = EventDispatcher(max_workers=2)
+    received = {"all": [], "dev1": [], "unlock": []}
+    dispatcher.add_handler(received["all"].append)
+    dev1 = dispatcher.add_handler(received["dev1"].append, deviceids=["dev1"])
+    dispatcher.add_handler(received["unlock"].append, operationtypes=("unlock",))
+    assert len(dispatcher.handlers) == 3
+    assert not dispatcher.is_running
+
+    events = [event("dev1"), event("dev2"), event("dev1", "Unlocked", "unlock")]
+    for item in events:
+        assert dispatcher.dispatch(item)
+    assert dispatcher.is_running
+    dispatcher.join()
+    # Devices may be handled by different workers, so only per-device order holds
+    assert sorted(received["all"], key=events.index) == events
+    assert received["dev1"] == [events[0], events[2]]
+    assert received["unlock"] == [events[2]]
+
+    assert dispatcher.remove_handler(dev1)
+    assert not dispatcher.remove_handler(dev1)
+    stats = dispatcher.stats()
+    assert stats.queued == 3 and stats.handled == 3
+    assert stats.dropped == 0 and stats.queue_depth == 0
+    assert dispatcher.stop(timeout=1)
+    assert not dispatcher.is_running
+
+
+def test_no_matching_handler():
+    dispatcher = EventDispatcher()
+    assert not dispatcher.dispatch(event("dev1"))
+    dispatcher.add_handler(lambda _event: None, deviceids=["dev2"])
+    assert not dispatcher.dispatch(event("dev1"))
+    assert not dispatcher.is_running
+    assert dispatcher.stats().queued == 0
+
+
+def test_per_device_order():
+    dispatcher = EventDispatcher(max_workers=4)
+    received = {}
+
+    def handler(item):
+        time.sleep(0.001)
+        received.setdefault(item["deviceid"], []).append(item["devicestatus"])
+
+    dispatcher.add_handler(handler)
+    for index in range(50):
+        for deviceid in ("dev1", "dev2", "dev3"):
+            dispatcher.dispatch(event(deviceid, str(index)))
+    dispatcher.join()
+    for deviceid in ("dev1", "dev2", "dev3"):
+        assert received[deviceid] == [str(index) for index in range(50)]
+    dispatcher.stop()
+
+
+def test_backpressure():
+    dispatcher = EventDispatcher(max_workers=1, queue_size=2)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def handler(_event):
+        entered.set()
+        release.wait(5)
+
+    dispatcher.add_handler(handler)
+    assert dispatcher.dispatch(event("dev1"))
+    assert entered.wait(1)
+    started = time.monotonic()
+    results = [dispatcher.dispatch(event("dev1")) for _ in range(10)]
+    # Dispatch never waits on the blocked handler
+    assert time.monotonic() - started < 1
+    assert results == [True] * 2 + [False] * 8
+    stats = dispatcher.stats()
+    assert stats.queued == 3 and stats.dropped == 8
+    assert stats.queue_depth == 2 and stats.max_queue_depth == 2
+    release.set()
+    dispatcher.join()
+    stats = dispatcher.stats()
+    assert stats.handled == 3 and stats.queue_depth == 0
+    dispatcher.stop()
+
+
+def test_backpressure_per_queue(caplog):
+    dispatcher = EventDispatcher(max_workers=2, queue_size=1)
+    entered = threading.Semaphore(0)
+    release = threading.Event()
+
+    def handler(_event):
+        entered.release()
+        release.wait(5)
+
+    # Two devices assigned to different workers
+    first = "dev0"
+    second = next(
+        f"dev{index}"
+        for index in range(1, 100)
+        if hash(f"dev{index}") % 2 != hash(first) % 2
+    )
+    dispatcher.add_handler(handler)
+    for deviceid in (first, second):
+        assert dispatcher.dispatch(event(deviceid))
+        assert entered.acquire(timeout=1)
+    assert dispatcher.dispatch(event(first))
+    assert dispatcher.dispatch(event(second))
+    # Each queue holds one event, which is its limit
+    stats = dispatcher.stats()
+    assert stats.queue_depth == 1 and stats.max_queue_depth == 1
+    with caplog.at_level("WARNING"):
+        assert not dispatcher.dispatch(event(first))
+        assert not dispatcher.dispatch(event(second))
+        assert not dispatcher.dispatch(event(first))
+    # Reported once for each queue that fell behind
+    assert len(caplog.records) == 2
+    release.set()
+    dispatcher.join()
+    dispatcher.stop()
+
+
+def test_stop_timeout_full_queue():
+    dispatcher = EventDispatcher(max_workers=1, queue_size=1)
+    entered = threading.Event()
+    release = threading.Event()
+    received = []
+
+    def handler(event):
+        entered.set()
+        release.wait(5)
+        received.append(event)
+
+    dispatcher.add_handler(handler)
+    assert dispatcher.dispatch(event("dev1"))
+    assert entered.wait(1)
+    assert dispatcher.dispatch(event("dev1", "Unlocked"))
+    (worker,) = dispatcher._workers
+    started = time.monotonic()
+    # The queue is full behind the blocked handler
+    assert not dispatcher.stop(timeout=0.2)
+    assert time.monotonic() - started < 0.5
+    release.set()
+    worker.join(1)
+    assert not worker.is_alive()
+    assert received == [event("dev1"), event("dev1", "Unlocked")]
+
+
+def test_failing_handler():
+    dispatcher = EventDispatcher(max_workers=1)
+    received = []
+
+    def fail(_event):
+        raise RuntimeError("handler failed")
+
+    dispatcher.add_handler(fail)
+    dispatcher.add_handler(received.append)
+    dispatcher.dispatch(event("dev1"))
+    dispatcher.join()
+    assert received == [event("dev1")]
+    assert dispatcher.stats().failed == 1
+    dispatcher.stop()
@@ -1,9 +1,15 @@
 import json
 import re
 import threading
+import time
+
+import pytest
 
 from src.kshalopy import AppCredentials, Config, RealtimeClient
 from src.kshalopy.models.models import Device
+from src.kshalopy.realtime.dispatch import EventDispatcher
+from src.kshalopy.realtime.realtime import BaseRealtimeClient
+from src.kshalopy.realtime.watchdog import KeepAliveWatchdog
 
 config = Config(
     host="fake.execute-api.us-east-1.amazonaws.fake",
@@ -102,10 +108,11 @@ def test_realtime_data_message():
     realtime_client = RealtimeClient(
         config=config, credentials=credentials, devices=devices
     )
-    realtime_client._subscription_ids.append("42")
+    subscription_id = realtime_client.subscriptions[0].subscription_id
+    realtime_client._subscription_ids.append(subscription_id)
     msg = {
         "type": "data",
-        "id": "42",
+        "id": subscription_id,
         "payload": {
             "data": {
                 "onManageDevice": {
@@ -146,10 +153,11 @@ def test_unknown_device():
     realtime_client = RealtimeClient(
         config=config, credentials=credentials, devices=devices
     )
-    realtime_client._subscription_ids.append("42")
+    subscription_id = realtime_client.subscriptions[0].subscription_id
+    realtime_client._subscription_ids.append(subscription_id)
     msg = {
         "type": "data",
-        "id": "42",
+        "id": subscription_id,
         "payload": {
             "data": {
                 "onManageDevice": {
@@ -166,23 +174,326 @@ def test_unknown_device():
 def test_close(monkeypatch):
     class MockWebsocketApp:
         def __init__(self, *args, **kwargs):
-            pass
+            self.sent = []
 
         def close(self):
             pass
 
         def send(self, msg):
-            pass
+            self.sent.append(json.loads(msg))
 
     monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
     realtime_client = RealtimeClient(config=config, credentials=credentials, devices={})
     realtime_client._subscription_ids.append("42")
-    t = threading.Thread(target=realtime_client.close)
+    pending = []
+    t = threading.Thread(target=lambda: pending.extend(realtime_client.close()))
     t.start()
-    realtime_client._subscription_ids.pop()
-    t.join()
+    while not realtime_client.ws_app.sent:
+        time.sleep(0.01)
+    assert realtime_client.ws_app.sent == [{"id": "42", "type": "stop"}]
+    assert t.is_alive()
+    realtime_client._on_message(
+        realtime_client.ws_app, json.dumps({"type": "complete", "id": "42"})
+    )
+    t.join(timeout=2)
+    assert not t.is_alive()
+    assert not pending
+
+
+def test_close_timeout(monkeypatch):
+    class MockWebsocketApp:
+        def __init__(self, *args, **kwargs):
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+        def send(self, msg):
+            pass
+
+    monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, close_timeout=0.1
+    )
+    realtime_client._subscription_ids.extend(["42", "43"])
+    start = time.monotonic()
+    assert realtime_client.close() == ["42", "43"]
+    assert time.monotonic() - start < 1
+    assert realtime_client.ws_app.closed
+
+    realtime_client._subscription_ids[:] = ["44"]
+    assert realtime_client.close(force=True) == ["44"]
 
 
 def test_error():
     realtime_client = RealtimeClient(config=config, credentials=credentials, devices={})
     realtime_client._on_error(realtime_client.ws_app, Exception("FOO"))
+
+
+def test_multiplexed_subscriptions(monkeypatch):
+    class MockWebsocketApp:
+        def __init__(self, url, *args, **kwargs):
+            self.sent = []
+
+        def send(self, msg: str):
+            self.sent.append(json.loads(msg))
+
+    monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
+    devices = {"fake_device_id": Device("fake_device_id")}
+    primary = AppCredentials(username="primary@fake.com", id_token="primary_token")
+    secondary = AppCredentials(username="secondary@fake.com", id_token="second_token")
+    realtime_client = RealtimeClient(
+        config=config, credentials=primary, devices=devices
+    )
+    received = []
+    secondary_id = realtime_client.subscribe_devices(
+        secondary, handler=lambda sub_id, data: received.append((sub_id, data))
+    )
+    assert len(realtime_client.subscriptions) == 2
+    assert not realtime_client.ws_app.sent
+
+    realtime_client._on_message(
+        realtime_client.ws_app,
+        json.dumps(
+            {"type": "connection_ack", "payload": {"connectionTimeoutMs": 1000}}
+        ),
+    )
+    starts = realtime_client.ws_app.sent
+    assert [msg["type"] for msg in starts] == ["start", "start"]
+    tokens = [
+        msg["payload"]["extensions"]["authorization"]["Authorization"] for msg in starts
+    ]
+    assert tokens == ["primary_token", "second_token"]
+    assert "secondary@fake.com" in starts[1]["payload"]["data"]
+    assert starts[1]["id"] == secondary_id
+
+    for msg in starts:
+        realtime_client._on_message(
+            realtime_client.ws_app, json.dumps({"type": "start_ack", "id": msg["id"]})
+        )
+    for msg in starts:
+        data = {
+            "onManageDevice": {"deviceid": "fake_device_id", "devicestatus": msg["id"]}
+        }
+        realtime_client._on_message(
+            realtime_client.ws_app,
+            json.dumps({"type": "data", "id": msg["id"], "payload": {"data": data}}),
+        )
+    assert devices["fake_device_id"].lockstatus == starts[0]["id"]
+    assert received == [(secondary_id, data)]
+
+    third_id = realtime_client.subscribe('{"query": "subscription {}"}')
+    assert realtime_client.ws_app.sent[-1]["id"] == third_id
+    assert realtime_client.ws_app.sent[-1]["type"] == "start"
+
+    realtime_client.unsubscribe(secondary_id)
+    assert realtime_client.ws_app.sent[-1] == {"id": secondary_id, "type": "stop"}
+    assert len(realtime_client.subscriptions) == 2
+
+
+def test_data_without_handler_dropped(monkeypatch):
+    class MockWebsocketApp:
+        def __init__(self, url, *args, **kwargs):
+            self.sent = []
+
+        def send(self, msg: str):
+            self.sent.append(json.loads(msg))
+
+    monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, subscribe_devices=False
+    )
+    received = []
+    custom_id = realtime_client.subscribe(
+        '{"query": "subscription {}"}', handler=lambda *args: received.append(args)
+    )
+    unhandled_id = realtime_client.subscribe('{"query": "subscription {}"}')
+    realtime_client._subscription_ids.extend([custom_id, unhandled_id])
+    realtime_client.unsubscribe(custom_id)
+    # Neither is mistaken for a device event, before the stop completes or at all
+    for subscription_id in (custom_id, unhandled_id):
+        realtime_client._handle_message(
+            json.dumps(
+                {"type": "data", "id": subscription_id, "payload": {"data": {}}}
+            )
+        )
+    assert not received
+
+
+def test_no_default_subscription():
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, subscribe_devices=False
+    )
+    assert not realtime_client.subscriptions
+
+
+def test_missed_keepalive(monkeypatch):
+    class MockWebsocketApp:
+        def __init__(self, *args, **kwargs):
+            self.closed = threading.Event()
+
+        def close(self):
+            self.closed.set()
+
+    monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
+    watchdog = KeepAliveWatchdog()
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, timeout=0.1, watchdog=watchdog
+    )
+    realtime_client._on_message(realtime_client.ws_app, json.dumps({"type": "ka"}))
+    assert len(watchdog) == 1
+    assert realtime_client.ws_app.closed.wait(2)
+    assert realtime_client.missed_keepalive_closes == 1
+    assert watchdog.expired_count == 1
+
+
+def test_clean_close_is_not_missed_keepalive(monkeypatch):
+    class MockWebsocketApp:
+        def __init__(self, *args, **kwargs):
+            self.closed = threading.Event()
+
+        def close(self):
+            self.closed.set()
+
+    monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
+    watchdog = KeepAliveWatchdog()
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, timeout=0.1, watchdog=watchdog
+    )
+    realtime_client._on_message(realtime_client.ws_app, json.dumps({"type": "ka"}))
+    realtime_client._on_close(realtime_client.ws_app, 1000, "closed")
+    assert len(watchdog) == 0
+    assert not realtime_client.ws_app.closed.wait(0.3)
+    assert realtime_client.missed_keepalive_closes == 0
+    assert watchdog.expired_count == 0
+
+
+def test_reset_and_reconnect_hook(monkeypatch):
+    class MockWebsocketApp:
+        def __init__(self, url, *args, **kwargs):
+            self.url = url
+            self.on_close = kwargs["on_close"]
+            self.sent = []
+
+        def send(self, msg):
+            self.sent.append(json.loads(msg))
+
+        def close(self):
+            self.on_close(self, 1000, "")
+
+    monkeypatch.setattr("src.kshalopy.realtime.realtime.WebSocketApp", MockWebsocketApp)
+    reconnected = threading.Event()
+    fresh_credentials = AppCredentials(username="fake@fake.com", id_token="old_token")
+    realtime_client = RealtimeClient(
+        config=config,
+        credentials=fresh_credentials,
+        on_reconnect=lambda client: reconnected.set(),
+    )
+    ack = json.dumps(
+        {"type": "connection_ack", "payload": {"connectionTimeoutMs": 1000}}
+    )
+    realtime_client._on_message(realtime_client.ws_app, ack)
+    subscription_id = realtime_client.ws_app.sent[0]["id"]
+    realtime_client._on_message(
+        realtime_client.ws_app, json.dumps({"type": "start_ack", "id": subscription_id})
+    )
+    realtime_client.ws_app.close()
+    assert not realtime_client._subscription_ids
+    assert not reconnected.is_set()
+
+    fresh_credentials.id_token = "new_token"
+    old_url = realtime_client.ws_app.url
+    realtime_client.reset()
+    assert realtime_client.ws_app.url != old_url
+    realtime_client._on_message(realtime_client.ws_app, ack)
+    start = realtime_client.ws_app.sent[0]
+    assert start["id"] == subscription_id
+    assert start["payload"]["extensions"]["authorization"]["Authorization"] == (
+        "new_token"
+    )
+    assert reconnected.wait(2)
+    assert realtime_client.connection_count == 2
+    realtime_client.close(force=True)
+
+
+def test_expect_device_status():
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, subscribe_devices=False
+    )
+    locked = realtime_client.expect_device_status("fake_device_id", "Locked")
+    unlocked = realtime_client.expect_device_status("fake_device_id", "Unlocked")
+    assert locked.wait(0.01) is None
+
+    data = {"onManageDevice": {"deviceid": "fake_device_id", "devicestatus": "Locked"}}
+    realtime_client._handle_device_event("id", data)
+    assert locked.wait(0) == data["onManageDevice"]
+    assert locked.received >= locked.registered
+    assert unlocked.wait(0) is None
+
+    realtime_client.cancel_expectation(unlocked)
+    assert not realtime_client._waiters
+
+
+def test_event_handlers():
+    dispatcher = EventDispatcher(max_workers=1, queue_size=10)
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, dispatcher=dispatcher
+    )
+    assert realtime_client.dispatch_stats.queued == 0
+    received = []
+    handler_id = realtime_client.add_event_handler(
+        received.append, deviceids=["fake_device_id"], operationtypes=["lock"]
+    )
+    subscription_id = realtime_client.subscriptions[0].subscription_id
+    realtime_client._subscription_ids.append(subscription_id)
+    for deviceid, operationtype in (
+        ("fake_device_id", "lock"),
+        ("fake_device_id", "unlock"),
+        ("other_device_id", "lock"),
+    ):
+        msg = {
+            "type": "data",
+            "id": subscription_id,
+            "payload": {
+                "data": {
+                    "onManageDevice": {
+                        "deviceid": deviceid,
+                        "devicestatus": "Locked",
+                        "operationtype": operationtype,
+                    }
+                }
+            },
+        }
+        realtime_client._on_message(realtime_client.ws_app, json.dumps(msg))
+    dispatcher.join()
+    assert received == [
+        {
+            "deviceid": "fake_device_id",
+            "devicestatus": "Locked",
+            "operationtype": "lock",
+        }
+    ]
+    assert realtime_client.dispatch_stats.handled == 1
+    assert realtime_client.remove_event_handler(handler_id)
+    dispatcher.stop()
+
+
+def test_event_handlers_default_dispatcher():
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, subscribe_devices=False
+    )
+    assert not realtime_client.remove_event_handler("unknown")
+    received = threading.Event()
+    realtime_client.add_event_handler(lambda _event: received.set())
+    data = {"onManageDevice": {"deviceid": "fake_device_id", "devicestatus": "Locked"}}
+    realtime_client._handle_device_event("id", data)
+    assert received.wait(1)
+    assert realtime_client.dispatcher.stop(timeout=1)
+
+
+def test_transport_must_implement_send():
+    class IncompleteClient(BaseRealtimeClient):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteClient(config=config, credentials=credentials)
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from src.kshalopy.realtime.watchdog import KeepAliveWatchdog
+
+
+def test_expiry():
+    watchdog = KeepAliveWatchdog()
+    expired = threading.Event()
+    watchdog.touch("one", 0.1, expired.set)
+    assert expired.wait(2)
+    assert watchdog.expired_count == 1
+    assert len(watchdog) == 0
+
+
+def test_touch_extends_deadline():
+    watchdog = KeepAliveWatchdog()
+    expired = []
+    start = time.monotonic()
+    watchdog.touch("one", 0.2, lambda: expired.append(time.monotonic() - start))
+    for _ in range(5):
+        time.sleep(0.1)
+        watchdog.touch("one", 0.2, lambda: expired.append(time.monotonic() - start))
+    assert not expired
+    time.sleep(0.4)
+    assert len(expired) == 1
+    assert expired[0] >= 0.7
+
+
+def test_shorter_deadline():
+    watchdog = KeepAliveWatchdog()
+    expired = threading.Event()
+    watchdog.touch("one", 60, expired.set)
+    watchdog.touch("one", 0.1, expired.set)
+    assert expired.wait(2)
+
+
+def test_cancel():
+    watchdog = KeepAliveWatchdog()
+    expired = []
+    watchdog.touch("one", 0.1, lambda: expired.append("one"))
+    watchdog.cancel("one")
+    time.sleep(0.3)
+    assert not expired
+    assert watchdog.expired_count == 0
+
+
+def test_many_keys_one_thread():
+    watchdog = KeepAliveWatchdog()
+    expired = []
+    threads_before = threading.active_count()
+    for key in range(100):
+        watchdog.touch(key, 0.1 + key / 1000, lambda key=key: expired.append(key))
+    assert threading.active_count() <= threads_before + 1
+    time.sleep(0.5)
+    assert expired == list(range(100))
+
+
+def test_failing_callback():
+    watchdog = KeepAliveWatchdog()
+    expired = threading.Event()
+
+    def fail():
+        raise RuntimeError("FOO")
+
+    watchdog.touch("one", 0.05, fail)
+    watchdog.touch("two", 0.1, expired.set)
+    assert expired.wait(2)
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import threading
+import time
+
+from pathlib import Path
+
+from src.kshalopy import (
+    AppCredentials,
+    AsyncRestClient,
+    Config,
+    DeviceStateStore,
+    ResponseCache,
+)
+from src.kshalopy.models.models import Device, DeviceDetails, Home
+
+config_path = str(Path.joinpath(Path(__file__).parent, "test_config.json"))
+config = Config.from_app_json_file(config_path)
+
+credentials_path = str(Path.joinpath(Path(__file__).parent, "test_credentials.json"))
+credentials = AppCredentials.load_credentials(credentials_path, config)
+
+BASE_URL = "https://fake.execute-api.us-east-1.amazonaws.fake/prod_v1"
+REQUEST_DELAY = 0.2
+
+
+class MockResponse:
+    headers = {}
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def __init__(self, request):
+        self.request = request
+
+    def read(self):
+        cls = self.__class__
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(REQUEST_DELAY)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        url = self.request.full_url
+        if url == f"{BASE_URL}/users/me/homes":
+            data = [{"homeid": "fake_homeid1"}, {"homeid": "fake_homeid2"}]
+        elif url.endswith("/devices"):
+            homeid = url.split("/")[-2]
+            data = [{"deviceid": f"{homeid}_device{i}"} for i in range(5)]
+        elif url.endswith("/status"):
+            data = "1"
+        else:
+            data = [{"serialnumber": url.split("/")[-1]}]
+        return json.dumps({"data": data}).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+def get_patched_client(monkeypatch, max_concurrency=10, **kwargs):
+    MockResponse.in_flight = 0
+    MockResponse.max_in_flight = 0
+    monkeypatch.setattr(
+        "src.kshalopy.rest.rest.ConnectionPool.urlopen",
+        lambda _pool, request, timeout=None: MockResponse(request),
+    )
+    return AsyncRestClient(
+        config,
+        credentials,
+        "fake_name",
+        "fake_device",
+        max_concurrency=max_concurrency,
+        **kwargs,
+    )
+
+
+def test_mirrored_methods(monkeypatch):
+    async def run():
+        async with get_patched_client(monkeypatch) as client:
+            homes = await client.get_my_homes()
+            devices = await client.get_devices_in_home(homes[0])
+            details = await client.get_device_details(devices[0])
+            response = await client.lock_device(devices[0])
+        return homes, devices, details, response
+
+    homes, devices, details, response = asyncio.run(run())
+    assert [home.homeid for home in homes] == ["fake_homeid1", "fake_homeid2"]
+    assert len(devices) == 5
+    assert isinstance(devices[0], Device)
+    assert isinstance(details, DeviceDetails)
+    assert details.serialnumber == "fake_homeid1_device0"
+    assert response
+
+
+def test_fan_out(monkeypatch):
+    async def run():
+        async with get_patched_client(monkeypatch, max_concurrency=10) as client:
+            homes = [Home(homeid="fake_homeid1"), Home(homeid="fake_homeid2")]
+            device_lists = await client.get_devices_in_homes(homes)
+            devices = [device for devices in device_lists for device in devices]
+            return await client.get_details_for_devices(devices)
+
+    start = time.monotonic()
+    details = asyncio.run(run())
+    elapsed = time.monotonic() - start
+    assert [detail.serialnumber for detail in details][:2] == [
+        "fake_homeid1_device0",
+        "fake_homeid1_device1",
+    ]
+    assert len(details) == 10
+    assert elapsed < REQUEST_DELAY * 4
+
+
+def test_bounded_concurrency(monkeypatch):
+    async def run():
+        async with get_patched_client(monkeypatch, max_concurrency=3) as client:
+            devices = [Device(deviceid=f"fake_deviceid{i}") for i in range(9)]
+            return await client.get_details_for_devices(devices)
+
+    assert len(asyncio.run(run())) == 9
+    assert MockResponse.max_in_flight == 3
+
+
+def test_get_fleet(monkeypatch):
+    async def run():
+        async with get_patched_client(monkeypatch) as client:
+            return await client.get_fleet()
+
+    fleet = asyncio.run(run())
+    assert list(fleet.homes) == ["fake_homeid1", "fake_homeid2"]
+    assert len(fleet.devices) == 10
+    assert fleet.details["fake_homeid2_device4"].serialnumber == "fake_homeid2_device4"
+    assert fleet.device_homes["fake_homeid1_device0"] == ["fake_homeid1"]
+
+
+def test_lock_devices(monkeypatch):
+    async def run():
+        async with get_patched_client(monkeypatch, max_concurrency=4) as client:
+            devices = [Device(deviceid=f"fake_deviceid{i}") for i in range(8)]
+            return await client.lock_devices(devices)
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    assert time.monotonic() - start < REQUEST_DELAY * 4
+    assert [r.deviceid for r in results] == [f"fake_deviceid{i}" for i in range(8)]
+    assert all(r.success and r.affected == 1 for r in results)
+    assert MockResponse.max_in_flight == 4
+
+
+def test_exit_does_not_block_loop(monkeypatch):
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker_task = asyncio.ensure_future(ticker())
+        async with get_patched_client(monkeypatch) as client:
+            request = asyncio.ensure_future(client.get_my_homes())
+            await asyncio.sleep(0.05)
+            ticks_at_exit = ticks
+        # Leaving the block waited for the request in flight, with the loop running
+        ticks_during_exit = ticks - ticks_at_exit
+        ticker_task.cancel()
+        return ticks_during_exit, await request
+
+    ticks_during_exit, homes = asyncio.run(run())
+    assert ticks_during_exit >= 5
+    assert len(homes) == 2
+
+
+def test_cache_and_state_store(monkeypatch):
+    cache = ResponseCache(ttls={"get_my_homes": 60})
+    state_store = DeviceStateStore()
+
+    async def run():
+        async with get_patched_client(
+            monkeypatch, cache=cache, state_store=state_store
+        ) as client:
+            await client.get_my_homes()
+            await client.get_my_homes()
+            await client.get_device_details(Device(deviceid="dev1"))
+
+    asyncio.run(run())
+    assert cache.hits == 1 and cache.misses == 1
+    assert state_store.get_details("dev1").serialnumber == "dev1"
@@ -0,0 +1,169 @@
+import json
+import urllib.error
+
+from email.message import Message
+from pathlib import Path
+
+import pytest
+
+from src.kshalopy import AppCredentials, Config, RestClient
+from src.kshalopy.models.models import Device, Home
+from src.kshalopy.rest.cache import ResponseCache
+
+config_path = str(Path.joinpath(Path(__file__).parent, "test_config.json"))
+config = Config.from_app_json_file(config_path)
+
+credentials_path = str(Path.joinpath(Path(__file__).parent, "test_credentials.json"))
+credentials = AppCredentials.load_credentials(credentials_path, config)
+
+BASE_URL = "https://fake.execute-api.us-east-1.amazonaws.fake/prod_v1"
+
+
+class MockServer:
+    def __init__(self):
+        self.requests = []
+        self.etag = '"v1"'
+
+    def urlopen(self, request):
+        self.requests.append(request)
+        headers = Message()
+        headers["ETag"] = self.etag
+        if request.headers.get("If-none-match") == self.etag:
+            raise urllib.error.HTTPError(
+                request.full_url, 304, "Not Modified", headers, None
+            )
+        server = self
+
+        class MockResponse:
+            def __init__(self):
+                self.headers = headers
+
+            def read(self):
+                if request.full_url.endswith("/status"):
+                    return b'{"data": "1"}'
+                if request.full_url.endswith("/homes"):
+                    data = [{"homeid": f"home_{server.etag}"}]
+                else:
+                    data = [{"deviceid": "fake_deviceid"}]
+                return json.dumps({"data": data}).encode()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+        return MockResponse()
+
+
+def get_patched_client(monkeypatch, cache):
+    server = MockServer()
+    monkeypatch.setattr(
+        "src.kshalopy.rest.rest.ConnectionPool.urlopen",
+        lambda _pool, request, timeout=None: server.urlopen(request),
+    )
+    return (
+        RestClient(config, credentials, "fake_name", "fake_device", cache=cache),
+        server,
+    )
+
+
+def test_lru_eviction():
+    cache = ResponseCache(ttls={"endpoint": 60}, maxsize=2)
+    cache.put("user", "endpoint", "/a", [1])
+    cache.put("user", "endpoint", "/b", [2])
+    assert cache.get("user", "/a").data == [1]
+    cache.put("user", "endpoint", "/c", [3])
+    assert len(cache) == 2
+    assert cache.get("user", "/b") is None
+    assert cache.get("user", "/a").data == [1]
+    assert cache.get("user", "/c").data == [3]
+
+
+def test_uncached_endpoint():
+    cache = ResponseCache(ttls={"endpoint": 60})
+    cache.put("user", "other_endpoint", "/a", [1])
+    assert cache.get("user", "/a") is None
+
+
+def test_invalidate():
+    cache = ResponseCache(ttls={"one": 60, "two": 60})
+    cache.put("user1", "one", "/a", [1])
+    cache.put("user2", "one", "/a", [1])
+    cache.put("user1", "two", "/b", [2])
+    assert cache.invalidate(identity="user1", endpoints=["one"]) == 1
+    assert cache.get("user1", "/a") is None
+    assert cache.get("user2", "/a")
+    assert cache.invalidate(selector="/b") == 1
+    assert len(cache) == 1
+
+
+def test_fresh_hit(monkeypatch):
+    client, server = get_patched_client(monkeypatch, ResponseCache())
+    first = client.get_my_homes()
+    second = client.get_my_homes()
+    assert first == second
+    assert first[0] is not second[0]
+    assert len(server.requests) == 1
+    assert client.cache.hits == 1
+
+
+def test_identity_keyed(monkeypatch):
+    cache = ResponseCache()
+    client, server = get_patched_client(monkeypatch, cache)
+    client.get_my_homes()
+    other_credentials = AppCredentials(username="other_username")
+    other = RestClient(
+        config, other_credentials, "fake_name", "fake_device", cache=cache
+    )
+    other.get_my_homes()
+    assert len(server.requests) == 2
+
+
+def test_revalidation(monkeypatch):
+    client, server = get_patched_client(monkeypatch, ResponseCache())
+    client.get_my_homes()
+    entry = client.cache.get(credentials.username, "/prod_v1/users/me/homes")
+    entry.expires = 0
+
+    homes = client.get_my_homes()
+    assert server.requests[-1].headers["If-none-match"] == '"v1"'
+    assert homes[0].homeid == 'home_"v1"'
+    assert client.cache.revalidations == 1
+    assert entry.fresh
+
+    entry.expires = 0
+    server.etag = '"v2"'
+    homes = client.get_my_homes()
+    assert homes[0].homeid == 'home_"v2"'
+    assert client.cache.revalidations == 1
+
+
+def test_actuation_invalidates(monkeypatch):
+    cache = ResponseCache(ttls={"get_devices_in_home": 60, "get_my_homes": 60})
+    client, server = get_patched_client(monkeypatch, cache)
+    client.get_my_homes()
+    client.get_devices_in_home(Home(homeid="fake_homeid"))
+    assert len(cache) == 2
+    client.lock_device(Device(deviceid="fake_deviceid"))
+    assert len(cache) == 1
+    client.get_devices_in_home(Home(homeid="fake_homeid"))
+    assert len(server.requests) == 4
+
+
+def test_no_cache(monkeypatch):
+    client, server = get_patched_client(monkeypatch, None)
+    client.get_my_homes()
+    client.get_my_homes()
+    assert len(server.requests) == 2
+
+
+def test_http_error_not_swallowed(monkeypatch):
+    client, server = get_patched_client(monkeypatch, ResponseCache())
+
+    def fail(request):
+        raise urllib.error.HTTPError(request.full_url, 304, "Not Modified", None, None)
+
+    server.urlopen = fail
+    with pytest.raises(urllib.error.HTTPError):
+        client.get_my_homes()
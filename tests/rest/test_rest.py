@@ -1,9 +1,25 @@
+import contextlib
+import io
 import json
+import threading
+import time
+import urllib.error
 
+from datetime import datetime
 from pathlib import Path
 
-from src.kshalopy import AppCredentials, Config, RestClient
+import pytest
+
+from src.kshalopy import (
+    AppCredentials,
+    Config,
+    RealtimeClient,
+    RequestPolicy,
+    ResponseCache,
+    RestClient,
+)
 from src.kshalopy.models.models import Device, Home
+from src.kshalopy.state.store import DeviceStateStore
 
 config_path = str(Path.joinpath(Path(__file__).parent, "test_config.json"))
 config = Config.from_app_json_file(config_path)
@@ -49,6 +65,7 @@ def get_patched_client(monkeypatch):
                 == "https://fake.execute-api.us-east-1.amazonaws.fake/prod_v1/devices/fake_deviceid_lock/status"
             ):
                 assert self.request.method == "PATCH"
+                assert self.request.get_header("Content-type") == "application/json"
                 assert json.loads(self.request.data) == {
                     "action": "Lock",
                     "source": '{"name": "fake_name", "device": "fake_device"}',
@@ -71,7 +88,10 @@ def get_patched_client(monkeypatch):
         def __exit__(self, exc_type, exc_val, exc_tb):
             pass
 
-    monkeypatch.setattr("src.kshalopy.rest.rest.urllib.request.urlopen", MockURLOpen)
+    monkeypatch.setattr(
+        "src.kshalopy.rest.rest.ConnectionPool.urlopen",
+        lambda _pool, request, timeout=None: MockURLOpen(request),
+    )
     return RestClient(config, credentials, "fake_name", "fake_device")
 
 
@@ -121,3 +141,327 @@ def test_unlock_device(monkeypatch):
     client = get_patched_client(monkeypatch)
     response = client.unlock_device(Device(deviceid="fake_deviceid_unlock"))
     assert response
+
+
+def test_get_fleet(monkeypatch):
+    base_url = "https://fake.execute-api.us-east-1.amazonaws.fake/prod_v1"
+    responses = {
+        f"{base_url}/users/me/homes": [{"homeid": "home1"}, {"homeid": "home2"}],
+        f"{base_url}/homes/home1/devices": [{"deviceid": "dev1"}, {"deviceid": "dev2"}],
+        f"{base_url}/homes/home2/devices": [{"deviceid": "dev2"}, {"deviceid": "dev3"}],
+        f"{base_url}/devices/dev1": [{"serialnumber": "sn1"}],
+        f"{base_url}/devices/dev2": [{"serialnumber": "sn2"}],
+        f"{base_url}/devices/dev3": [{"serialnumber": "sn3"}],
+    }
+    requested = []
+
+    class MockURLOpen:
+        def __init__(self, request):
+            self.request = request
+
+        def read(self):
+            requested.append(self.request.full_url)
+            return json.dumps({"data": responses[self.request.full_url]}).encode()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            pass
+
+    monkeypatch.setattr(
+        "src.kshalopy.rest.rest.ConnectionPool.urlopen",
+        lambda _pool, request, timeout=None: MockURLOpen(request),
+    )
+    client = RestClient(config, credentials, "fake_name", "fake_device")
+    fleet = client.get_fleet()
+    assert list(fleet.homes) == ["home1", "home2"]
+    assert sorted(fleet.devices) == ["dev1", "dev2", "dev3"]
+    assert fleet.details["dev2"].serialnumber == "sn2"
+    assert fleet.device_homes["dev2"] == ["home1", "home2"]
+    assert [d.deviceid for d in fleet.devices_in_home("home2")] == ["dev2", "dev3"]
+    assert requested.count(f"{base_url}/devices/dev2") == 1
+
+    requested.clear()
+    fleet = client.get_fleet(include_details=False)
+    assert not fleet.details
+    assert len(requested) == 3
+
+
+def get_refreshing_client(monkeypatch, expiration, auto_refresh=True):
+    refreshes = []
+    requests = []
+
+    test_credentials = AppCredentials.load_credentials(credentials_path, config)
+    test_credentials.expiration = expiration
+
+    def refresh(ttl_limit=900, force=False):
+        if force or test_credentials.ttl < ttl_limit:
+            refreshes.append(force)
+            test_credentials.id_token = f"fake_id_token{len(refreshes)}"
+            test_credentials.expiration = datetime.now().timestamp() + 3600
+
+    def urlopen(_pool, request, timeout=None):
+        requests.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "Bearer fake_id_token":
+            raise urllib.error.HTTPError(
+                request.full_url, 401, "Unauthorized", {}, io.BytesIO(b"")
+            )
+        body = json.dumps({"data": [{"homeid": "fake_homeid"}]}).encode()
+        return contextlib.nullcontext(io.BytesIO(body))
+
+    monkeypatch.setattr(test_credentials, "refresh", refresh)
+    monkeypatch.setattr("src.kshalopy.rest.rest.ConnectionPool.urlopen", urlopen)
+    client = RestClient(
+        config,
+        test_credentials,
+        "fake_name",
+        "fake_device",
+        policy=RequestPolicy(auto_refresh=auto_refresh),
+    )
+    return client, refreshes, requests
+
+
+def test_refresh_before_expiration(monkeypatch):
+    client, refreshes, requests = get_refreshing_client(
+        monkeypatch, datetime.now().timestamp() + 60
+    )
+    assert client.get_my_homes()[0].homeid == "fake_homeid"
+    assert refreshes == [False]
+    assert requests == ["Bearer fake_id_token1"]
+
+
+def test_replay_on_unauthorized(monkeypatch):
+    client, refreshes, requests = get_refreshing_client(
+        monkeypatch, datetime.now().timestamp() + 3600
+    )
+    assert client.get_my_homes()[0].homeid == "fake_homeid"
+    assert refreshes == [True]
+    assert requests == ["Bearer fake_id_token", "Bearer fake_id_token1"]
+
+    # Later requests use the refreshed token
+    client.get_my_homes()
+    assert refreshes == [True]
+    assert requests[-1] == "Bearer fake_id_token1"
+
+
+def test_no_auto_refresh(monkeypatch):
+    client, refreshes, requests = get_refreshing_client(
+        monkeypatch, datetime.now().timestamp() + 60, auto_refresh=False
+    )
+    with pytest.raises(urllib.error.HTTPError) as error:
+        client.get_my_homes()
+    assert error.value.code == 401
+    assert refreshes == []
+    assert requests == ["Bearer fake_id_token"]
+
+
+def get_actuating_client(monkeypatch, on_patch=None, doorstatus=None, **kwargs):
+    patched = []
+    polled = []
+
+    def urlopen(_pool, request, timeout=None):
+        if request.get_method() == "GET":
+            deviceid = request.full_url.split("/")[-1]
+            polled.append(deviceid)
+            status = doorstatus(deviceid, len(polled)) if doorstatus else "Unknown"
+            response = io.BytesIO(
+                json.dumps({"data": [{"doorstatus": status}]}).encode()
+            )
+            response.headers = {}
+            return contextlib.nullcontext(response)
+        deviceid = request.full_url.split("/")[-2]
+        patched.append((deviceid, json.loads(request.data)["action"]))
+        if deviceid == "fake_deviceid_broken":
+            raise urllib.error.HTTPError(
+                request.full_url, 404, "Not Found", {}, io.BytesIO(b"")
+            )
+        if on_patch:
+            on_patch(deviceid)
+        return contextlib.nullcontext(io.BytesIO(b'{"data": "1"}'))
+
+    monkeypatch.setattr("src.kshalopy.rest.rest.ConnectionPool.urlopen", urlopen)
+    client = RestClient(config, credentials, "fake_name", "fake_device", **kwargs)
+    client.polled = polled
+    return client, patched
+
+
+def test_lock_devices(monkeypatch):
+    client, patched = get_actuating_client(monkeypatch)
+    devices = [
+        Device(deviceid=deviceid)
+        for deviceid in ("fake_deviceid1", "fake_deviceid_broken", "fake_deviceid2")
+    ]
+    results = client.lock_devices(devices, max_workers=2)
+    assert [r.deviceid for r in results] == [d.deviceid for d in devices]
+    assert [r.success for r in results] == [True, False, True]
+    assert results[0].affected == 1
+    assert results[0].action == "Lock"
+    assert results[0].confirmed is None
+    assert results[1].error.code == 404
+    assert sorted(patched) == sorted((d.deviceid, "Lock") for d in devices)
+
+    results = client.unlock_devices([Device(deviceid="fake_deviceid1")])
+    assert results[0].action == "Unlock"
+    assert patched[-1] == ("fake_deviceid1", "Unlock")
+    assert client.lock_devices([]) == []
+
+
+def test_lock_devices_confirmed(monkeypatch):
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, subscribe_devices=False
+    )
+
+    def report_locked(deviceid):
+        if deviceid == "fake_deviceid_silent":
+            return
+        data = {"onManageDevice": {"deviceid": deviceid, "devicestatus": "Locked"}}
+        threading.Timer(
+            0.05, realtime_client._handle_device_event, args=("id", data)
+        ).start()
+
+    client, _patched = get_actuating_client(monkeypatch, report_locked)
+    devices = [
+        Device(deviceid=deviceid)
+        for deviceid in ("fake_deviceid1", "fake_deviceid_silent", "fake_deviceid2")
+    ]
+    results = client.lock_devices(
+        devices, realtime_client=realtime_client, confirm_timeout=0.5
+    )
+    assert [r.confirmed for r in results] == [True, False, True]
+    assert [r.lockstatus for r in results] == ["Locked", "Unknown", "Locked"]
+    assert [r.confirmed_by for r in results] == ["realtime", None, "realtime"]
+    assert all(r.success for r in results)
+    assert 0.5 > results[0].latency > 0.04
+    assert results[1].latency is None
+    # The missing event is checked over REST, once
+    assert client.polled == ["fake_deviceid_silent"]
+    assert not realtime_client._waiters
+
+
+def test_lock_device_confirmed_realtime(monkeypatch):
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, subscribe_devices=False
+    )
+
+    def report_status(deviceid):
+        data = {"onManageDevice": {"deviceid": deviceid, "devicestatus": "Unlocked"}}
+        threading.Timer(
+            0.1, realtime_client._handle_device_event, args=("id", data)
+        ).start()
+
+    client, patched = get_actuating_client(monkeypatch, report_status)
+    result = client.unlock_device_confirmed(
+        Device(deviceid="fake_deviceid1"), realtime_client=realtime_client
+    )
+    assert patched == [("fake_deviceid1", "Unlock")]
+    assert result.confirmed
+    assert result.lockstatus == "Unlocked"
+    assert result.confirmed_by == "realtime"
+    assert 1 > result.latency > 0.09
+    assert client.polled == []
+
+
+def test_lock_device_confirmed_polling(monkeypatch):
+    client, _patched = get_actuating_client(
+        monkeypatch,
+        doorstatus=lambda _deviceid, polls: "Locked" if polls >= 3 else "Unlocked",
+    )
+    result = client.lock_device_confirmed(
+        Device(deviceid="fake_deviceid1"), timeout=2, poll_interval=0.05
+    )
+    assert result.confirmed
+    assert result.lockstatus == "Locked"
+    assert result.confirmed_by == "rest"
+    assert 1 > result.latency > 0.09
+    assert len(client.polled) == 3
+
+
+def test_lock_device_confirmed_polling_cached(monkeypatch):
+    client, _patched = get_actuating_client(
+        monkeypatch,
+        doorstatus=lambda _deviceid, polls: "Locked" if polls >= 2 else "Unlocked",
+        cache=ResponseCache({"get_device_details": 60}),
+    )
+    device = Device(deviceid="fake_deviceid1")
+    result = client.lock_device_confirmed(device, timeout=1, poll_interval=0.05)
+    # Polls skip the status cached by the one before, and refresh it
+    assert result.confirmed
+    assert len(client.polled) == 2
+    assert client.get_device_details(device).doorstatus == "Locked"
+    assert len(client.polled) == 2
+
+
+def test_lock_device_confirmed_timeout(monkeypatch):
+    client, _patched = get_actuating_client(
+        monkeypatch, doorstatus=lambda _deviceid, _polls: "Jammed"
+    )
+    start = time.monotonic()
+    result = client.lock_device_confirmed(
+        Device(deviceid="fake_deviceid1"), timeout=0.3, poll_interval=0.1
+    )
+    assert 0.5 > time.monotonic() - start >= 0.3
+    assert result.success
+    assert result.confirmed is False
+    assert result.lockstatus == "Jammed"
+    assert result.latency is None
+    assert 3 <= len(client.polled) <= 5
+
+    result = client.lock_device_confirmed(Device(deviceid="fake_deviceid_broken"))
+    assert not result.success
+    assert result.confirmed is None
+
+
+def test_iter_methods(monkeypatch):
+    base_url = "https://fake.execute-api.us-east-1.amazonaws.fake/prod_v1"
+    responses = {
+        f"{base_url}/users/me/homes": [{"homeid": f"home{i}"} for i in range(3)],
+        f"{base_url}/homes/home1/devices": [
+            {"deviceid": f"dev{i}", "lockstatus": "Locked"} for i in range(500)
+        ],
+        f"{base_url}/homes/home1/sharedusers": [{"email": "fake1@fake.com"}],
+    }
+
+    def urlopen(_pool, request, timeout=None):
+        body = json.dumps({"data": responses[request.full_url]}).encode()
+        return contextlib.nullcontext(io.BytesIO(body))
+
+    monkeypatch.setattr("src.kshalopy.rest.rest.ConnectionPool.urlopen", urlopen)
+    state_store = DeviceStateStore()
+    client = RestClient(
+        config, credentials, "fake_name", "fake_device", state_store=state_store
+    )
+    homes = client.iter_my_homes()
+    assert not isinstance(homes, list)
+    assert [home.homeid for home in homes] == ["home0", "home1", "home2"]
+
+    devices = client.iter_devices_in_home(Home(homeid="home1"))
+    first = next(devices)
+    assert first == Device(deviceid="dev0", lockstatus="Locked")
+    assert "dev0" in state_store and "dev1" not in state_store
+    assert len(list(devices)) == 499
+    assert state_store.get_device("dev499").lockstatus == "Locked"
+
+    users = list(client.iter_shared_users_in_home(Home(homeid="home1")))
+    assert users[0].email == "fake1@fake.com"
+
+
+def test_schema_drift(monkeypatch):
+    drifted = [
+        {"deviceid": "dev1", "batterypercentage": "80", "newfield": {"a": 1}},
+        {"deviceid": "dev2", "batterypercentage": 75},
+    ]
+
+    def urlopen(_pool, request, timeout=None):
+        body = json.dumps({"data": drifted}).encode()
+        return contextlib.nullcontext(io.BytesIO(body))
+
+    monkeypatch.setattr("src.kshalopy.rest.rest.ConnectionPool.urlopen", urlopen)
+    client = RestClient(config, credentials, "fake_name", "fake_device")
+    devices = client.get_devices_in_home(Home(homeid="drift_homeid"))
+    assert devices == [
+        Device(deviceid="dev1", batterypercentage=80),
+        Device(deviceid="dev2", batterypercentage=75),
+    ]
+    streamed = list(client.iter_devices_in_home(Home(homeid="drift_homeid")))
+    assert streamed == devices
@@ -0,0 +1,185 @@
+import contextlib
+import io
+import json
+import threading
+import time
+import urllib.error
+
+from email.message import Message
+from email.utils import formatdate
+from pathlib import Path
+
+import pytest
+
+from src.kshalopy import (
+    AppCredentials,
+    Config,
+    RequestPolicy,
+    RestClient,
+    RetryPolicy,
+    TokenBucket,
+)
+from src.kshalopy.models.models import Device
+
+config_path = str(Path.joinpath(Path(__file__).parent, "test_config.json"))
+config = Config.from_app_json_file(config_path)
+
+credentials_path = str(Path.joinpath(Path(__file__).parent, "test_credentials.json"))
+credentials = AppCredentials.load_credentials(credentials_path, config)
+
+
+def http_error(code, retry_after=None):
+    headers = Message()
+    if retry_after is not None:
+        headers["Retry-After"] = retry_after
+    return urllib.error.HTTPError(
+        "https://fake/", code, "Error", headers, io.BytesIO(b"")
+    )
+
+
+def test_retry_after():
+    assert RetryPolicy.retry_after(http_error(503)) is None
+    assert RetryPolicy.retry_after(http_error(503, "2")) == 2
+    assert RetryPolicy.retry_after(http_error(503, "soon")) is None
+    retry_at = formatdate(time.time() + 30, usegmt=True)
+    assert 31 > RetryPolicy.retry_after(http_error(503, retry_at)) > 28
+    assert RetryPolicy.retry_after(ConnectionResetError()) is None
+
+
+def test_should_retry():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry("GET", http_error(503), 1)
+    assert policy.should_retry("GET", http_error(429), 2)
+    assert not policy.should_retry("GET", http_error(503), 3)
+    assert not policy.should_retry("GET", http_error(404), 1)
+    assert policy.should_retry("GET", ConnectionResetError(), 1)
+    assert not policy.should_retry("GET", http_error(429, "3600"), 1)
+
+    # Actuations are only retried when the server did not act on them
+    assert policy.should_retry("PATCH", http_error(429), 1)
+    assert not policy.should_retry("PATCH", http_error(503), 1)
+    assert not policy.should_retry("PATCH", ConnectionResetError(), 1)
+
+
+def test_delay():
+    policy = RetryPolicy(backoff_base=1, backoff_max=5)
+    assert policy.delay(http_error(429, "7"), 1) == 7
+    assert all(0 <= policy.delay(http_error(503), 1) <= 1 for _ in range(100))
+    assert all(0 <= policy.delay(http_error(503), 10) <= 5 for _ in range(100))
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    assert not bucket.acquire(timeout=0.01)
+    for _ in range(4):
+        bucket.acquire()
+    assert 0.3 > time.monotonic() - start > 0.15
+
+
+def test_token_bucket_over_capacity():
+    bucket = TokenBucket(rate=20, capacity=5)
+    with pytest.raises(ValueError):
+        bucket.acquire(6)
+    assert bucket.acquire(5)
+
+
+def test_token_bucket_slow_rate():
+    bucket = TokenBucket(rate=0.5)
+    assert bucket.capacity == 1
+    assert bucket.acquire(timeout=0.1)
+    assert not bucket.acquire(timeout=0.1)
+
+
+def test_token_bucket_invalid():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=-1)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=10, capacity=0.5)
+
+
+def test_token_bucket_threads():
+    bucket = TokenBucket(rate=50, capacity=1)
+    acquired = []
+
+    def worker():
+        for _ in range(5):
+            bucket.acquire()
+            acquired.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 tokens, 1 available up front, at 50 per second
+    assert time.monotonic() - start > 0.35
+    assert len(acquired) == 20
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=100)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start > 0.19
+
+
+def get_failing_client(monkeypatch, failures, **kwargs):
+    failures = list(failures)
+    requests = []
+
+    def urlopen(_pool, request, timeout=None):
+        requests.append(request.get_method())
+        if failures:
+            raise failures.pop(0)
+        body = json.dumps({"data": [{"homeid": "fake_homeid"}]}).encode()
+        return contextlib.nullcontext(io.BytesIO(body))
+
+    monkeypatch.setattr("src.kshalopy.rest.rest.ConnectionPool.urlopen", urlopen)
+    client = RestClient(config, credentials, "fake_name", "fake_device", **kwargs)
+    return client, requests
+
+
+def test_get_retried(monkeypatch):
+    client, requests = get_failing_client(
+        monkeypatch,
+        [http_error(503), ConnectionResetError()],
+        policy=RequestPolicy(retry=RetryPolicy(backoff_base=0.01)),
+    )
+    assert client.get_my_homes()[0].homeid == "fake_homeid"
+    assert requests == ["GET", "GET", "GET"]
+
+
+def test_get_retries_exhausted(monkeypatch):
+    client, requests = get_failing_client(
+        monkeypatch,
+        [http_error(503)] * 3,
+        policy=RequestPolicy(retry=RetryPolicy(max_attempts=2, backoff_base=0.01)),
+    )
+    with pytest.raises(urllib.error.HTTPError) as error:
+        client.get_my_homes()
+    assert error.value.code == 503
+    assert requests == ["GET", "GET"]
+
+
+def test_actuation_retry(monkeypatch):
+    client, requests = get_failing_client(monkeypatch, [http_error(503)])
+    with pytest.raises(urllib.error.HTTPError):
+        client.lock_device(Device(deviceid="fake_deviceid"))
+    assert requests == ["PATCH"]
+
+    bucket = TokenBucket(rate=100)
+    client, requests = get_failing_client(
+        monkeypatch, [http_error(429, "0.2")], policy=RequestPolicy(rate_limiter=bucket)
+    )
+    start = time.monotonic()
+    assert client.lock_device(Device(deviceid="fake_deviceid"))
+    assert time.monotonic() - start > 0.19
+    assert requests == ["PATCH", "PATCH"]
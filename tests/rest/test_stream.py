@@ -0,0 +1,67 @@
+import io
+import json
+
+import pytest
+
+from src.kshalopy.rest.stream import iter_json_items
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 65536])
+def test_iter_json_items(chunk_size):
+    body = {
+        "before": {"data": [1, 2], "text": "}],"},
+        "data": [
+            {"deviceid": "dev1", "name": "Café ☃", "nested": {"a": [1, {}]}},
+            12345,
+            -1.5e3,
+            "text, with ] and }",
+            None,
+            True,
+            [],
+        ],
+        "after": 12,
+    }
+    stream = io.BytesIO(json.dumps(body, ensure_ascii=False, indent=2).encode())
+    assert list(iter_json_items(stream, chunk_size=chunk_size)) == body["data"]
+
+
+def test_iter_json_items_lazy():
+    items = [{"deviceid": f"dev{i}", "padding": "x" * 100} for i in range(1000)]
+    stream = CountingStream(json.dumps({"data": items}).encode())
+    generator = iter_json_items(stream, chunk_size=1024)
+    assert next(generator) == items[0]
+    assert stream.reads == 1
+    assert list(generator) == items[1:]
+    assert stream.reads > 100
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        (b"{}", []),
+        (b'{"data": []}', []),
+        (b' { "data" : [ ] } ', []),
+        (b'{"data": "1"}', ["1"]),
+        (b'{"other": [1]}', []),
+    ],
+)
+def test_iter_json_items_shapes(body, expected):
+    assert list(iter_json_items(io.BytesIO(body), chunk_size=3)) == expected
+
+
+@pytest.mark.parametrize(
+    "body", [b"", b"[1]", b'{"data": [1, 2', b'{"data": [1 2]}', b'{"data": [1]']
+)
+def test_iter_json_items_invalid(body):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_items(io.BytesIO(body), chunk_size=4))
@@ -0,0 +1,169 @@
+import json
+import time
+
+from pathlib import Path
+
+from src.kshalopy import (
+    AppCredentials,
+    Config,
+    DeviceStateStore,
+    RealtimeClient,
+    RestClient,
+)
+from src.kshalopy.models.models import Device, DeviceDetails
+
+config_path = str(
+    Path.joinpath(Path(__file__).parent.parent, "rest", "test_config.json")
+)
+config = Config.from_app_json_file(config_path)
+
+credentials_path = str(
+    Path.joinpath(Path(__file__).parent.parent, "rest", "test_credentials.json")
+)
+credentials = AppCredentials.load_credentials(credentials_path, config)
+
+
+def test_newer_values_win():
+    store = DeviceStateStore()
+    store.update("dev1", {"lockstatus": "Locked"}, store.REALTIME, timestamp=200)
+    store.update("dev1", {"lockstatus": "Unlocked"}, store.REST, timestamp=100)
+    state = store.get_field("dev1", "lockstatus")
+    assert state.value == "Locked"
+    assert state.source == store.REALTIME
+    assert state.updated == 200
+
+
+def test_get_device():
+    store = DeviceStateStore()
+    assert store.get_device("dev1") is None
+    store.update_device(
+        Device(deviceid="dev1", devicename="Front", lockstatus="Locked")
+    )
+    store.update_from_event("dev1", {"deviceid": "dev1", "devicestatus": "Unlocked"})
+    device = store.get_device("dev1")
+    assert device.devicename == "Front"
+    assert device.lockstatus == "Unlocked"
+    assert "dev1" in store
+    store.update_device(Device(deviceid="dev2", lockstatus="Locked"))
+    assert store.get_devices() == {
+        "dev1": device,
+        "dev2": Device(deviceid="dev2", lockstatus="Locked"),
+    }
+
+
+def test_get_details_staleness():
+    store = DeviceStateStore(max_staleness=60)
+    now = time.time()
+    store.update_device(Device(deviceid="dev1"), timestamp=now - 120)
+    assert store.get_details("dev1") is None
+
+    store.update_details("dev1", DeviceDetails(serialnumber="sn1"), timestamp=now - 120)
+    assert store.get_details("dev1") is None
+    assert store.get_details("dev1", max_staleness=300).serialnumber == "sn1"
+
+    # A realtime event does not make old details, e.g. battery level, fresh
+    store.update_from_event("dev1", {"deviceid": "dev1", "devicestatus": "Locked"})
+    assert store.get_details("dev1") is None
+    details = store.get_details("dev1", max_staleness=300)
+    assert details.serialnumber == "sn1"
+    assert (
+        details.lastupdatestatus == store.get_field("dev1", "lockstatus").updated // 1
+    )
+
+    store.update_details("dev1", DeviceDetails(serialnumber="sn2"))
+    assert store.get_details("dev1").serialnumber == "sn2"
+
+
+def test_realtime_status_laid_over_details():
+    store = DeviceStateStore(max_staleness=60)
+    store.update_details(
+        "dev1",
+        DeviceDetails(doorstatus="Locked", batterypercentage=90),
+        timestamp=time.time() - 10,
+    )
+    store.update_from_event("dev1", {"deviceid": "dev1", "devicestatus": "Unlocked"})
+    details = store.get_details("dev1")
+    assert details.doorstatus == "Unlocked"
+    assert details.batterypercentage == 90
+    assert (
+        details.lastupdatestatus == store.get_field("dev1", "doorstatus").updated // 1
+    )
+
+
+def test_rest_client_skips_fresh_details(monkeypatch):
+    requested = []
+
+    class MockURLOpen:
+        def __init__(self, request):
+            self.request = request
+
+        def read(self):
+            requested.append(self.request.full_url)
+            if self.request.full_url.endswith("/devices"):
+                data = [{"deviceid": "dev1", "lockstatus": "Locked"}]
+            else:
+                data = [
+                    {
+                        "serialnumber": "sn1",
+                        "batterypercentage": 90,
+                        "doorstatus": "Locked",
+                    }
+                ]
+            return json.dumps({"data": data}).encode()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            pass
+
+    monkeypatch.setattr(
+        "src.kshalopy.rest.rest.ConnectionPool.urlopen",
+        lambda _pool, request, timeout=None: MockURLOpen(request),
+    )
+    store = DeviceStateStore(max_staleness=60)
+    client = RestClient(
+        config, credentials, "fake_name", "fake_device", state_store=store
+    )
+    device = Device(deviceid="dev1")
+
+    assert client.get_device_details(device).serialnumber == "sn1"
+    assert client.get_device_details(device).batterypercentage == 90
+    assert len(requested) == 1
+
+    # Served with the lock state of a newer realtime event laid over it
+    store.update_from_event("dev1", {"deviceid": "dev1", "devicestatus": "Unlocked"})
+    assert client.get_device_details(device).doorstatus == "Unlocked"
+    assert len(requested) == 1
+
+    client.get_device_details(device, max_staleness=0)
+    assert len(requested) == 2
+
+    client.get_devices_in_home(type("Home", (), {"homeid": "home1"}))
+    assert store.get_field("dev1", "lockstatus").value == "Locked"
+
+
+def test_realtime_client_feeds_store():
+    store = DeviceStateStore()
+    realtime_client = RealtimeClient(
+        config=config, credentials=credentials, devices={}, state_store=store
+    )
+    subscription_id = realtime_client.subscriptions[0].subscription_id
+    realtime_client._subscription_ids.append(subscription_id)
+    msg = {
+        "type": "data",
+        "id": subscription_id,
+        "payload": {
+            "data": {
+                "onManageDevice": {
+                    "deviceid": "dev1",
+                    "devicename": "Front",
+                    "devicestatus": "Unlocked",
+                }
+            }
+        },
+    }
+    realtime_client._on_message(realtime_client.ws_app, json.dumps(msg))
+    assert store.get_field("dev1", "lockstatus").value == "Unlocked"
+    assert store.get_field("dev1", "lockstatus").source == store.REALTIME
+    assert store.get_device("dev1").devicename == "Front"
@@ -1,4 +1,9 @@
-from src.kshalopy.utils import calculate_expiration, date_string_to_timestamp
+from src.kshalopy.utils import (
+    calculate_expiration,
+    clear_boto3_clients,
+    date_string_to_timestamp,
+    get_boto3_client,
+)
 
 
 def test_date_string_to_timestamp():
@@ -11,3 +16,22 @@ def test_calculate_expiration():
         "AuthenticationResult": {"ExpiresIn": 3600},
     }
     assert calculate_expiration(response) == 1601723900.0 + 3600
+
+
+def test_get_boto3_client(mock_boto3_client):
+    created = []
+
+    def mock_client(service_name, region_name):
+        created.append((service_name, region_name))
+        return object()
+
+    mock_boto3_client(mock_client)
+    idp_client = get_boto3_client("cognito-idp", "us-east-1")
+    assert get_boto3_client("cognito-idp", "us-east-1") is idp_client
+    assert get_boto3_client("cognito-idp", "us-west-2") is not idp_client
+    assert get_boto3_client("cognito-identity", "us-east-1") is not idp_client
+    assert len(created) == 3
+
+    clear_boto3_clients()
+    assert get_boto3_client("cognito-idp", "us-east-1") is not idp_client
+    assert len(created) == 4